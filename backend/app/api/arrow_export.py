@@ -0,0 +1,195 @@
+"""
+表格数据的 Arrow IPC 导出（列式）
+二维/三维坐标视图、地图视图需要成千上万个点的数值列，逐行 JSON 需要浏览器重新按列整理；
+Arrow 流按列输出带类型的数据，客户端（apache-arrow）可以直接得到 Float64Array 等类型化数组。
+
+列类型由表格 schema 中的字段类型决定：
+    number       -> float64（无法转换为数字的值为 null）
+    select       -> dictionary<int32, string>（字典以 options 开头，出现新值时追加）
+    date         -> timestamp[ms, UTC]（无法解析的值为 null）
+    geo_point    -> fixed_size_list<float64>[2]，即 [经度, 纬度]
+    multi_select -> list<string>
+    其他         -> string（对象、数组按 JSON 文本输出）
+每列的 metadata 中记录原始字段类型（type）和显示名称（label）。
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import pyarrow as pa
+from app.models.schemas import ProjectSchema
+
+MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+GEO_POINT_TYPE = pa.list_(pa.float64(), 2)
+
+
+def _to_float(value: Any) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    # NaN / inf 在可视化中没有意义
+    return number if number - number == 0 else None
+
+def _to_timestamp(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def _to_geo_point(value: Any) -> Optional[List[float]]:
+    """支持 GeoJSON Point、{lng, lat} 对象和 [经度, 纬度] 数组"""
+    if isinstance(value, dict):
+        if "coordinates" in value:
+            value = value["coordinates"]
+        else:
+            value = [value.get("lng", value.get("lon")), value.get("lat")]
+    if not isinstance(value, (list, tuple)) or len(value) < 2:
+        return None
+    lng, lat = _to_float(value[0]), _to_float(value[1])
+    if lng is None or lat is None:
+        return None
+    return [lng, lat]
+
+def _to_string_list(value: Any) -> Optional[List[str]]:
+    if value is None:
+        return None
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    return [_to_string(v) for v in value if v is not None]
+
+def _to_string(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class _Column:
+    """一个数据字段对应的 Arrow 列"""
+
+    def __init__(self, key: str, field_type: str, label: Optional[str] = None,
+                 options: Optional[List[str]] = None):
+        self.key = key
+        self.field_type = field_type
+        metadata = {"type": field_type}
+        if label:
+            metadata["label"] = label
+
+        if field_type == "number":
+            arrow_type, self.convert = pa.float64(), _to_float
+        elif field_type == "date":
+            arrow_type, self.convert = pa.timestamp("ms", tz="UTC"), _to_timestamp
+        elif field_type == "geo_point":
+            arrow_type, self.convert = GEO_POINT_TYPE, _to_geo_point
+        elif field_type == "multi_select":
+            arrow_type, self.convert = pa.list_(pa.string()), _to_string_list
+        elif field_type == "select":
+            arrow_type, self.convert = pa.dictionary(pa.int32(), pa.string()), _to_string
+            # 字典只追加不修改，后续批次以增量字典（delta）发送
+            self.categories: Dict[str, int] = {}
+            for option in options or []:
+                self.categories.setdefault(option, len(self.categories))
+        else:
+            arrow_type, self.convert = pa.string(), _to_string
+        self.arrow_type = arrow_type
+        self.field = pa.field(key, arrow_type, metadata=metadata)
+
+    def build(self, values: List[Any]) -> pa.Array:
+        values = [self.convert(value) for value in values]
+        if self.field_type != "select":
+            return pa.array(values, type=self.arrow_type)
+        indices = []
+        for value in values:
+            if value is None:
+                indices.append(None)
+            else:
+                indices.append(self.categories.setdefault(value, len(self.categories)))
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, type=pa.int32()), pa.array(list(self.categories), type=pa.string())
+        )
+
+
+def _columns(schema: Optional[ProjectSchema], fields: Optional[List[str]]) -> List[_Column]:
+    """输出的数据列：指定 fields 时按其顺序（schema 中未声明的字段按字符串输出），否则为 schema 中的全部字段"""
+    declared = {field.key: field for field in schema.fields} if schema else {}
+    keys = fields if fields else list(declared)
+    columns = []
+    for key in keys:
+        field = declared.get(key)
+        if field:
+            columns.append(_Column(key, str(field.type), field.label, field.options))
+        else:
+            columns.append(_Column(key, "text"))
+    return columns
+
+
+class _Sink:
+    """收集 IPC 写入的字节，每写完一批取出一次"""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def arrow_stream_chunks(rows: Iterable[dict], schema: Optional[ProjectSchema],
+                        fields: Optional[List[str]] = None, batch_size: int = 1000) -> Iterator[bytes]:
+    """
+    把逐行读取的数据项编码成 Arrow IPC 流，每 batch_size 行输出一个 record batch
+    第一列为数据项 id，其余为数据字段（见模块说明）
+    """
+    columns = _columns(schema, fields)
+    arrow_schema = pa.schema(
+        [pa.field("id", pa.string(), nullable=False)] + [column.field for column in columns],
+        metadata={"source": "piceable"}
+    )
+    sink = _Sink()
+    writer = pa.ipc.new_stream(
+        pa.PythonFile(sink, mode="w"), arrow_schema,
+        options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    )
+
+    def write_batch(batch: List[dict]) -> bytes:
+        arrays = [pa.array([row["id"] for row in batch], type=pa.string())]
+        for column in columns:
+            arrays.append(column.build([(row["data"] or {}).get(column.key) for row in batch]))
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=arrow_schema))
+        return sink.take()
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield write_batch(batch)
+            batch = []
+    if batch:
+        yield write_batch(batch)
+    writer.close()
+    yield sink.take()
@@ -0,0 +1,75 @@
+"""
+条件 GET（ETag / If-None-Match）
+数据项列表的 ETag 由所在表格的版本号（tables.version）和查询参数计算，
+数据未变化时直接返回 304，不需要查询和序列化数据项。
+项目、表格等小响应的 ETag 由响应内容计算，只节省传输。
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Any, Optional
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+# 允许浏览器缓存，但每次使用前必须向服务端验证
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """根据任意可 JSON 序列化的值生成弱 ETag"""
+    raw = json.dumps(parts, default=str, sort_keys=True, separators=(",", ":")).encode()
+    return 'W/"' + hashlib.sha1(raw).hexdigest() + '"'
+
+def content_etag(content: Any) -> str:
+    """根据响应内容生成 ETag"""
+    return make_etag(jsonable_encoder(content))
+
+def http_date(value: Any) -> Optional[str]:
+    """把数据库中的时间（不带时区的按 UTC 处理）格式化为 HTTP 日期，无法解析时返回 None"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 是否命中（弱比较）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+def conditional_response(request: Request, response: Response, etag: str,
+                         last_modified: Any = None) -> Optional[Response]:
+    """
+    设置缓存相关响应头；If-None-Match 命中时返回 304 响应，否则返回 None
+
+    用法:
+        not_modified = conditional_response(request, response, etag)
+        if not_modified:
+            return not_modified
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    modified = http_date(last_modified)
+    if modified:
+        headers["Last-Modified"] = modified
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
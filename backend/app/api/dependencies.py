@@ -1,8 +1,28 @@
+import time
 from fastapi import Depends, HTTPException, status
 from jose import JWTError, jwt
-from app.config import SECRET_KEY, ALGORITHM, oauth2_scheme
+from app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, JWT_CACHE_SIZE, oauth2_scheme
 from app.models.schemas import User, TokenData
-from app.crud.users import get_user_from_db
+from app.crud.cache import MetadataCache
+from app.crud.users import get_user_from_db, user_cache
+from app.crud.projects import ownership_cache, user_owns_project
+from app.database.executor import run_db
+
+# 已验证签名的令牌 -> 用户名，缓存到令牌过期为止；同一令牌的后续请求不再验证签名
+token_cache = MetadataCache("tokens", max_size=JWT_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+def decode_access_token(token: str) -> str:
+    """验证令牌并返回其中的用户名，无效时抛出 JWTError"""
+    username = token_cache.get(token)
+    if username is not None:
+        return username
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    username = payload.get("sub")
+    if username is None:
+        raise JWTError("令牌中缺少用户名")
+    expires = payload.get("exp")
+    token_cache.set(token, username, expires - time.time() if isinstance(expires, (int, float)) else None)
+    return username
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
@@ -11,14 +31,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
+        token_data = TokenData(username=decode_access_token(token))
     except JWTError:
         raise credentials_exception
-    user = get_user_from_db(None, username=token_data.username)
+    # 缓存命中时不需要数据库查询（也不占用数据库线程池）
+    user = user_cache.get(token_data.username)
+    if user is None:
+        user = await run_db(get_user_from_db, None, username=token_data.username)
     if user is None:
         raise credentials_exception
     return user
@@ -35,4 +54,10 @@ async def get_current_admin_user(current_user: User = Depends(get_current_active
             status_code=status.HTTP_403_FORBIDDEN,
             detail="需要管理员权限",
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+async def has_project_access(project_id: int, user_id: int) -> bool:
+    """用户是否可以访问项目（只检查归属，不读取项目数据），结果按 METADATA_CACHE_TTL 缓存"""
+    if ownership_cache.get((user_id, project_id)):
+        return True
+    return await run_db(user_owns_project, project_id, user_id)
@@ -0,0 +1,167 @@
+"""
+重接口的限流和并发限制（上传、地理编码、导出）
+每类接口按用户维护一个令牌桶（每分钟 N 次，桶容量为 N），同时限制每个用户和所有用户同时执行的请求数，
+超出时直接返回 429 和 Retry-After，不进入路由，单个用户的大量请求不会占满数据库和事件循环。
+
+用户按访问令牌中的用户名区分（已验证的令牌有缓存，见 app.api.dependencies），
+没有有效令牌的请求按客户端 IP 计数（路由随后会返回 401）。
+计数保存在进程内，多进程部署时每个进程分别限制。
+"""
+
+import math
+import re
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+from jose import JWTError
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from app.config import (
+    EXPORT_MAX_CONCURRENT, EXPORT_MAX_CONCURRENT_PER_USER, EXPORT_RATE_PER_MINUTE,
+    GEOCODE_MAX_CONCURRENT, GEOCODE_MAX_CONCURRENT_PER_USER, GEOCODE_RATE_PER_MINUTE,
+    UPLOAD_MAX_CONCURRENT, UPLOAD_MAX_CONCURRENT_PER_USER, UPLOAD_RATE_PER_MINUTE,
+)
+from app.api.dependencies import decode_access_token
+
+# 每类接口最多保留的令牌桶数，超出时淘汰最久未使用的（空闲足够久的桶本来就是满的）
+MAX_BUCKETS = 10000
+
+
+class RouteLimit:
+    """
+    一类接口的限制：method 和 path 正则匹配的请求共用令牌桶和并发计数
+    只在事件循环中调用，不需要加锁
+    """
+
+    def __init__(self, name: str, method: str, path: str, rate_per_minute: float = 0,
+                 max_concurrent_per_user: int = 0, max_concurrent: int = 0):
+        self.name = name
+        self.method = method
+        self.path = re.compile(path)
+        self.rate = rate_per_minute / 60  # 每秒补充的令牌数
+        self.capacity = rate_per_minute
+        self.max_concurrent_per_user = max_concurrent_per_user
+        self.max_concurrent = max_concurrent
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()  # client -> [令牌数, 更新时间]
+        self._active: Counter = Counter()
+        self.active = 0
+        self.admitted = 0
+        self.rejected = Counter()  # 拒绝原因 -> 次数
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and self.path.fullmatch(path) is not None
+
+    def _take_token(self, client: str) -> Optional[float]:
+        """取一个令牌；令牌不足时返回需要等待的秒数"""
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [self.capacity, now]
+            while len(self._buckets) > MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            return (1 - bucket[0]) / self.rate
+        bucket[0] -= 1
+        return None
+
+    def acquire(self, client: str) -> Optional[Tuple[str, int]]:
+        """
+        准入检查，通过时占用一个并发名额（请求结束后调用 release）
+
+        Returns:
+            None 表示通过；否则为 (错误信息, Retry-After 秒数)
+        """
+        # 先检查并发，被拒绝的请求不消耗令牌
+        if self.max_concurrent and self.active >= self.max_concurrent:
+            self.rejected["concurrency"] += 1
+            return "服务器繁忙，请稍后重试", 1
+        if self.max_concurrent_per_user and self._active[client] >= self.max_concurrent_per_user:
+            self.rejected["user_concurrency"] += 1
+            return f"同时进行的请求过多（最多 {self.max_concurrent_per_user} 个），请等待之前的请求完成", 1
+        if self.rate > 0:
+            wait = self._take_token(client)
+            if wait is not None:
+                self.rejected["rate"] += 1
+                return f"请求过于频繁（每分钟最多 {self.capacity:g} 次），请稍后重试", max(1, math.ceil(wait))
+        self._active[client] += 1
+        self.active += 1
+        self.admitted += 1
+        return None
+
+    def release(self, client: str):
+        self.active -= 1
+        self._active[client] -= 1
+        if self._active[client] <= 0:
+            del self._active[client]
+
+    def stats(self) -> Dict:
+        return {
+            "rate_per_minute": self.capacity,
+            "max_concurrent_per_user": self.max_concurrent_per_user,
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
+
+
+def default_limits() -> List[RouteLimit]:
+    """按 app.config 中的配置创建各类接口的限制"""
+    return [
+        RouteLimit("upload", "POST", r"/api/upload(/file)?",
+                   UPLOAD_RATE_PER_MINUTE, UPLOAD_MAX_CONCURRENT_PER_USER, UPLOAD_MAX_CONCURRENT),
+        RouteLimit("geocode", "POST", r"/api/projects/\d+/geocode",
+                   GEOCODE_RATE_PER_MINUTE, GEOCODE_MAX_CONCURRENT_PER_USER, GEOCODE_MAX_CONCURRENT),
+        RouteLimit("export", "GET", r"/api/projects/\d+/tables/\d+/export",
+                   EXPORT_RATE_PER_MINUTE, EXPORT_MAX_CONCURRENT_PER_USER, EXPORT_MAX_CONCURRENT),
+    ]
+
+_limits: List[RouteLimit] = []
+
+def get_rate_limit_stats() -> Dict[str, Dict]:
+    """各类接口当前的并发数和累计通过、拒绝次数"""
+    return {limit.name: limit.stats() for limit in _limits}
+
+def _client_key(scope) -> str:
+    authorization = Headers(scope=scope).get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            return "user:" + decode_access_token(token)
+        except JWTError:
+            pass
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+class RateLimitMiddleware:
+    """
+    ASGI 中间件：匹配的请求在进入路由前做准入检查，并发名额在响应（包括流式导出）发送完后释放
+    """
+
+    def __init__(self, app, limits: Optional[List[RouteLimit]] = None):
+        self.app = app
+        self.limits = default_limits() if limits is None else limits
+        _limits[:] = self.limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limit = next((l for l in self.limits if l.matches(scope["method"], scope["path"])), None)
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        client = _client_key(scope)
+        rejection = limit.acquire(client)
+        if rejection is not None:
+            detail, retry_after = rejection
+            response = JSONResponse({"detail": detail}, status_code=429, headers={"Retry-After": str(retry_after)})
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release(client)
@@ -0,0 +1,62 @@
+"""
+数据项列表的快速响应
+默认路径中每一行都要 json.loads(data)、构造 Item（Pydantic 校验）、再经过 response_model 校验、
+jsonable_encoder 和 json.dumps，数据量大时大部分时间花在这些转换上。
+数据库中的 data 本身就是合法的 JSON 文本，这里直接把它拼接进响应体，
+其余列按 Item 的输出格式编码，输出与 response_model=List[Item] 的结果一致。
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Iterable, Optional
+from fastapi import Response
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def iso_datetime(value: Any) -> Optional[str]:
+    """
+    与 Pydantic 输出一致的时间格式：ISO 8601，日期和时间之间为 T
+    （SQLite 返回的是 "YYYY-MM-DD HH:MM:SS" 文本，PostgreSQL 返回 datetime）
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).replace(" ", "T", 1)
+
+def _encode_datetime(value: Any) -> str:
+    value = iso_datetime(value)
+    return "null" if value is None else _dumps(value)
+
+def encode_item_rows(rows: Iterable[dict]) -> bytes:
+    """
+    把 raw=True 查询得到的数据项编码成 JSON 数组（字段同 Item）
+    data 为字符串时视为 JSON 文本直接拼接，否则（字段投影的结果）按普通对象编码
+    """
+    parts = []
+    for row in rows:
+        data = row["data"]
+        if not isinstance(data, str):
+            data = _dumps(data)
+        table_id = row.get("table_id")
+        parts.append(
+            '{"id":' + _dumps(row["id"])
+            + ',"data":' + data
+            + ',"created_at":' + _encode_datetime(row.get("created_at"))
+            + ',"updated_at":' + _encode_datetime(row.get("updated_at"))
+            + ',"table_id":' + ("null" if table_id is None else str(int(table_id)))
+            + "}"
+        )
+    return ("[" + ",".join(parts) + "]").encode("utf-8")
+
+
+class ItemListResponse(Response):
+    """已编码好的数据项列表（见 encode_item_rows）"""
+    media_type = "application/json"
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict], response: Response = None) -> "ItemListResponse":
+        """编码数据项；response 为路由注入的 Response，其响应头（ETag、X-Next-Cursor 等）一并带上"""
+        headers = dict(response.headers) if response is not None else None
+        return cls(content=encode_item_rows(rows), headers=headers)
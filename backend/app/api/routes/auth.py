@@ -4,15 +4,18 @@ from datetime import timedelta
 from app.config import ACCESS_TOKEN_EXPIRE_MINUTES
 from app.models.schemas import Token, User, UserCreate, UserPublic
 from app.auth.jwt import create_access_token
-from app.crud.users import authenticate_user_from_db, create_user_in_db, get_all_users_from_db, update_user_role_in_db
+from app.auth.security import get_password_hash_async, verify_password_async
+from app.crud.users import get_user_from_db, create_user_in_db, get_all_users_from_db, update_user_role_in_db, user_exists_in_db
 from app.api.dependencies import get_current_active_user
+from app.database.executor import run_db
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user_from_db(form_data.username, form_data.password)
-    if not user:
+    # 数据库查询在数据库线程池，bcrypt 校验在密码哈希线程池中执行
+    user = await run_db(get_user_from_db, None, form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
@@ -30,16 +33,16 @@ async def read_users_me(current_user: User = Depends(get_current_active_user)):
 
 @router.post("/register", response_model=User)
 async def register_user(user: UserCreate):
-    # 检查用户是否已存在
-    existing_user = authenticate_user_from_db(user.username, user.password)
-    if existing_user:
+    # 检查用户是否已存在（只查询用户名，不计算哈希）
+    if await run_db(user_exists_in_db, user.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="用户已存在",
         )
     
     # 创建新用户
-    created_user = create_user_in_db(user)
+    hashed_password = await get_password_hash_async(user.password)
+    created_user = await run_db(create_user_in_db, user, hashed_password)
     if not created_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -57,7 +60,7 @@ async def get_users(current_user: User = Depends(get_current_active_user)):
             detail="权限不足",
         )
     
-    users = get_all_users_from_db()
+    users = await run_db(get_all_users_from_db)
     return users
 
 @router.put("/users/{user_id}/role")
@@ -73,7 +76,7 @@ async def update_user_role(
             detail="权限不足",
         )
     
-    success = update_user_role_in_db(user_id, role_id)
+    success = await run_db(update_user_role_in_db, user_id, role_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -0,0 +1,71 @@
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from typing import List
+from app.models.schemas import IngestJob, User
+from app.api.dependencies import get_current_active_user
+from app.crud.ingest_jobs import get_ingest_job, get_ingest_jobs, retry_ingest_job
+from app.database.executor import run_db
+from app.services.ingest_worker import submit
+
+router = APIRouter(prefix="/api/ingest-jobs", tags=["ingest-jobs"])
+
+# 进度推送的轮询间隔（秒）
+EVENTS_POLL_INTERVAL = 1.0
+
+FINISHED_STATUSES = ("completed", "failed")
+
+
+@router.get("/", response_model=List[IngestJob])
+async def list_ingest_jobs(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(get_current_active_user)
+):
+    """当前用户最近的导入任务"""
+    return await run_db(get_ingest_jobs, current_user.id, limit)
+
+@router.get("/{job_id}", response_model=IngestJob)
+async def read_ingest_job(job_id: str, current_user: User = Depends(get_current_active_user)):
+    """导入任务的状态和进度（已提交行数、速率、预计剩余时间）"""
+    job = await run_db(get_ingest_job, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导入任务未找到")
+    return job
+
+@router.get("/{job_id}/events")
+async def stream_ingest_job(job_id: str, current_user: User = Depends(get_current_active_user)):
+    """
+    以 Server-Sent Events 推送任务进度：进度变化时发送一条 progress 事件，
+    任务结束（completed / failed）时发送 done 事件后关闭连接
+    """
+    job = await run_db(get_ingest_job, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导入任务未找到")
+
+    async def events():
+        nonlocal job
+        last = None
+        while True:
+            payload = json.dumps(jsonable_encoder(job), ensure_ascii=False)
+            if job.status in FINISHED_STATUSES:
+                yield f"event: done\ndata: {payload}\n\n"
+                return
+            if payload != last:
+                yield f"event: progress\ndata: {payload}\n\n"
+                last = payload
+            await asyncio.sleep(EVENTS_POLL_INTERVAL)
+            job = await run_db(get_ingest_job, job_id, current_user.id)
+            if not job:
+                return
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.post("/{job_id}/retry", response_model=IngestJob)
+async def retry_failed_ingest_job(job_id: str, current_user: User = Depends(get_current_active_user)):
+    """重新执行失败的任务，从已提交的进度继续"""
+    if not await run_db(retry_ingest_job, job_id, current_user.id):
+        raise HTTPException(status_code=409, detail="只能重试失败的导入任务")
+    submit(job_id)
+    return await run_db(get_ingest_job, job_id, current_user.id)
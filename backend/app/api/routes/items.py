@@ -1,40 +1,233 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import logging
+import os
+from itertools import islice
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile
 from typing import List
-from app.models.schemas import Item, ProjectUpload, ItemCreate
-from app.crud.items import get_all_items_from_db, get_item_from_db, save_items_to_db
-from app.crud.projects import create_project_in_db, update_project_items_count, get_project_from_db
-from app.api.dependencies import get_current_active_user
+from app.models.schemas import Item, ProjectUpload, ItemCreate, ItemBulkPatch, ItemBulkPatchResponse, ItemBulkDelete, ItemBulkDeleteResponse, ItemChangesResponse
+from app.crud.items import (
+    get_all_items_from_db, get_items_page_from_db, get_item_from_db, save_items_to_db, patch_items_in_db,
+    delete_items_in_db, delete_items_by_filter_in_db, search_items_from_db, ItemConflictError
+)
+from app.crud.ingest import IngestError, ingest_items
+from app.crud.pagination import InvalidCursorError
+from app.services.file_import import FileImportError, detect_format, iter_file_rows
+from app.services.profiler import profile_rows, schema_from_profile, store_table_profile
+from app.services.ingest_worker import create_job, save_job_file, save_job_items
+from app.crud.changes import CursorExpiredError, get_changes_from_db, get_project_change_marker
+from app.crud.search import InvalidSearchError
+from app.crud.item_filters import InvalidQueryError, parse_item_query, schema_field_types, validate_filters
+from app.config import ITEMS_PAGE_MAX_LIMIT, BULK_PATCH_MAX_ITEMS, PROFILE_SAMPLE_SIZE
+from app.crud.projects import create_project_in_db
+from app.api.dependencies import get_current_active_user, has_project_access
+from app.api.conditional import conditional_response, content_etag, make_etag
+from app.api.responses import ItemListResponse
+from app.database.executor import run_db
 from app.models.schemas import User
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api", tags=["items"])
 
 from typing import List, Optional
 
-from app.crud.tables import create_table, get_tables_by_project
+from app.crud.tables import create_table, get_tables_by_project, get_table, get_table_versions
 
 @router.get("/items", response_model=List[Item])
-async def get_items(projectId: Optional[int] = None, tableId: Optional[int] = None, current_user: User = Depends(get_current_active_user)):
-    items = get_all_items_from_db(current_user.id, projectId, tableId)
-    return items
+async def get_items(
+    request: Request,
+    response: Response,
+    projectId: Optional[int] = None,
+    tableId: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=ITEMS_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    filters: Optional[str] = Query(None, alias="filter"),
+    sort: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    获取项目列表
+    不传 limit/cursor 时返回全部数据（兼容旧客户端）；
+    传入 limit 时按 (updated_at, id) 游标分页，下一页游标通过 X-Next-Cursor 响应头返回，
+    没有该响应头表示已是最后一页
+
+    过滤与排序（需要指定 tableId，字段必须在表格 schema 中声明）：
+        filter=[{"field": "year", "op": "gte", "value": 1900}]  操作符见 FilterOperator
+        sort=-year,name  前缀 - 表示降序
+    字段投影（同样需要 tableId）：fields=lat,lng  data 中只返回这些字段
+
+    指定 projectId 或 tableId 时支持条件 GET：ETag 由表格版本号和查询参数计算，
+    只指定 projectId 时还包括项目的变更标记（结果中含有不属于任何表格的数据项，其写入不修改表格版本号），
+    请求头 If-None-Match 命中时返回 304，不查询数据项
+    """
+    if projectId is not None or tableId is not None:
+        versions = await run_db(get_table_versions, projectId, tableId)
+        project_marker = await run_db(get_project_change_marker, projectId) if tableId is None else None
+        etag = make_etag(
+            "items", current_user.id, projectId, tableId, limit, cursor, filters, sort, fields,
+            [(table_id, version) for table_id, version, _ in versions], project_marker
+        )
+        last_modified = max((updated_at for _, _, updated_at in versions if updated_at), default=None)
+        not_modified = conditional_response(request, response, etag, last_modified)
+        if not_modified:
+            return not_modified
+    
+    filter_list, sort_list, field_list, field_types = [], [], [], None
+    if filters or sort or fields:
+        if tableId is None:
+            raise HTTPException(status_code=400, detail="过滤、排序和字段投影需要指定 tableId")
+        table = await run_db(get_table, tableId)
+        if not table:
+            raise HTTPException(status_code=404, detail="表格未找到")
+        field_types = schema_field_types(table.schema_def)
+        try:
+            filter_list, sort_list, field_list = parse_item_query(field_types, filters, sort, fields)
+        except InvalidQueryError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    # 数据库中的 data 直接拼接进响应体，不经过 Item 校验和 jsonable_encoder（见 app.api.responses）
+    try:
+        if limit is None and cursor is None:
+            rows = await run_db(
+                get_all_items_from_db, current_user.id, projectId, tableId, filter_list, sort_list, field_types, field_list,
+                raw=True
+            )
+            return ItemListResponse.from_rows(rows, response)
+        
+        rows, next_cursor = await run_db(
+            get_items_page_from_db, current_user.id, projectId, tableId, limit or 50, cursor,
+            filter_list, sort_list, field_types, field_list, raw=True
+        )
+    except (InvalidCursorError, InvalidQueryError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return ItemListResponse.from_rows(rows, response)
+
+@router.get("/items/search", response_model=List[Item])
+async def search_items(
+    response: Response,
+    q: str,
+    projectId: Optional[int] = None,
+    tableId: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=ITEMS_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    全文检索项目（匹配 data 中所有文本字段），按相关度排序
+    q 中的每个词按前缀匹配，多个词需要同时命中；下一页游标通过 X-Next-Cursor 响应头返回
+    """
+    try:
+        rows, next_cursor = await run_db(
+            search_items_from_db, q, current_user.id, projectId, tableId, limit, cursor, raw=True
+        )
+    except (InvalidSearchError, InvalidCursorError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return ItemListResponse.from_rows(rows, response)
+
+@router.get("/items/changes", response_model=ItemChangesResponse)
+async def get_item_changes(
+    projectId: Optional[int] = None,
+    tableId: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=ITEMS_PAGE_MAX_LIMIT),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    增量同步：返回游标之后新增、修改（op=upsert）和删除（op=delete）的项目，按变更顺序排列
+    首次同步不传 cursor，返回全部现存项目；之后每次传入上次响应中的 cursor。
+    hasMore 为 true 时应立即继续拉取。游标过期（删除记录已被清理）时返回 410，客户端需要全量同步
+    """
+    if projectId is None and tableId is None:
+        raise HTTPException(status_code=400, detail="需要指定 projectId 或 tableId")
+    try:
+        changes, next_cursor, has_more = await run_db(
+            get_changes_from_db, current_user.id, projectId, tableId, cursor, limit
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CursorExpiredError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    return {"changes": changes, "cursor": next_cursor, "hasMore": has_more}
 
 @router.get("/item/{item_id}", response_model=Item)
-async def get_item(item_id: str, current_user: User = Depends(get_current_active_user)):
-    item = get_item_from_db(item_id, current_user.id)
+async def get_item(item_id: str, request: Request, response: Response,
+                   current_user: User = Depends(get_current_active_user)):
+    item = await run_db(get_item_from_db, item_id, current_user.id)
     if not item:
         raise HTTPException(status_code=404, detail="项目未找到")
+    not_modified = conditional_response(request, response, content_etag(item), item.updated_at)
+    if not_modified:
+        return not_modified
     return item
 
 @router.put("/item/{item_id}")
 async def update_item(item_id: str, item_data: dict, current_user: User = Depends(get_current_active_user)):
     from app.crud.items import update_item_in_db
     try:
-        success = update_item_in_db(item_id, item_data, current_user.id)
+        success = await run_db(update_item_in_db, item_id, item_data, current_user.id)
         if not success:
             raise HTTPException(status_code=404, detail="项目未找到或无权限")
         return {"message": "项目更新成功"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"更新失败: {str(e)}")
 
+@router.patch("/items", response_model=ItemBulkPatchResponse)
+async def patch_items(body: ItemBulkPatch, current_user: User = Depends(get_current_active_user)):
+    """
+    批量局部更新项目（表格行内编辑、地图批量改色等）
+    每项的 data 按 JSON Merge Patch 合并到已有 data：值为 null 的字段被删除，未出现的字段保持不变
+    全部更新在一个事务中完成，results 按请求顺序返回每项的状态（updated / not_found）
+    """
+    if len(body.items) > BULK_PATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单次最多更新 {BULK_PATCH_MAX_ITEMS} 个项目")
+    try:
+        results = await run_db(
+            patch_items_in_db, [(patch.id, patch.data) for patch in body.items], current_user.id
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量更新失败: {str(e)}")
+    return {
+        "updated": sum(1 for _, status in results if status == "updated"),
+        "results": [{"id": item_id, "status": status} for item_id, status in results],
+    }
+
+@router.post("/items/delete", response_model=ItemBulkDeleteResponse)
+async def delete_items(body: ItemBulkDelete, current_user: User = Depends(get_current_active_user)):
+    """
+    批量删除项目
+        {"ids": ["a", "b"]}  按 id 删除（只删除当前用户的项目）
+        {"tableId": 1, "filter": [...]}  删除表格中满足过滤条件的项目，filter 为空时清空表格
+    大批量删除按 DELETE_BATCH_SIZE 分成多个事务执行
+    """
+    if (body.ids is None) == (body.tableId is None):
+        raise HTTPException(status_code=400, detail="ids 和 tableId 必须且只能指定一个")
+    try:
+        if body.ids is not None:
+            deleted = await run_db(delete_items_in_db, body.ids, current_user.id)
+            return {"deleted": deleted}
+        
+        table = await run_db(get_table, body.tableId)
+        if not table:
+            raise HTTPException(status_code=404, detail="表格未找到")
+        if not await has_project_access(table.project_id, current_user.id):
+            raise HTTPException(status_code=404, detail="表格未找到")
+        field_types = schema_field_types(table.schema_def)
+        try:
+            filter_list = validate_filters(body.filter or [], field_types)
+        except InvalidQueryError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        deleted = await run_db(delete_items_by_filter_in_db, current_user.id, body.tableId, filter_list, field_types)
+        return {"deleted": deleted}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"删除失败: {str(e)}")
+
 @router.post("/items", response_model=Item)
 async def create_item(item: ItemCreate, current_user: User = Depends(get_current_active_user)):
     try:
@@ -43,52 +236,55 @@ async def create_item(item: ItemCreate, current_user: User = Depends(get_current
         items_data = [item.data]
         
         # 确保项目存在
-        project = get_project_from_db(item.projectId, current_user.id)
-        if not project:
+        if not await has_project_access(item.projectId, current_user.id):
             raise HTTPException(status_code=404, detail="项目未找到")
             
         # 保存数据
-        saved_ids = save_items_to_db(items_data, current_user.id, item.projectId, item.tableId)
+        saved_ids = await run_db(save_items_to_db, items_data, current_user.id, item.projectId, item.tableId)
         
         if not saved_ids:
             raise HTTPException(status_code=500, detail="保存失败")
             
         # 获取保存后的项目
-        saved_item = get_item_from_db(saved_ids[0], current_user.id)
+        saved_item = await run_db(get_item_from_db, saved_ids[0], current_user.id)
         return saved_item
         
+    except ItemConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"创建失败: {str(e)}")
 
+def _ingest_error_status(error: IngestError) -> int:
+    """写入失败的状态码：文件内容错误 400，数据项 id 已被其他用户使用 409，其他 500"""
+    if isinstance(error.__cause__, FileImportError):
+        return 400
+    if isinstance(error.__cause__, ItemConflictError):
+        return 409
+    return 500
+
 @router.post("/upload")
-async def upload_project(data: ProjectUpload, current_user: User = Depends(get_current_active_user)):
+async def upload_project(data: ProjectUpload, response: Response, current_user: User = Depends(get_current_active_user)):
     try:
-        print(f"[UPLOAD] 收到上传请求，用户: {current_user.username}")
-        print(f"[UPLOAD] 项目名称: {data.projectName}")
-        print(f"[UPLOAD] 项目ID: {data.projectId}")
-        print(f"[UPLOAD] 表格ID: {data.tableId}")
-        print(f"[UPLOAD] 数据项数量: {len(data.items)}")
-        print(f"[UPLOAD] Schema: {data.table_schema}")
+        logger.debug("[UPLOAD] 收到上传请求，用户: %s", current_user.username)
+        logger.debug("[UPLOAD] 项目名称: %s", data.projectName)
+        logger.debug("[UPLOAD] 项目ID: %s", data.projectId)
+        logger.debug("[UPLOAD] 表格ID: %s", data.tableId)
+        logger.debug("[UPLOAD] 数据项数量: %s", len(data.items))
+        logger.debug("[UPLOAD] Schema: %s", data.table_schema)
         
         project_id = data.projectId
         table_id = data.tableId
         
-        # 如果没有提供 schema，自动生成一个基础 schema
+        # 统计所有数据项（超过 PROFILE_SAMPLE_SIZE 行时抽样）；没有提供 schema 时据此推断
+        profile = await run_db(profile_rows, data.items)
         schema = data.table_schema
         if not schema and data.items:
-            # 从第一个 item 推断 schema
-            first_item = data.items[0]
-            schema = {
-                "fields": [  # 使用 fields 而不是 columns
-                    {"key": key, "label": key, "type": infer_type(value)}
-                    for key, value in first_item.items()
-                ]
-            }
-            print(f"[UPLOAD] 自动推断的 schema: {schema}")
+            schema = schema_from_profile(profile)
+            logger.debug("[UPLOAD] 自动推断的 schema: %s", schema)
 
         if project_id:
             # 验证项目是否存在且属于当前用户
-            print(f"[UPLOAD] 使用已有项目ID: {project_id}")
+            logger.debug("[UPLOAD] 使用已有项目ID: %s", project_id)
             
             if not table_id:
                 # 如果没有提供 tableId，检查是否应该创建新表或使用默认表
@@ -97,24 +293,25 @@ async def upload_project(data: ProjectUpload, current_user: User = Depends(get_c
                 # 或者如果用户意图是追加，应该提供 tableId
                 
                 # 检查项目是否有表
-                tables = get_tables_by_project(project_id)
+                tables = await run_db(get_tables_by_project, project_id)
                 if not tables:
                     # 创建默认表
-                    print(f"[UPLOAD] 项目无表格，创建默认表格")
-                    table = create_table(project_id, data.projectName, schema, "默认数据表")
+                    logger.debug("[UPLOAD] 项目无表格，创建默认表格")
+                    table = await run_db(create_table, project_id, data.projectName, schema, "默认数据表")
                     table_id = table.id
                 else:
                     # 创建新表（假设每次上传都是新表，除非指定了 tableId）
                     # 或者我们可以查找同名的表？
                     # 暂时策略：创建新表
-                    print(f"[UPLOAD] 创建新表格: {data.projectName}")
-                    table = create_table(project_id, data.projectName, schema, f"上传于 {data.projectName}")
+                    logger.debug("[UPLOAD] 创建新表格: %s", data.projectName)
+                    table = await run_db(create_table, project_id, data.projectName, schema, f"上传于 {data.projectName}")
                     table_id = table.id
         else:
             # 1. 创建新项目
-            print(f"[UPLOAD] 创建新项目...")
+            logger.debug("[UPLOAD] 创建新项目...")
             
-            project = create_project_in_db(
+            project = await run_db(
+                create_project_in_db,
                 name=data.projectName, 
                 user_id=current_user.id,
                 description=data.description,
@@ -123,44 +320,161 @@ async def upload_project(data: ProjectUpload, current_user: User = Depends(get_c
                 schema=None # Schema now lives in Table
             )
             project_id = project.id
-            print(f"[UPLOAD] 项目创建成功，ID: {project_id}")
+            logger.debug("[UPLOAD] 项目创建成功，ID: %s", project_id)
             
             # 创建默认表格
-            print(f"[UPLOAD] 创建默认表格...")
-            table = create_table(project_id, data.projectName, schema, "默认数据表")
+            logger.debug("[UPLOAD] 创建默认表格...")
+            table = await run_db(create_table, project_id, data.projectName, schema, "默认数据表")
             table_id = table.id
-            print(f"[UPLOAD] 表格创建成功，ID: {table_id}")
+            logger.debug("[UPLOAD] 表格创建成功，ID: %s", table_id)
         
         # 2. 保存项目数据到数据库，关联当前用户、项目ID和表格ID
-        print(f"[UPLOAD] 开始保存 {len(data.items)} 个数据项到表格 {table_id}...")
-        save_items_to_db(data.items, current_user.id, project_id, table_id)
-        print(f"[UPLOAD] 数据保存成功")
+        if data.background:
+            # 后台导入：数据项写入任务文件后立即返回，进度见 GET /api/ingest-jobs/{jobId}
+            path, size = await run_db(save_job_items, data.items)
+            job = await run_db(create_job, current_user.id, project_id, table_id, path, data.projectName, "ndjson", size)
+            logger.debug("[UPLOAD] 已创建后台导入任务 %s", job['id'])
+            response.status_code = 202
+            return {
+                "message": f"项目 '{data.projectName}' 已开始后台导入，共 {len(data.items)} 个项目",
+                "projectId": project_id,
+                "tableId": table_id,
+                "schema": schema,
+                "jobId": job["id"],
+                "status": job["status"]
+            }
+
+        logger.debug("[UPLOAD] 开始保存 %s 个数据项到表格 %s...", len(data.items), table_id)
+        # 分块写入，失败时之前的块已经提交；表格和项目的数据项数由数据库触发器随写入更新
+        stats = await run_db(ingest_items, data.items, current_user.id, project_id, table_id)
+        logger.debug("[UPLOAD] 数据保存成功")
         
-        # 3. 更新项目的项数
-        update_project_items_count(project_id, current_user.id, len(data.items))
-        print(f"[UPLOAD] 项目计数更新成功")
+        if not data.tableId:
+            # 新表格的数据就是本次上传的数据，列统计直接缓存
+            await run_db(store_table_profile, table_id, profile)
         
         return {
             "message": f"项目 '{data.projectName}' 上传成功，共 {len(data.items)} 个项目",
             "projectId": project_id,
             "tableId": table_id,
-            "schema": schema  # 返回 schema 供前端使用
+            "schema": schema,  # 返回 schema 供前端使用
+            "ingest": stats  # 写入统计（行数、块数、耗时、每秒行数）
         }
+    except IngestError as e:
+        raise HTTPException(status_code=_ingest_error_status(e), detail=f"上传失败: {str(e)}")
     except Exception as e:
-        import traceback
-        print(f"[UPLOAD ERROR] {str(e)}")
-        print(f"[UPLOAD ERROR TRACEBACK] {traceback.format_exc()}")
+        logger.exception("[UPLOAD] 上传失败")
         raise HTTPException(status_code=500, detail=f"上传失败: {str(e)}")
 
-def infer_type(value):
-    """推断数据类型"""
-    if isinstance(value, bool):
-        return "boolean"
-    elif isinstance(value, (int, float)):
-        return "number"
-    elif isinstance(value, list):
-        return "array"
-    elif isinstance(value, dict):
-        return "object"
-    else:
-        return "text"
\ No newline at end of file
+@router.post("/upload/file")
+async def upload_file(
+    response: Response,
+    file: UploadFile = File(...),
+    projectName: Optional[str] = Form(None),
+    projectId: Optional[int] = Form(None),
+    tableId: Optional[int] = Form(None),
+    description: Optional[str] = Form(None),
+    schema: Optional[str] = Form(None),
+    file_format: Optional[str] = Form(None, alias="format"),
+    background: bool = Form(False),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    上传 CSV / NDJSON / XLSX 文件（multipart/form-data）
+    文件由服务端逐行解析并分块写入（见 app.services.file_import、app.crud.ingest），
+    内存占用与文件大小无关；上传内容先由框架暂存到临时文件。
+
+    表单字段：
+        file: 文件，格式按扩展名识别（.csv/.tsv/.ndjson/.jsonl/.xlsx），也可以用 format 指定
+        projectId / tableId: 追加到已有项目（和表格）；不传 projectId 时创建新项目
+        projectName / description: 新项目的名称（默认为文件名）和描述
+        schema: 表格 schema 的 JSON；不传时根据各列的统计推断（见 app.services.profiler）
+            只统计前 PROFILE_SAMPLE_SIZE 行；响应中 profileTruncated 为 true 时 schema 只反映这些行
+        background: 为 true 时创建后台导入任务并立即返回 202 和 jobId（见 /api/ingest-jobs）
+    """
+    try:
+        file_format = detect_format(file.filename, file_format)
+        table_schema = json.loads(schema) if schema else None
+    except FileImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="schema 不是合法的 JSON")
+
+    if tableId is not None and projectId is None:
+        raise HTTPException(status_code=400, detail="指定 tableId 时必须同时指定 projectId")
+    if projectId is not None:
+        if not await has_project_access(projectId, current_user.id):
+            raise HTTPException(status_code=404, detail="项目未找到")
+    if tableId is not None:
+        table = await run_db(get_table, tableId)
+        if not table or table.project_id != projectId:
+            raise HTTPException(status_code=404, detail="表格未找到")
+
+    # 先解析前 PROFILE_SAMPLE_SIZE 行统计各列（用于推断 schema），这些行中的格式错误在创建项目和写入数据之前
+    # 就能发现；之后的格式错误在写入时报告，此前已写入的块不会回滚（见 app.crud.ingest）
+    parsed = iter_file_rows(file.file, file_format)
+    try:
+        profile = await run_db(profile_rows, islice(parsed, PROFILE_SAMPLE_SIZE))
+    except FileImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        parsed.close()
+    if not profile["rows"]:
+        raise HTTPException(status_code=400, detail="文件中没有数据")
+    if not table_schema:
+        table_schema = schema_from_profile(profile)
+    file.file.seek(0)
+    # 统计（以及推断的 schema）覆盖的范围
+    profile_scope = {"profiledRows": profile["rows"], "profileTruncated": profile["rows"] >= PROFILE_SAMPLE_SIZE}
+
+    name = projectName or os.path.splitext(file.filename or "")[0] or "未命名项目"
+    project_id, table_id = projectId, tableId
+    if project_id is None:
+        project = await run_db(
+            create_project_in_db,
+            name=name,
+            user_id=current_user.id,
+            description=description,
+            source_type="upload",
+            source_metadata={"original_name": file.filename, "format": file_format},
+            schema=None
+        )
+        project_id = project.id
+    if table_id is None:
+        table = await run_db(create_table, project_id, name, table_schema, f"上传于 {file.filename}")
+        table_id = table.id
+
+    if background:
+        path, size = await run_db(save_job_file, file.file, file_format)
+        await file.close()
+        job = await run_db(create_job, current_user.id, project_id, table_id, path, file.filename, file_format, size)
+        response.status_code = 202
+        return {
+            "message": f"文件 '{file.filename}' 已开始后台导入",
+            "projectId": project_id,
+            "tableId": table_id,
+            "schema": table_schema,
+            **profile_scope,
+            "jobId": job["id"],
+            "status": job["status"]
+        }
+
+    logger.debug("[UPLOAD] 开始写入文件 %s（%s）到表格 %s...", file.filename, file_format, table_id)
+    try:
+        stats = await run_db(ingest_items, iter_file_rows(file.file, file_format), current_user.id, project_id, table_id)
+    except IngestError as e:
+        raise HTTPException(status_code=_ingest_error_status(e), detail=f"上传失败: {str(e)}")
+    finally:
+        await file.close()
+    if tableId is None and not profile_scope["profileTruncated"]:
+        # 统计覆盖了整个文件时直接缓存；否则由 profile 接口按需统计表格数据
+        await run_db(store_table_profile, table_id, profile)
+
+    return {
+        "message": f"文件 '{file.filename}' 上传成功，共 {stats['rows']} 个项目",
+        "projectId": project_id,
+        "tableId": table_id,
+        "schema": table_schema,
+        **profile_scope,
+        "ingest": stats
+    }
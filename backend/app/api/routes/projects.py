@@ -1,9 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
-from app.models.schemas import Project, ProjectCreate, Table, TableCreate
-from app.crud.projects import get_projects_from_db, get_project_from_db, create_project_in_db, delete_project_from_db
-from app.crud.tables import create_table, get_tables_by_project, get_table
-from app.api.dependencies import get_current_active_user
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+import json
+from datetime import datetime
+from app.models.schemas import AggregateResult, Project, ProjectCreate, Table, TableCreate, TableProfile
+from app.crud.projects import (
+    get_project_with_tables, get_projects_with_tables, create_project_in_db, delete_project_from_db
+)
+from app.crud.tables import create_table, get_tables_by_project, get_table, delete_table_from_db
+from app.crud.items import iter_items_from_db
+from app.crud.item_filters import InvalidQueryError, parse_filters, parse_item_query, schema_field_types
+from app.crud.aggregate import aggregate_items, parse_group_by, parse_metrics
+from app.config import AGGREGATE_MAX_GROUPS, EXPORT_BATCH_SIZE
+from app.api.dependencies import get_current_active_user, has_project_access
+from app.api.conditional import conditional_response, content_etag, make_etag
+from app.services.profiler import get_or_build_table_profile
+from app.api.arrow_export import MEDIA_TYPE as ARROW_MEDIA_TYPE, arrow_stream_chunks
+from app.api.responses import iso_datetime
+from app.database.executor import iterate_in_db_thread, run_db
 from app.models.schemas import User
 from pydantic import BaseModel
 from app.services.geocoding_service import GeocodingService
@@ -14,24 +28,25 @@ router = APIRouter(prefix="/api/projects", tags=["projects"])
 
 @router.get("/", response_model=List[Project])
 async def get_projects(current_user: User = Depends(get_current_active_user)):
-    projects = get_projects_from_db(current_user.id)
-    # Populate tables for each project
-    for project in projects:
-        project.tables = get_tables_by_project(project.id)
-    return projects
+    # 项目和所有表格各一条查询（见 get_projects_with_tables）
+    return await run_db(get_projects_with_tables, current_user.id)
 
 @router.get("/{project_id}", response_model=Project)
-async def get_project(project_id: int, current_user: User = Depends(get_current_active_user)):
-    project = get_project_from_db(project_id, current_user.id)
+async def get_project(project_id: int, request: Request, response: Response,
+                      current_user: User = Depends(get_current_active_user)):
+    project = await run_db(get_project_with_tables, project_id, current_user.id)
     if not project:
         raise HTTPException(status_code=404, detail="项目未找到")
-    project.tables = get_tables_by_project(project.id)
+    not_modified = conditional_response(request, response, content_etag(project), project.last_modified)
+    if not_modified:
+        return not_modified
     return project
 
 @router.post("/", response_model=Project)
 async def create_project(project: ProjectCreate, current_user: User = Depends(get_current_active_user)):
     try:
-        created_project = create_project_in_db(
+        created_project = await run_db(
+            create_project_in_db,
             name=project.name, 
             user_id=current_user.id,
             description=project.description,
@@ -39,18 +54,20 @@ async def create_project(project: ProjectCreate, current_user: User = Depends(ge
             source_metadata=project.source_metadata
         )
         
-        # Create default table
-        create_table(created_project.id, created_project.name, project.table_schema, "默认数据表")
-        
-        created_project.tables = get_tables_by_project(created_project.id)
+        # Create default table（新项目只有这一个表格，直接使用返回的表格，不再查询）
+        table = await run_db(create_table, created_project.id, created_project.name, project.table_schema, "默认数据表")
+        created_project.tables = [table]
         return created_project
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"创建项目失败: {str(e)}")
 
 @router.delete("/{project_id}")
 async def delete_project(project_id: int, current_user: User = Depends(get_current_active_user)):
+    """删除项目，同时删除项目下的所有表格和数据项"""
+    if project_id == 0:
+        raise HTTPException(status_code=403, detail="系统项目不能删除")
     try:
-        success = delete_project_from_db(project_id, current_user.id)
+        success = await run_db(delete_project_from_db, project_id, current_user.id)
         if not success:
             raise HTTPException(status_code=404, detail="项目未找到")
         return {"message": "项目删除成功"}
@@ -58,20 +75,23 @@ async def delete_project(project_id: int, current_user: User = Depends(get_curre
         raise HTTPException(status_code=500, detail=f"删除项目失败: {str(e)}")
 
 @router.get("/{project_id}/tables", response_model=List[Table])
-async def get_project_tables(project_id: int, current_user: User = Depends(get_current_active_user)):
+async def get_project_tables(project_id: int, request: Request, response: Response,
+                             current_user: User = Depends(get_current_active_user)):
     # Check if project exists and belongs to user
-    project = get_project_from_db(project_id, current_user.id)
-    if not project:
+    if not await has_project_access(project_id, current_user.id):
         raise HTTPException(status_code=404, detail="项目未找到")
     
-    tables = get_tables_by_project(project_id)
+    tables = await run_db(get_tables_by_project, project_id)
+    last_modified = max((table.updated_at for table in tables if table.updated_at), default=None)
+    not_modified = conditional_response(request, response, content_etag(tables), last_modified)
+    if not_modified:
+        return not_modified
     return tables
 
 @router.post("/{project_id}/tables", response_model=Table)
 async def create_project_table(project_id: int, table: TableCreate, current_user: User = Depends(get_current_active_user)):
     # Check if project exists and belongs to user
-    project = get_project_from_db(project_id, current_user.id)
-    if not project:
+    if not await has_project_access(project_id, current_user.id):
         raise HTTPException(status_code=404, detail="项目未找到")
         
     try:
@@ -111,11 +131,164 @@ async def create_project_table(project_id: int, table: TableCreate, current_user
                 "view_settings": table.schema_def.view_settings
             }
             
-        new_table = create_table(project_id, table.name, schema_dict, table.description)
+        new_table = await run_db(create_table, project_id, table.name, schema_dict, table.description)
         return new_table
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"创建表格失败: {str(e)}")
 
+@router.delete("/{project_id}/tables/{table_id}")
+async def delete_project_table(project_id: int, table_id: int, current_user: User = Depends(get_current_active_user)):
+    """删除表格及其所有数据项"""
+    if not await has_project_access(project_id, current_user.id):
+        raise HTTPException(status_code=404, detail="项目未找到")
+    table = await run_db(get_table, table_id)
+    if not table or table.project_id != project_id:
+        raise HTTPException(status_code=404, detail="表格未找到")
+    try:
+        await run_db(delete_table_from_db, table_id)
+        return {"message": "表格删除成功"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"删除表格失败: {str(e)}")
+
+@router.get("/{project_id}/tables/{table_id}/profile", response_model=TableProfile)
+async def get_table_profile(
+    project_id: int,
+    table_id: int,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    表格的列统计：每列的推断类型、语义角色、空值比例、不同值个数、最小/最大值
+    结果按表格版本号缓存，数据变化后首次请求时重新统计（超过 PROFILE_SAMPLE_SIZE 行时抽样）
+    """
+    if not await has_project_access(project_id, current_user.id):
+        raise HTTPException(status_code=404, detail="项目未找到")
+    table = await run_db(get_table, table_id)
+    if not table or table.project_id != project_id:
+        raise HTTPException(status_code=404, detail="表格未找到")
+
+    not_modified = conditional_response(
+        request, response, make_etag("profile", table_id, table.version), table.updated_at
+    )
+    if not_modified:
+        return not_modified
+    return await run_db(get_or_build_table_profile, table_id, project_id, table.version, current_user.id)
+
+@router.get("/{project_id}/tables/{table_id}/aggregate", response_model=AggregateResult)
+async def aggregate_table(
+    project_id: int,
+    table_id: int,
+    request: Request,
+    response: Response,
+    group_by: Optional[str] = Query(None, alias="groupBy", description="分组，逗号分隔，如 category,year:10,born:month"),
+    metrics: Optional[str] = Query(None, description="指标，逗号分隔，如 avg:year,max:born（count 总是返回）"),
+    filters: Optional[str] = Query(None, alias="filter", description="过滤条件（JSON 数组），同 GET /api/items"),
+    limit: int = Query(1000, ge=1, le=AGGREGATE_MAX_GROUPS, description="最多返回的分组数"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    在数据库中分组聚合表格数据（分组计数、数值汇总、直方图、按日期分桶），语法见 app.crud.aggregate
+    结果按表格版本号缓存，支持 ETag
+    """
+    if not await has_project_access(project_id, current_user.id):
+        raise HTTPException(status_code=404, detail="项目未找到")
+    table = await run_db(get_table, table_id)
+    if not table or table.project_id != project_id:
+        raise HTTPException(status_code=404, detail="表格未找到")
+
+    field_types = schema_field_types(table.schema_def)
+    try:
+        groups = parse_group_by(group_by, field_types)
+        metric_list = parse_metrics(metrics, field_types)
+        filter_list = parse_filters(filters, field_types)
+    except InvalidQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    etag = make_etag("aggregate", table_id, table.version, group_by, metrics, filters, limit)
+    not_modified = conditional_response(request, response, etag, table.updated_at)
+    if not_modified:
+        return not_modified
+    return await run_db(
+        aggregate_items, current_user.id, project_id, table_id, table.version, field_types,
+        groups, metric_list, filter_list, limit
+    )
+
+# ========== 数据导出 ==========
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _export_chunks(rows, export_format: str, batch_size: int):
+    """
+    把逐行读取的数据编码成 NDJSON 或 JSON 数组，每 batch_size 行输出一块
+    """
+    buffer = []
+    first = True
+    if export_format == "json":
+        yield "["
+    for row in rows:
+        row.pop("project_id", None)
+        # 时间格式与 GET /api/items 一致
+        row["created_at"] = iso_datetime(row.get("created_at"))
+        row["updated_at"] = iso_datetime(row.get("updated_at"))
+        line = json.dumps(row, ensure_ascii=False, default=_json_default)
+        if export_format == "json":
+            buffer.append(line if first else "," + line)
+        else:
+            buffer.append(line + "\n")
+        first = False
+        if len(buffer) >= batch_size:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+    if export_format == "json":
+        yield "]"
+
+@router.get("/{project_id}/tables/{table_id}/export")
+async def export_table(
+    project_id: int,
+    table_id: int,
+    export_format: str = Query("ndjson", alias="format", regex="^(ndjson|json|arrow)$"),
+    filters: Optional[str] = Query(None, alias="filter"),
+    sort: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    流式导出表格数据
+    format=ndjson（默认，每行一个 JSON 对象）、json（分块输出的 JSON 数组）
+    或 arrow（Arrow IPC 流，按 schema 字段类型输出类型化的列，见 app.api.arrow_export）
+    支持与 GET /api/items 相同的 filter / sort / fields 参数
+    服务端逐批读取并输出，内存占用与表格大小无关，客户端可以边接收边处理
+    """
+    if not await has_project_access(project_id, current_user.id):
+        raise HTTPException(status_code=404, detail="项目未找到")
+    table = await run_db(get_table, table_id)
+    if not table or table.project_id != project_id:
+        raise HTTPException(status_code=404, detail="表格未找到")
+    
+    field_types = schema_field_types(table.schema_def)
+    try:
+        filter_list, sort_list, field_list = parse_item_query(field_types, filters, sort, fields)
+    except InvalidQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    rows = iter_items_from_db(
+        current_user.id, project_id, table_id, filter_list, sort_list, field_types, field_list,
+        batch_size=EXPORT_BATCH_SIZE
+    )
+    # 读取和编码都在同一个线程中执行（生成器持有连接，见 iterate_in_db_thread）
+    if export_format == "arrow":
+        chunks = arrow_stream_chunks(rows, table.schema_def, field_list, EXPORT_BATCH_SIZE)
+        return StreamingResponse(iterate_in_db_thread(chunks), media_type=ARROW_MEDIA_TYPE)
+    media_type = "application/json" if export_format == "json" else "application/x-ndjson"
+    chunks = _export_chunks(rows, export_format, EXPORT_BATCH_SIZE)
+    return StreamingResponse(iterate_in_db_thread(chunks), media_type=media_type)
+
 # ========== 地理编码相关 API ==========
 
 from fastapi import BackgroundTasks
@@ -143,12 +316,10 @@ async def process_geocoding_background(
     """后台处理地理编码"""
     try:
         print(f"[Background] 开始后台地理编码 {len(addresses)} 个地址...")
-        # 注意：后台任务中无法使用依赖注入的 db，需要创建新的连接
-        from app.database.connection import get_db_connection
-        
+        # 注意：后台任务中无法使用依赖注入的 db，CRUD 层会自行从连接池借出连接
         # 创建 GeocodingService（使用项目缓存或全局缓存）
         cache_project_id = project_id if use_project_cache else None
-        service = GeocodingService(db=None, project_id=cache_project_id)
+        service = await run_db(GeocodingService, db=None, project_id=cache_project_id)
         
         await service.batch_geocode(addresses)
         print(f"[Background] 后台地理编码完成")
@@ -173,12 +344,11 @@ async def geocode_addresses(
         地理编码结果,包括成功和失败的地址
     """
     # 检查项目权限
-    project = get_project_from_db(project_id, current_user.id)
-    if not project:
+    if not await has_project_access(project_id, current_user.id):
         raise HTTPException(status_code=404, detail="项目未找到")
     
-    # 创建地理编码服务（始终使用全局缓存）
-    geocoding_service = GeocodingService(db=None)
+    # 创建地理编码服务（始终使用全局缓存，初始化时需要查询缓存表 ID）
+    geocoding_service = await run_db(GeocodingService, db=None)
     
     # 去重地址列表
     unique_addresses = list(set(filter(None, request.addresses)))
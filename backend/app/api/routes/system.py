@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends
+from app.models.schemas import User
+from app.api.dependencies import get_current_admin_user
+from app.api.rate_limit import get_rate_limit_stats
+from app.crud.cache import get_metadata_cache_stats
+from app.database.connection import get_pool_stats
+from app.database.executor import run_db
+from app.database.maintenance import reclaim_orphans
+
+router = APIRouter(prefix="/api/system", tags=["system"])
+
+@router.get("/db-pool")
+async def db_pool_stats(current_user: User = Depends(get_current_admin_user)):
+    """
+    数据库连接池统计（仅管理员）
+    in_use / saturation 接近上限、waits 与 timeouts 持续增长说明连接池需要扩容
+    """
+    return get_pool_stats()
+
+
+@router.get("/metadata-cache")
+async def metadata_cache_stats(current_user: User = Depends(get_current_admin_user)):
+    """
+    元数据缓存（当前用户、项目归属、已验证的令牌）的命中率统计（仅管理员）
+    """
+    return get_metadata_cache_stats()
+
+
+@router.get("/rate-limits")
+async def rate_limit_stats(current_user: User = Depends(get_current_admin_user)):
+    """
+    上传、地理编码、导出的限流统计（仅管理员）：当前并发数、累计通过次数和按原因统计的拒绝次数
+    """
+    return get_rate_limit_stats()
+
+
+@router.post("/reclaim-orphans")
+async def reclaim_orphan_rows(current_user: User = Depends(get_current_admin_user)):
+    """
+    清理所属项目或表格已不存在的数据项和表格（仅管理员）
+    返回删除的数据项数和表格数；回收磁盘空间请使用 python -m app.database.maintenance --vacuum
+    """
+    return await run_db(reclaim_orphans)
@@ -1,7 +1,48 @@
-from app.config import pwd_context
+"""
+密码哈希
+bcrypt 每次计算约几百毫秒 CPU，登录和注册在专用的有界线程池中计算（verify_password_async /
+get_password_hash_async），不占用事件循环和数据库线程池，并发登录时最多占用 PASSWORD_HASH_WORKERS 个 CPU
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.config import PASSWORD_HASH_WORKERS, pwd_context
+
+_executor = None
+_executor_lock = threading.Lock()
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+    return _executor
+
+async def _run_hash(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), functools.partial(func, *args))
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    """在密码哈希线程池中校验密码"""
+    return await _run_hash(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    """在密码哈希线程池中计算密码哈希"""
+    return await _run_hash(get_password_hash, password)
+
+def shutdown_hash_executor():
+    """关闭密码哈希线程池（应用退出时调用）"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
@@ -6,12 +6,81 @@ from fastapi.security import OAuth2PasswordBearer
 SECRET_KEY = os.environ.get("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))  # bcrypt 计算成本（每加 1 耗时翻倍），只影响新生成的哈希
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))  # 计算密码哈希的线程数，限制登录和注册占用的 CPU
+JWT_CACHE_SIZE = int(os.environ.get("JWT_CACHE_SIZE", "10000"))  # 缓存已验证签名的令牌数（缓存到令牌过期），0 表示不缓存
 
 # 数据库连接配置
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///db/data.db")
 
+# 数据库连接池配置
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))  # PostgreSQL 预建连接数
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))  # PostgreSQL 最大连接数
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))  # 等待空闲连接的超时时间（秒）
+DB_POOL_MAX_LIFETIME = float(os.environ.get("DB_POOL_MAX_LIFETIME", "1800"))  # 连接最大存活时间（秒），0 表示不回收
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))  # 空闲超过该时间的连接借出前做健康检查
+
+# 数据库线程池：async 路由中的同步 CRUD 调用在该线程池中执行，默认与连接池上限一致
+DB_EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", str(DB_POOL_MAX_SIZE)))
+
+# 分页配置
+ITEMS_PAGE_MAX_LIMIT = int(os.environ.get("ITEMS_PAGE_MAX_LIMIT", "1000"))  # 单页最大条数
+
+# 批量更新配置
+BULK_PATCH_MAX_ITEMS = int(os.environ.get("BULK_PATCH_MAX_ITEMS", "10000"))  # 单次批量更新的最大条数
+
+# 批量删除配置
+DELETE_BATCH_SIZE = int(os.environ.get("DELETE_BATCH_SIZE", "1000"))  # 每个删除事务删除的行数，避免长时间锁住 SQLite
+
+# 增量同步配置
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))  # 删除记录（墓碑）保留天数，更早的同步游标需要全量同步
+
+# 批量写入配置
+INGEST_CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", "5000"))  # 上传数据时每个写入事务的行数
+
+# 后台导入任务配置
+INGEST_JOBS_DIR = os.environ.get("INGEST_JOBS_DIR", "db/ingest_jobs")  # 待导入文件的存放目录（多进程部署时需共享）
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))  # 每个进程同时执行的导入任务数
+INGEST_JOB_STALE_SECONDS = int(os.environ.get("INGEST_JOB_STALE_SECONDS", "120"))  # 执行中的任务超过该时间没有进度视为中断，由其他进程接手
+
+# 列统计配置
+PROFILE_SAMPLE_SIZE = int(os.environ.get("PROFILE_SAMPLE_SIZE", "20000"))  # 列统计和 schema 推断最多使用的行数（蓄水池抽样）
+
+# 元数据缓存配置（当前用户、项目归属）
+METADATA_CACHE_TTL = float(os.environ.get("METADATA_CACHE_TTL", "30"))  # 缓存有效期（秒），其他进程的修改最多延迟这么久生效；0 表示不缓存
+METADATA_CACHE_SIZE = int(os.environ.get("METADATA_CACHE_SIZE", "10000"))  # 每种元数据最多缓存的条目数
+
+# 表格 schema 缓存配置
+SCHEMA_CACHE_SIZE = int(os.environ.get("SCHEMA_CACHE_SIZE", "4096"))  # 进程内缓存的已解析表格 schema 数
+
+# 聚合统计配置
+AGGREGATE_MAX_GROUPS = int(os.environ.get("AGGREGATE_MAX_GROUPS", "10000"))  # 单次聚合最多返回的分组数
+AGGREGATE_CACHE_SIZE = int(os.environ.get("AGGREGATE_CACHE_SIZE", "256"))  # 进程内缓存的聚合结果数（按表格版本号失效）
+
+# 重接口的限流配置（每个进程单独计数；0 表示不限制）
+# *_RATE_PER_MINUTE：每个用户每分钟的请求数（令牌桶，可一次用完一分钟的额度）
+# *_MAX_CONCURRENT_PER_USER / *_MAX_CONCURRENT：每个用户 / 所有用户同时执行的请求数
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1") == "1"
+UPLOAD_RATE_PER_MINUTE = float(os.environ.get("UPLOAD_RATE_PER_MINUTE", "20"))  # POST /api/upload、/api/upload/file
+UPLOAD_MAX_CONCURRENT_PER_USER = int(os.environ.get("UPLOAD_MAX_CONCURRENT_PER_USER", "2"))
+# 同步上传在整个解析和写入期间占用一个数据库线程，默认最多占用一半，其余留给普通请求
+UPLOAD_MAX_CONCURRENT = int(os.environ.get("UPLOAD_MAX_CONCURRENT", str(max(1, DB_EXECUTOR_WORKERS // 2))))
+GEOCODE_RATE_PER_MINUTE = float(os.environ.get("GEOCODE_RATE_PER_MINUTE", "10"))  # POST /api/projects/{id}/geocode
+GEOCODE_MAX_CONCURRENT_PER_USER = int(os.environ.get("GEOCODE_MAX_CONCURRENT_PER_USER", "1"))
+GEOCODE_MAX_CONCURRENT = int(os.environ.get("GEOCODE_MAX_CONCURRENT", "4"))
+EXPORT_RATE_PER_MINUTE = float(os.environ.get("EXPORT_RATE_PER_MINUTE", "30"))  # GET /api/projects/{id}/tables/{id}/export
+EXPORT_MAX_CONCURRENT_PER_USER = int(os.environ.get("EXPORT_MAX_CONCURRENT_PER_USER", "2"))
+EXPORT_MAX_CONCURRENT = int(os.environ.get("EXPORT_MAX_CONCURRENT", "8"))
+
+# 流式导出的读取线程数：每个导出固定在一个空闲线程上执行，默认与导出并发上限一致，
+# 限流开启时每个导出独占一个线程；超过线程数的导出与其他导出共用线程，分批交替执行
+DB_STREAM_WORKERS = int(os.environ.get("DB_STREAM_WORKERS", str(EXPORT_MAX_CONCURRENT or 8)))
+
+# 导出配置
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))  # 流式导出每批读取的行数
+
 # 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
\ No newline at end of file
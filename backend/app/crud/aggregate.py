@@ -0,0 +1,283 @@
+"""
+表格数据的聚合统计（分组计数、数值汇总、直方图、按日期分桶）
+在数据库中对 items.data 的字段分组聚合（SQLite json_extract / PostgreSQL JSONB），
+只返回分组结果，前端的图表和图例计数不需要下载全部数据项。
+
+分组（groupBy，逗号分隔）：
+    field          按字段值分组；多选字段按每个选项分组（一个数据项计入它的每个选项，最多一个多选字段）
+    field:10       数值字段按固定宽度分桶（直方图），分组值为桶的下界，桶为 [下界, 下界 + 宽度)
+    field:month    日期字段按 year / month / day 分桶，分组值为 "2020" / "2020-01" / "2020-01-05"
+                   （按 ISO 格式的日期文本截取，不是 ISO 格式的值归入空值分组）
+
+指标（metrics，逗号分隔）：count（总是返回），sum:field / avg:field（数值字段），
+min:field / max:field（数值或日期字段）
+
+结果按表格版本号缓存在进程内（AGGREGATE_CACHE_SIZE 个），表格有写入后版本号变化，缓存自然失效。
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import AGGREGATE_CACHE_SIZE
+from app.database.connection import get_connection
+from app.models.schemas import ItemFilter
+from app.crud.item_filters import (
+    ARRAY_TYPES, NUMERIC_TYPES, InvalidQueryError, compile_filters, field_expression, json_path
+)
+from app.crud.items import _scope_clause
+
+DATE_TYPES = {"date"}
+# 日期分桶 -> ISO 日期文本截取的长度
+DATE_BUCKETS = {"year": 4, "month": 7, "day": 10}
+METRICS = ("sum", "avg", "min", "max")
+
+_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class GroupSpec:
+    """一个分组：字段、字段类型，以及直方图宽度或日期分桶（二者至多一个）"""
+
+    def __init__(self, key: str, field_type: str, width: Optional[float] = None, date_bucket: Optional[str] = None):
+        self.key = key
+        self.field_type = field_type
+        self.width = width
+        self.date_bucket = date_bucket
+
+    @property
+    def name(self) -> str:
+        """结果中分组值的键，与请求中的写法一致"""
+        if self.width is not None:
+            return f"{self.key}:{_format_number(self.width)}"
+        if self.date_bucket:
+            return f"{self.key}:{self.date_bucket}"
+        return self.key
+
+    @property
+    def bucketed(self) -> bool:
+        return self.width is not None or self.date_bucket is not None
+
+
+def _format_number(value: float):
+    return int(value) if float(value).is_integer() else value
+
+def _parse_group(spec: str, field_types: Dict[str, str]) -> GroupSpec:
+    if spec in field_types:
+        return GroupSpec(spec, field_types[spec])
+    key, _, bucket = spec.rpartition(":")
+    if key not in field_types:
+        raise InvalidQueryError(f"分组字段 '{spec}' 未在表格 schema 中声明")
+    field_type = field_types[key]
+    if bucket in DATE_BUCKETS:
+        if field_type not in DATE_TYPES:
+            raise InvalidQueryError(f"字段 '{key}' 不是日期字段，不能按 {bucket} 分桶")
+        return GroupSpec(key, field_type, date_bucket=bucket)
+    try:
+        width = float(bucket)
+    except ValueError:
+        raise InvalidQueryError(f"无法识别的分组方式 '{bucket}'，可用：数值宽度、year、month、day")
+    if field_type not in NUMERIC_TYPES:
+        raise InvalidQueryError(f"字段 '{key}' 不是数值字段，不能按宽度分桶")
+    if not width > 0 or width == float("inf"):
+        raise InvalidQueryError(f"字段 '{key}' 的分桶宽度必须是正数")
+    return GroupSpec(key, field_type, width=width)
+
+def parse_group_by(raw: Optional[str], field_types: Dict[str, str]) -> List[GroupSpec]:
+    """
+    解析分组表达式，例如 "category,year:10,born:month"
+
+    Raises:
+        InvalidQueryError: 字段未声明、分组方式与字段类型不符
+    """
+    groups = []
+    for spec in (raw or "").split(","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        group = _parse_group(spec, field_types)
+        if any(existing.name == group.name for existing in groups):
+            continue
+        groups.append(group)
+    if sum(group.field_type in ARRAY_TYPES for group in groups) > 1:
+        raise InvalidQueryError("最多只能按一个多选字段分组")
+    return groups
+
+def parse_metrics(raw: Optional[str], field_types: Dict[str, str]) -> List[Tuple[str, str]]:
+    """
+    解析指标表达式，例如 "count,avg:year,max:born"；count 总是返回，不需要写
+
+    Returns:
+        [(聚合函数, 字段 key), ...]
+    """
+    metrics = []
+    for spec in (raw or "").split(","):
+        spec = spec.strip()
+        if not spec or spec == "count":
+            continue
+        func, _, key = spec.partition(":")
+        if func not in METRICS or not key:
+            raise InvalidQueryError(f"无法识别的指标 '{spec}'，可用：count、sum:字段、avg:字段、min:字段、max:字段")
+        if key not in field_types:
+            raise InvalidQueryError(f"指标字段 '{key}' 未在表格 schema 中声明")
+        field_type = field_types[key]
+        if field_type not in NUMERIC_TYPES and not (func in ("min", "max") and field_type in DATE_TYPES):
+            raise InvalidQueryError(f"字段 '{key}' 的类型为 {field_type}，不支持 {func}")
+        if (func, key) not in metrics:
+            metrics.append((func, key))
+    return metrics
+
+def _group_expression(group: GroupSpec, sqlite: bool) -> Tuple[str, list]:
+    if group.field_type in ARRAY_TYPES:
+        # 多选字段的选项来自 FROM 中展开的 _option 表
+        return ("CAST(_option.value AS TEXT)" if sqlite else "_option.value"), []
+    if group.width is not None:
+        expr, params = field_expression(group.key, "number", sqlite)
+        scaled, scaled_params = f"({expr} / ?)", params + [group.width]
+        if sqlite:
+            # SQLite 不一定编译了数学函数，用 CAST 截断后修正负数得到 floor
+            return (
+                f"(CAST({scaled} AS INTEGER) - ({scaled} < CAST({scaled} AS INTEGER)))",
+                scaled_params * 3
+            )
+        return f"floor({scaled})::bigint", scaled_params
+    if group.date_bucket:
+        expr, params = field_expression(group.key, "text", sqlite)
+        length = DATE_BUCKETS[group.date_bucket]
+        if sqlite:
+            condition = f"{expr} GLOB '[0-9][0-9][0-9][0-9]-*'"
+        else:
+            condition = f"{expr} ~ '^[0-9]{{4}}-'"
+        return f"(CASE WHEN {condition} THEN substr({expr}, 1, {length}) END)", params * 2
+    if group.field_type in NUMERIC_TYPES:
+        return field_expression(group.key, "number", sqlite)
+    return field_expression(group.key, "text", sqlite)
+
+def _option_source(group: GroupSpec, sqlite: bool) -> Tuple[str, list]:
+    """展开多选字段的 FROM 子句（值不是数组的数据项没有选项，不计入分组）"""
+    if sqlite:
+        path = json_path(group.key)
+        return (
+            ", json_each(CASE WHEN json_type(data, ?) = 'array' THEN json_extract(data, ?) ELSE '[]' END) AS _option",
+            [path, path]
+        )
+    return (
+        " CROSS JOIN LATERAL jsonb_array_elements_text("
+        "CASE WHEN jsonb_typeof(data->?) = 'array' THEN data->? ELSE '[]'::jsonb END) AS _option(value)",
+        [group.key, group.key]
+    )
+
+def _metric_expression(func: str, key: str, field_type: str, sqlite: bool) -> Tuple[str, list]:
+    if field_type in NUMERIC_TYPES:
+        return field_expression(key, "number", sqlite)
+    return field_expression(key, "text", sqlite)
+
+def _build_aggregate_query(sqlite: bool, user_id: int, project_id: int, table_id: int,
+                           field_types: Dict[str, str], groups: List[GroupSpec],
+                           metrics: List[Tuple[str, str]], filters: Optional[List[ItemFilter]],
+                           limit: int) -> Tuple[str, list]:
+    """
+    先在子查询中算出每行的分组值和指标字段值，再在外层分组聚合，每个表达式只出现一次
+    有分桶时按分组值排序（直方图、时间序列），否则按数量降序；空值分组排在最后
+    """
+    columns, params = [], []
+    for i, group in enumerate(groups):
+        expr, expr_params = _group_expression(group, sqlite)
+        columns.append(f"{expr} AS _g{i}")
+        params.extend(expr_params)
+    for i, (func, key) in enumerate(metrics):
+        expr, expr_params = _metric_expression(func, key, field_types[key], sqlite)
+        columns.append(f"{expr} AS _m{i}")
+        params.extend(expr_params)
+    if not columns:
+        columns.append("1 AS _one")
+
+    from_clause = "items"
+    for group in groups:
+        if group.field_type in ARRAY_TYPES:
+            source, source_params = _option_source(group, sqlite)
+            from_clause += source
+            params.extend(source_params)
+
+    where, where_params = _scope_clause(user_id, project_id, table_id)
+    if filters:
+        clause, clause_params = compile_filters(filters, field_types, sqlite)
+        where += f" AND {clause}"
+        where_params.extend(clause_params)
+    params.extend(where_params)
+
+    group_columns = [f"_g{i}" for i in range(len(groups))]
+    select = group_columns + ["COUNT(*) AS _count"] + [
+        f"{func.upper()}(_m{i}) AS _m{i}" for i, (func, _) in enumerate(metrics)
+    ]
+    query = f"SELECT {', '.join(select)} FROM (SELECT {', '.join(columns)} FROM {from_clause} WHERE {where}) AS _rows"
+    if groups:
+        order = []
+        if not any(group.bucketed for group in groups):
+            order.append("_count DESC")
+        for column in group_columns:
+            order.extend([f"{column} IS NULL", column])
+        query += f" GROUP BY {', '.join(group_columns)} ORDER BY {', '.join(order)} LIMIT ?"
+        # 多取一行用于判断结果是否被截断
+        params.append(limit + 1)
+
+    if not sqlite:  # PostgreSQL
+        query = query.replace("?", "%s")
+    return query, params
+
+def _group_value(group: GroupSpec, value: Any) -> Any:
+    if value is None:
+        return None
+    if group.width is not None:
+        return _format_number(value * group.width)
+    return value
+
+def _cache_key(user_id: int, table_id: int, version: int, groups: List[GroupSpec],
+               metrics: List[Tuple[str, str]], filters: Optional[List[ItemFilter]], limit: int) -> tuple:
+    filter_key = json.dumps([condition.dict() for condition in filters or []], sort_keys=True, default=str)
+    return (user_id, table_id, version, tuple(group.name for group in groups), tuple(metrics), filter_key, limit)
+
+def aggregate_items(user_id: int, project_id: int, table_id: int, version: int, field_types: Dict[str, str],
+                    groups: List[GroupSpec], metrics: List[Tuple[str, str]],
+                    filters: Optional[List[ItemFilter]] = None, limit: int = 1000) -> dict:
+    """
+    按分组聚合表格中的数据项
+    version 为查询前读取的表格版本号，用作缓存键
+
+    Returns:
+        {"groups": [{"key": {分组: 值}, "count": 数量, "metrics": {"avg:year": 值}}, ...],
+         "truncated": 分组数是否超过 limit, "version": 版本号}
+    """
+    key = _cache_key(user_id, table_id, version, groups, metrics, filters, limit)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        query, params = _build_aggregate_query(
+            sqlite, user_id, project_id, table_id, field_types, groups, metrics, filters, limit
+        )
+        cur = conn.cursor()
+        cur.execute(query, tuple(params))
+        rows = cur.fetchall()
+        cur.close()
+
+    truncated = len(rows) > limit
+    result_groups = []
+    for row in rows[:limit]:
+        result_groups.append({
+            "key": {group.name: _group_value(group, row[f"_g{i}"]) for i, group in enumerate(groups)},
+            "count": row["_count"],
+            "metrics": {f"{func}:{field}": row[f"_m{i}"] for i, (func, field) in enumerate(metrics)},
+        })
+    result = {"groups": result_groups, "truncated": truncated, "version": version}
+
+    with _cache_lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > AGGREGATE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
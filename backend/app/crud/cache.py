@@ -0,0 +1,97 @@
+"""
+进程内元数据缓存（TTL + LRU）
+用于每个请求都要读取、但很少修改的元数据（当前用户、项目归属），省去这些查询的数据库往返。
+本进程内的修改会立即失效对应条目；其他进程的修改最多在 METADATA_CACHE_TTL 秒后生效，
+METADATA_CACHE_TTL=0 时不缓存。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from app.config import METADATA_CACHE_SIZE, METADATA_CACHE_TTL
+
+_caches: List["MetadataCache"] = []
+
+
+class MetadataCache:
+    """
+    线程安全的 TTL + LRU 缓存，带命中率统计
+    值不能为 None（get 返回 None 表示未命中）
+    """
+
+    def __init__(self, name: str, max_size: int = METADATA_CACHE_SIZE, ttl: float = METADATA_CACHE_TTL):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (过期时间, 值)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0          # 因过期未命中的次数
+        self.evictions = 0        # 超过容量被淘汰的条目数
+        self.invalidations = 0    # 因修改而失效的条目数
+        _caches.append(self)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """ttl 为该条目的有效期（秒），不超过缓存的 ttl"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.max_size <= 0 or value is None:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> None:
+        """使满足 predicate(key, value) 的条目失效"""
+        with self._lock:
+            keys = [key for key, (_, value) in self._entries.items() if predicate(key, value)]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def get_metadata_cache_stats() -> Dict[str, Dict]:
+    """所有元数据缓存的统计信息"""
+    return {cache.name: cache.stats() for cache in _caches}
@@ -0,0 +1,169 @@
+"""
+数据项变更序列（增量同步）
+每次写入数据项时从 change_sequence 取一个新的序号写入 items.seq，删除时写入 item_tombstones（墓碑）。
+客户端保存服务端返回的游标 (seq, id)，之后只拉取序号更大的新增、修改和删除，不需要重新下载整个表格。
+
+取序号使用 UPDATE ... RETURNING，在 PostgreSQL 上会持有计数器的行锁直到事务提交，
+因此序号的提交顺序与分配顺序一致，读取方不会因为并发事务乱序提交而漏掉变更。
+代价是所有写事务从取序号到提交的这一段串行执行，调用方应在事务的最后阶段取序号：
+批量写入先完成 COPY 和检查，只有最终的合并语句在锁内执行（见 app.crud.items.insert_item_rows）。
+同一事务中写入的所有行共享一个序号，游标用 (seq, id) 保证分页不重不漏。
+"""
+
+import json
+from typing import List, Optional, Tuple
+from app.database.connection import get_connection
+from app.crud.pagination import InvalidCursorError, encode_cursor, decode_cursor
+
+
+class CursorExpiredError(ValueError):
+    """游标早于已清理的墓碑，增量同步无法保证完整，需要重新全量同步"""
+    pass
+
+
+def next_seq(cur, sqlite: bool, count: int = 1) -> int:
+    """在当前事务中分配 count 个连续的变更序号，返回最大的一个"""
+    placeholder = "?" if sqlite else "%s"
+    cur.execute(
+        f"UPDATE change_sequence SET value = value + {placeholder} WHERE id = {placeholder} RETURNING value",
+        (count, 1)
+    )
+    return cur.fetchone()["value"]
+
+def record_tombstones(cur, sqlite: bool, where: str, params: list, seq: int, limit: Optional[int] = None) -> int:
+    """
+    为满足条件的数据项写入墓碑（条件占位符为 ?），每个数据项只保留最新一条墓碑
+    指定 limit 时只处理前 limit 行，调用方随后按 seq 删除对应的数据项（见 DELETE_TOMBSTONED_SQL）
+
+    Returns:
+        写入的墓碑数
+    """
+    select = f"SELECT id, project_id, table_id, user_id, ? FROM items WHERE {where}"
+    select_params = [seq, *params]
+    if limit is not None:
+        select += " LIMIT ?"
+        select_params.append(limit)
+    if sqlite:
+        query = f"INSERT OR REPLACE INTO item_tombstones (item_id, project_id, table_id, user_id, seq) {select}"
+    else:  # PostgreSQL
+        query = f"""
+            INSERT INTO item_tombstones (item_id, project_id, table_id, user_id, seq) {select}
+            ON CONFLICT (item_id) DO UPDATE SET project_id = EXCLUDED.project_id, table_id = EXCLUDED.table_id,
+                user_id = EXCLUDED.user_id, seq = EXCLUDED.seq, deleted_at = CURRENT_TIMESTAMP
+        """.replace("?", "%s")
+    cur.execute(query, tuple(select_params))
+    return cur.rowcount
+
+# 删除刚刚写入墓碑的数据项（参数为 seq）
+DELETE_TOMBSTONED_SQL = "DELETE FROM items WHERE id IN (SELECT item_id FROM item_tombstones WHERE seq = ?)"
+
+def _feed_scope(user_id: int, project_id: Optional[int], table_id: Optional[int]) -> Tuple[str, list]:
+    """与列表查询相同的范围：project_id=0（系统项目）时不过滤 user_id"""
+    if project_id == 0:
+        where, params = "project_id = ?", [project_id]
+    else:
+        where, params = "user_id = ?", [user_id]
+        if project_id is not None:
+            where += " AND project_id = ?"
+            params.append(project_id)
+    if table_id is not None:
+        where += " AND table_id = ?"
+        params.append(table_id)
+    return where, params
+
+def get_project_change_marker(project_id: int) -> Tuple[int, int, int]:
+    """
+    项目中数据项的变更标记，用于只指定 projectId 的列表查询的 ETag
+    不属于任何表格的数据项（table_id 为空）的写入不会修改表格版本号，但每次写入都会分配新的 seq，
+    删除会写入墓碑；数据项被同 id 的写入移到其他项目时由 items_count 体现
+
+    Returns:
+        (数据项最大 seq, 墓碑最大 seq, 项目数据项数)
+    """
+    query = """
+        SELECT (SELECT MAX(seq) FROM items WHERE project_id = ?) AS item_seq,
+               (SELECT MAX(seq) FROM item_tombstones WHERE project_id = ?) AS tombstone_seq,
+               (SELECT items_count FROM projects WHERE id = ?) AS items_count
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query if conn.row_factory else query.replace("?", "%s"), (project_id, project_id, project_id))
+        row = cur.fetchone()
+        cur.close()
+    return row["item_seq"] or 0, row["tombstone_seq"] or 0, row["items_count"] or 0
+
+def get_changes_from_db(user_id: int, project_id: Optional[int] = None, table_id: Optional[int] = None,
+                        cursor: Optional[str] = None, limit: int = 500) -> Tuple[List[dict], str, bool]:
+    """
+    获取游标之后的数据项变更，按 (seq, id) 排序
+    不传游标时从头返回所有现存数据项（首次同步）
+
+    Returns:
+        (变更列表, 新游标, 是否还有更多)
+        变更为 {"op": "upsert", "id", "item": {...}} 或 {"op": "delete", "id"}
+
+    Raises:
+        InvalidCursorError: 游标无法解析
+        CursorExpiredError: 游标早于已清理的墓碑
+    """
+    after_seq, after_id = -1, ""
+    if cursor:
+        after_seq, after_id = decode_cursor(cursor, size=2)
+        if not isinstance(after_seq, int) or not isinstance(after_id, str):
+            raise InvalidCursorError("无效的同步游标")
+
+    where, where_params = _feed_scope(user_id, project_id, table_id)
+    where += " AND (seq > ? OR (seq = ? AND {id} > ?))"
+    where_params.extend([after_seq, after_seq, after_id])
+
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
+        cur.execute("SELECT value, purged_through FROM change_sequence WHERE id = " + ("?" if sqlite else "%s"), (1,))
+        state = cur.fetchone()
+        if cursor and state["purged_through"] and after_seq <= state["purged_through"]:
+            cur.close()
+            raise CursorExpiredError("同步游标已过期，请重新全量同步")
+
+        # 不存在的数据项（墓碑）data 为空；同一 id 的删除和重新创建按 seq 先后返回
+        query = f"""
+            SELECT * FROM (
+                SELECT id, data, created_at, updated_at, project_id, table_id, seq, 0 AS deleted
+                FROM items WHERE {where.format(id="id")}
+                UNION ALL
+                SELECT item_id AS id, NULL AS data, NULL AS created_at, deleted_at AS updated_at,
+                       project_id, table_id, seq, 1 AS deleted
+                FROM item_tombstones WHERE {where.format(id="item_id")}
+            ) AS changes
+            ORDER BY seq, id
+            LIMIT ?
+        """
+        params = where_params + where_params + [limit + 1]
+        if not sqlite:  # PostgreSQL
+            query = query.replace("?", "%s")
+        cur.execute(query, tuple(params))
+        rows = cur.fetchall()
+        cur.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    changes = []
+    for row in rows:
+        row = dict(row)
+        if row.pop("deleted"):
+            changes.append({"op": "delete", "id": row["id"]})
+            continue
+        row.pop("seq")
+        row.pop("project_id")
+        if isinstance(row["data"], str):
+            row["data"] = json.loads(row["data"])
+        changes.append({"op": "upsert", "id": row["id"], "item": row})
+
+    if rows:
+        next_cursor = encode_cursor([rows[-1]["seq"], rows[-1]["id"]])
+    elif cursor:
+        next_cursor = cursor
+    else:
+        # 当前没有任何数据：之后的变更序号都大于当前计数器
+        next_cursor = encode_cursor([state["value"], ""])
+    return changes, next_cursor, has_more
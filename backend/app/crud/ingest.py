@@ -0,0 +1,91 @@
+"""
+大批量写入数据项
+把上传的数据按 INGEST_CHUNK_SIZE 分块，每块一个事务：单个事务的大小、锁持有时间和
+数据库端内存占用与上传总量无关，SQLite 的写锁也会在块之间释放，其他请求不会被整次上传阻塞。
+写入方式见 app.crud.items.insert_item_rows（SQLite 多行 INSERT，PostgreSQL COPY + 合并）。
+
+注意：分块提交意味着写入中途失败时，之前的块已经提交。IngestError 中带有已写入的行数，
+重新上传同一批数据是安全的（相同 id 会被覆盖）。
+"""
+
+import logging
+import time
+from itertools import islice
+from typing import Callable, Iterable, List, Optional
+from app.config import INGEST_CHUNK_SIZE
+from app.database.connection import get_connection
+from app.crud.items import item_row, insert_item_rows
+
+logger = logging.getLogger(__name__)
+
+
+class IngestError(Exception):
+    """写入中途失败；rows 为失败前已提交的行数"""
+
+    def __init__(self, message: str, rows: int):
+        super().__init__(message)
+        self.rows = rows
+
+
+# 每块提交前在同一事务中调用：checkpoint(cur, sqlite, 本次已写入的行数（含当前块）)
+Checkpoint = Callable[[object, bool, int], None]
+
+def _write_chunk(chunk: List[dict], user_id: int, project_id: Optional[int], table_id: Optional[int],
+                 checkpoint: Optional[Checkpoint] = None, rows_before: int = 0) -> int:
+    """在一个事务中写入一块数据，返回写入的行数"""
+    # 同一 id 在块内出现多次时以最后一次为准
+    rows = dict(item_row(item) for item in chunk)
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
+        try:
+            if sqlite:
+                # 立即获取写锁，避免与其他写事务在升级锁时死锁
+                cur.execute("BEGIN IMMEDIATE")
+            insert_item_rows(cur, sqlite, list(rows.items()), user_id, project_id, table_id)
+            if checkpoint:
+                checkpoint(cur, sqlite, rows_before + len(chunk))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    return len(chunk)
+
+def ingest_items(items: Iterable[dict], user_id: int = 1, project_id: Optional[int] = None,
+                 table_id: Optional[int] = None, chunk_size: int = INGEST_CHUNK_SIZE,
+                 checkpoint: Optional[Checkpoint] = None) -> dict:
+    """
+    分块写入数据项，items 可以是列表或逐行产生数据的迭代器（只会按块读取）
+    checkpoint 在每块的事务中调用，用于与数据一起原子地记录进度（见 app.services.ingest_worker）
+
+    Returns:
+        {"rows": 写入行数, "chunks": 块数, "seconds": 耗时, "rowsPerSecond": 每秒行数}
+
+    Raises:
+        IngestError: 某一块写入失败
+    """
+    iterator = iter(items)
+    rows = chunks = 0
+    started = time.perf_counter()
+    while True:
+        try:
+            # 读取（解析）数据的错误同样按写入失败处理
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                break
+            rows += _write_chunk(chunk, user_id, project_id, table_id, checkpoint, rows)
+        except Exception as e:
+            raise IngestError(f"第 {chunks + 1} 块写入失败（已写入 {rows} 行）: {e}", rows) from e
+        chunks += 1
+
+    seconds = time.perf_counter() - started
+    stats = {
+        "rows": rows,
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "rowsPerSecond": round(rows / seconds) if seconds > 0 else rows,
+    }
+    logger.debug("[INGEST] 写入 %s 行（%s 块），耗时 %ss，%s 行/秒", rows, chunks, stats['seconds'], stats['rowsPerSecond'])
+    return stats
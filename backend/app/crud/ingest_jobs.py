@@ -0,0 +1,168 @@
+"""
+后台导入任务（ingest_jobs 表）
+任务的执行见 app.services.ingest_worker。状态流转：
+
+    pending -> running -> completed
+                       -> failed  -> pending（重试，从已提交的进度继续）
+    running（进程退出或心跳超时）-> 由任意进程重新认领，从已提交的进度继续
+"""
+
+import uuid
+from typing import List, Optional
+from app.database.connection import get_connection
+from app.models.schemas import IngestJob
+
+JOB_COLUMNS = """id, user_id, project_id, table_id, file_path, file_name, file_format, total_bytes, status,
+    rows_done, bytes_done, rows_per_second, eta_seconds, error, created_at, started_at, heartbeat_at, finished_at"""
+
+
+def _sql(query: str, sqlite: bool) -> str:
+    return query if sqlite else query.replace("?", "%s")
+
+# 心跳时间统一按数据库时钟的 UTC 写入和比较：PostgreSQL 中 TIMESTAMP 列保存的 CURRENT_TIMESTAMP
+# 是会话时区的本地时间，各进程的会话时区或应用服务器时钟不一致时会误判任务是否超时
+def _heartbeat_now(sqlite: bool) -> str:
+    return "CURRENT_TIMESTAMP" if sqlite else "(NOW() AT TIME ZONE 'UTC')"
+
+def _stale_condition(sqlite: bool, seconds: float) -> tuple:
+    """心跳超时的条件和参数：heartbeat_at 早于数据库当前时间 seconds 秒"""
+    if sqlite:
+        return "heartbeat_at < datetime('now', ?)", (f"-{float(seconds)} seconds",)
+    return "heartbeat_at < (NOW() AT TIME ZONE 'UTC') - ? * INTERVAL '1 second'", (float(seconds),)
+
+def row_to_job(row) -> IngestJob:
+    job = dict(row)
+    total = job.get("total_bytes")
+    if job["status"] == "completed":
+        job["progress"] = 1.0
+    elif total and job["file_format"] != "xlsx":
+        job["progress"] = min(job["bytes_done"] / total, 1.0)
+    return IngestJob(**job)
+
+def create_ingest_job(user_id: int, project_id: int, table_id: int, file_path: str,
+                      file_name: Optional[str], file_format: str, total_bytes: Optional[int]) -> dict:
+    """创建待执行的任务，返回数据库行（含 file_path）"""
+    job_id = uuid.uuid4().hex
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
+        cur.execute(_sql(f"""
+            INSERT INTO ingest_jobs (id, user_id, project_id, table_id, file_path, file_name, file_format, total_bytes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING {JOB_COLUMNS}
+        """, sqlite), (job_id, user_id, project_id, table_id, file_path, file_name, file_format, total_bytes))
+        row = dict(cur.fetchone())
+        conn.commit()
+        cur.close()
+    return row
+
+def get_ingest_job_row(job_id: str, user_id: Optional[int] = None) -> Optional[dict]:
+    """获取任务的数据库行；指定 user_id 时只返回该用户的任务"""
+    query, params = f"SELECT {JOB_COLUMNS} FROM ingest_jobs WHERE id = ?", [job_id]
+    if user_id is not None:
+        query += " AND user_id = ?"
+        params.append(user_id)
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
+        cur.execute(_sql(query, sqlite), tuple(params))
+        row = cur.fetchone()
+        cur.close()
+    return dict(row) if row else None
+
+def get_ingest_job(job_id: str, user_id: int) -> Optional[IngestJob]:
+    row = get_ingest_job_row(job_id, user_id)
+    return row_to_job(row) if row else None
+
+def get_ingest_jobs(user_id: int, limit: int = 50) -> List[IngestJob]:
+    """用户最近的任务，新的在前"""
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
+        cur.execute(_sql(
+            f"SELECT {JOB_COLUMNS} FROM ingest_jobs WHERE user_id = ? ORDER BY created_at DESC, id LIMIT ?", sqlite
+        ), (user_id, limit))
+        rows = cur.fetchall()
+        cur.close()
+    return [row_to_job(row) for row in rows]
+
+def claim_ingest_job(job_id: str, stale_seconds: float) -> Optional[dict]:
+    """
+    认领任务：pending 的任务，或心跳超时的 running 任务（执行它的进程已退出）
+    多个进程同时认领时只有一个会成功
+
+    Returns:
+        认领成功时返回任务的数据库行，否则返回 None
+    """
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
+        stale, stale_params = _stale_condition(sqlite, stale_seconds)
+        try:
+            cur.execute(_sql(f"""
+                UPDATE ingest_jobs
+                SET status = 'running', error = NULL, heartbeat_at = {_heartbeat_now(sqlite)},
+                    started_at = COALESCE(started_at, CURRENT_TIMESTAMP)
+                WHERE id = ? AND (status = 'pending' OR (status = 'running' AND {stale}))
+                RETURNING {JOB_COLUMNS}
+            """, sqlite), (job_id, *stale_params))
+            row = cur.fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    return dict(row) if row else None
+
+def get_resumable_job_ids(stale_seconds: float) -> List[str]:
+    """等待执行的任务和心跳超时的任务，按创建时间排序"""
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
+        stale, stale_params = _stale_condition(sqlite, stale_seconds)
+        cur.execute(_sql(f"""
+            SELECT id FROM ingest_jobs
+            WHERE status = 'pending' OR (status = 'running' AND {stale})
+            ORDER BY created_at, id
+        """, sqlite), stale_params)
+        rows = cur.fetchall()
+        cur.close()
+    return [row["id"] for row in rows]
+
+def record_ingest_progress(cur, sqlite: bool, job_id: str, rows_done: int, bytes_done: int,
+                           rows_per_second: Optional[float], eta_seconds: Optional[float]) -> None:
+    """在写入数据块的事务中记录进度（同时作为心跳）"""
+    cur.execute(_sql(f"""
+        UPDATE ingest_jobs
+        SET rows_done = ?, bytes_done = ?, rows_per_second = ?, eta_seconds = ?, heartbeat_at = {_heartbeat_now(sqlite)}
+        WHERE id = ?
+    """, sqlite), (rows_done, bytes_done, rows_per_second, eta_seconds, job_id))
+
+def finish_ingest_job(job_id: str, status: str, error: Optional[str] = None) -> None:
+    """标记任务结束（completed / failed），或放回 pending（进程退出时）"""
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
+        finished = "CURRENT_TIMESTAMP" if status in ("completed", "failed") else "NULL"
+        eta = "0" if status == "completed" else "NULL"
+        cur.execute(_sql(f"""
+            UPDATE ingest_jobs SET status = ?, error = ?, finished_at = {finished}, eta_seconds = {eta}
+            WHERE id = ?
+        """, sqlite), (status, error, job_id))
+        conn.commit()
+        cur.close()
+
+def retry_ingest_job(job_id: str, user_id: int) -> bool:
+    """把失败的任务放回 pending，返回是否成功"""
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
+        cur.execute(_sql("""
+            UPDATE ingest_jobs SET status = 'pending', finished_at = NULL
+            WHERE id = ? AND user_id = ? AND status = 'failed'
+        """, sqlite), (job_id, user_id))
+        updated = cur.rowcount
+        conn.commit()
+        cur.close()
+    return updated > 0
@@ -0,0 +1,260 @@
+"""
+数据项过滤、排序与字段投影
+把基于表格 schema（FieldDefinition）的过滤、排序、投影表达式编译成 SQL，
+对 items.data 中的字段取值：SQLite 使用 JSON1 的 json_extract，PostgreSQL 使用 JSONB 运算符。
+字段名一律通过参数传入，不拼接到 SQL 中。生成的 SQL 占位符统一为 ?，执行前按数据库类型替换。
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import ValidationError, parse_obj_as
+from app.models.schemas import FilterOperator, ItemFilter, ProjectSchema
+
+
+class InvalidQueryError(ValueError):
+    """过滤或排序表达式不合法"""
+    pass
+
+
+# 按数值比较的字段类型
+NUMERIC_TYPES = {"number"}
+# 值为数组的字段类型
+ARRAY_TYPES = {"multi_select"}
+
+# PostgreSQL 中判断文本是否为数字（不使用 ? 量词，避免与占位符替换冲突）
+_PG_NUMBER_PATTERN = "'^ *-{0,1}[0-9]+([.][0-9]+){0,1}([eE][-+]{0,1}[0-9]+){0,1} *$'"
+
+
+def schema_field_types(schema: Optional[ProjectSchema]) -> Dict[str, str]:
+    """表格 schema 中声明的字段 -> 字段类型"""
+    if not schema:
+        return {}
+    return {field.key: str(field.type) for field in schema.fields}
+
+def json_path(key: str) -> str:
+    """SQLite JSON 路径，字段名加引号以支持空格、点号等字符"""
+    return '$."' + key + '"'
+
+def field_expression(key: str, field_type: str, sqlite: bool) -> Tuple[str, list]:
+    """
+    取 data 中某个字段值的 SQL 表达式，两种数据库的结果一致（过滤、排序、聚合共用）：
+    数值字段：数字和数字文本转为数值，其他值（包括非数字文本、布尔值）为 NULL
+    其他字段：与 PostgreSQL ->> 相同的文本形式，布尔值为 true / false，数字为其文本
+
+    SQLite 的 CAST 会把非数字文本转为 0、json_extract 把布尔值返回为 1 / 0，因此先按 json_type 判断
+
+    Returns:
+        (SQL 表达式, 参数列表)
+    """
+    if field_type in NUMERIC_TYPES:
+        if sqlite:
+            path = json_path(key)
+            text = "trim(json_extract(data, ?))"
+            return (
+                "(CASE json_type(data, ?)"
+                " WHEN 'integer' THEN json_extract(data, ?)"
+                " WHEN 'real' THEN json_extract(data, ?)"
+                f" WHEN 'text' THEN (CASE WHEN {text} GLOB '*[0-9]*' AND NOT {text} GLOB '*[^0-9.eE+-]*'"
+                " THEN CAST(json_extract(data, ?) AS REAL) END)"
+                " END)",
+                [path] * 6
+            )
+        # 非数字文本返回 NULL，避免类型转换报错
+        return (
+            f"(CASE WHEN (data->>?) ~ {_PG_NUMBER_PATTERN} THEN (data->>?)::double precision END)",
+            [key, key]
+        )
+    if sqlite:
+        path = json_path(key)
+        return (
+            "(CASE json_type(data, ?) WHEN 'true' THEN 'true' WHEN 'false' THEN 'false'"
+            " ELSE CAST(json_extract(data, ?) AS TEXT) END)",
+            [path, path]
+        )
+    return "(data->>?)", [key]
+
+def sort_expression(key: str, field_type: str, sqlite: bool) -> Tuple[str, list]:
+    """
+    排序表达式
+    缺失值统一替换为最小值（数值为 -1e308，文本为空串），保证游标比较时不出现 NULL
+    """
+    expr, params = field_expression(key, field_type, sqlite)
+    if field_type in NUMERIC_TYPES:
+        return f"COALESCE({expr}, -1e308)", params
+    return f"COALESCE({expr}, '')", params
+
+def _coerce(value: Any, field_type: str, key: str):
+    if value is None:
+        raise InvalidQueryError(f"字段 '{key}' 的过滤值不能为空")
+    if field_type in NUMERIC_TYPES:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise InvalidQueryError(f"字段 '{key}' 需要数值，收到 {value!r}")
+    if isinstance(value, (dict, list)):
+        raise InvalidQueryError(f"字段 '{key}' 的过滤值必须是标量")
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+_COMPARISON_SQL = {
+    FilterOperator.EQ: "=",
+    FilterOperator.NE: "<>",
+    FilterOperator.GT: ">",
+    FilterOperator.GTE: ">=",
+    FilterOperator.LT: "<",
+    FilterOperator.LTE: "<=",
+}
+
+def compile_filter(condition: ItemFilter, field_type: str, sqlite: bool) -> Tuple[str, list]:
+    """把单个过滤条件编译成 SQL 条件"""
+    key = condition.field
+    op = FilterOperator(condition.op)
+
+    if field_type in ARRAY_TYPES:
+        if op != FilterOperator.CONTAINS:
+            raise InvalidQueryError(f"多选字段 '{key}' 只支持 contains 过滤")
+        value = _coerce(condition.value, "text", key)
+        if sqlite:
+            return "EXISTS (SELECT 1 FROM json_each(data, ?) WHERE json_each.value = ?)", [json_path(key), value]
+        return "((data->?) @> ?::jsonb)", [key, json.dumps([value])]
+
+    expr, expr_params = field_expression(key, field_type, sqlite)
+
+    if op in _COMPARISON_SQL:
+        return f"{expr} {_COMPARISON_SQL[op]} ?", expr_params + [_coerce(condition.value, field_type, key)]
+
+    if op == FilterOperator.BETWEEN:
+        if not isinstance(condition.value, list) or len(condition.value) != 2:
+            raise InvalidQueryError(f"字段 '{key}' 的 between 过滤需要 [最小值, 最大值]")
+        low, high = (_coerce(v, field_type, key) for v in condition.value)
+        return f"{expr} BETWEEN ? AND ?", expr_params + [low, high]
+
+    if op == FilterOperator.IN:
+        if not isinstance(condition.value, list) or not condition.value:
+            raise InvalidQueryError(f"字段 '{key}' 的 in 过滤需要非空列表")
+        values = [_coerce(v, field_type, key) for v in condition.value]
+        return f"{expr} IN ({', '.join('?' for _ in values)})", expr_params + values
+
+    if op == FilterOperator.CONTAINS:
+        if field_type in NUMERIC_TYPES:
+            raise InvalidQueryError(f"数值字段 '{key}' 不支持 contains 过滤")
+        pattern = "%" + _escape_like(_coerce(condition.value, field_type, key)) + "%"
+        like = "LIKE" if sqlite else "ILIKE"  # SQLite 的 LIKE 本身不区分大小写
+        return f"{expr} {like} ? ESCAPE '\\'", expr_params + [pattern]
+
+    raise InvalidQueryError(f"不支持的过滤操作: {op}")
+
+def compile_filters(filters: List[ItemFilter], field_types: Dict[str, str], sqlite: bool) -> Tuple[str, list]:
+    """编译多个过滤条件（AND 连接），没有条件时返回空串"""
+    clauses = []
+    params = []
+    for condition in filters:
+        clause, clause_params = compile_filter(condition, field_types[condition.field], sqlite)
+        clauses.append(clause)
+        params.extend(clause_params)
+    return " AND ".join(clauses), params
+
+def projection_expression(fields: List[str], sqlite: bool) -> Tuple[str, list]:
+    """
+    只取 data 中指定字段的 SQL 表达式，结果用 parse_projection() 还原成字典
+    SQLite：json_extract 传入多个路径时返回这些值组成的 JSON 数组（保留嵌套对象/数组的类型），
+    只有一个字段时重复一次路径以保证返回数组
+    PostgreSQL：jsonb_build_object 直接构造对象
+    """
+    if sqlite:
+        paths = [json_path(key) for key in fields]
+        if len(paths) == 1:
+            paths.append(paths[0])
+        return f"json_extract(data, {', '.join('?' for _ in paths)})", paths
+    parts = []
+    params = []
+    for key in fields:
+        parts.append("?::text, data->?")
+        params.extend([key, key])
+    return f"jsonb_build_object({', '.join(parts)})", params
+
+def parse_projection(value: Any, fields: List[str]) -> dict:
+    """把 projection_expression() 的查询结果还原成字典，缺失的字段不返回"""
+    if isinstance(value, str):
+        value = json.loads(value)
+    if isinstance(value, list):
+        value = dict(zip(fields, value))
+    return {key: v for key, v in (value or {}).items() if v is not None}
+
+def parse_fields(raw: Optional[str], field_types: Dict[str, str]) -> List[str]:
+    """
+    解析投影字段列表（逗号分隔），校验字段是否在 schema 中声明
+
+    示例: "lat,lng,name"
+    """
+    if not raw:
+        return []
+    fields = []
+    for key in raw.split(","):
+        key = key.strip()
+        if not key or key in fields:
+            continue
+        if key not in field_types:
+            raise InvalidQueryError(f"字段 '{key}' 未在表格 schema 中声明")
+        fields.append(key)
+    return fields
+
+def parse_filters(raw: Optional[str], field_types: Dict[str, str]) -> List[ItemFilter]:
+    """
+    解析过滤表达式（JSON 数组），并校验字段是否在 schema 中声明
+
+    示例: [{"field": "year", "op": "between", "value": [1900, 1950]},
+           {"field": "tags", "op": "contains", "value": "人物"}]
+    """
+    if not raw:
+        return []
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        raise InvalidQueryError("filter 必须是 JSON 数组")
+    if isinstance(data, dict):
+        data = [data]
+    try:
+        filters = parse_obj_as(List[ItemFilter], data)
+    except ValidationError as e:
+        raise InvalidQueryError(f"filter 格式错误: {e}")
+    return validate_filters(filters, field_types)
+
+def validate_filters(filters: List[ItemFilter], field_types: Dict[str, str]) -> List[ItemFilter]:
+    """校验过滤条件中的字段是否在 schema 中声明"""
+    for condition in filters:
+        if condition.field not in field_types:
+            raise InvalidQueryError(f"字段 '{condition.field}' 未在表格 schema 中声明")
+    return filters
+
+def parse_sort(raw: Optional[str], field_types: Dict[str, str]) -> List[Tuple[str, bool]]:
+    """
+    解析排序表达式：逗号分隔的字段 key，前缀 - 表示降序，例如 "-year,name"
+
+    Returns:
+        [(字段 key, 是否降序), ...]
+    """
+    if not raw:
+        return []
+    sort = []
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        descending = part.startswith("-")
+        key = part[1:] if descending else part
+        if key not in field_types:
+            raise InvalidQueryError(f"排序字段 '{key}' 未在表格 schema 中声明")
+        if field_types[key] in ARRAY_TYPES:
+            raise InvalidQueryError(f"多选字段 '{key}' 不支持排序")
+        sort.append((key, descending))
+    return sort
+
+def parse_item_query(field_types: Dict[str, str], filters: Optional[str] = None, sort: Optional[str] = None,
+                     fields: Optional[str] = None) -> Tuple[List[ItemFilter], List[Tuple[str, bool]], List[str]]:
+    """一次解析查询参数中的 filter / sort / fields"""
+    return parse_filters(filters, field_types), parse_sort(sort, field_types), parse_fields(fields, field_types)
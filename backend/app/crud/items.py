@@ -1,170 +1,671 @@
+import io
+import logging
 import sqlite3
 import json
-from typing import List, Optional
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
-from app.database.connection import get_db_connection
-from app.models.schemas import Item
+from app.config import DELETE_BATCH_SIZE
+from app.database.connection import get_connection
+from app.models.schemas import Item, ItemFilter
+from app.crud.pagination import InvalidCursorError, encode_cursor, decode_cursor, keyset_condition, order_by_clause
+from app.crud.changes import next_seq, record_tombstones, DELETE_TOMBSTONED_SQL
+from app.crud.search import search_terms, search_clause
+from app.crud.item_filters import compile_filters, sort_expression, projection_expression, parse_projection
 
-def get_all_items_from_db(user_id: int = 1, project_id: Optional[int] = None, table_id: Optional[int] = None) -> List[Item]:
+logger = logging.getLogger(__name__)
+
+def _scope_clause(user_id: int, project_id: Optional[int] = None, table_id: Optional[int] = None) -> Tuple[str, list]:
     """
-    从数据库获取所有项目，按用户ID过滤，可选按项目ID或表格ID过滤
+    生成列表查询的过滤条件（占位符为 ?）
     特殊处理：当 project_id=0（系统项目）时，不过滤 user_id，允许所有用户查看全局缓存
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
     # 如果查询系统项目（project_id=0），不过滤 user_id
     if project_id == 0:
-        query = "SELECT id, data, created_at, updated_at, project_id, table_id FROM items WHERE project_id = ?"
+        where = "project_id = ?"
         params = [project_id]
-        
-        if table_id is not None:
-            query += " AND table_id = ?"
-            params.append(table_id)
     else:
-        query = "SELECT id, data, created_at, updated_at, project_id, table_id FROM items WHERE user_id = ?"
+        where = "user_id = ?"
         params = [user_id]
         
         if project_id is not None:
-            query += " AND project_id = ?"
+            where += " AND project_id = ?"
             params.append(project_id)
-            
-        if table_id is not None:
-            query += " AND table_id = ?"
-            params.append(table_id)
-        
-    # 检查数据库类型
-    if not conn.row_factory:  # PostgreSQL
+    
+    if table_id is not None:
+        where += " AND table_id = ?"
+        params.append(table_id)
+    
+    return where, params
+
+def _row_to_dict(row, fields: Optional[List[str]] = None, raw: bool = False) -> dict:
+    """
+    raw=True 时不解析 data，保留数据库中的 JSON 文本（用于直接拼接进响应，见 app.api.responses）
+    """
+    item_dict = dict(row)
+    for key in [k for k in item_dict if k.startswith('_cursor_')]:
+        del item_dict[key]
+    if fields:
+        # 字段投影：data 只包含请求的字段
+        item_dict['data'] = parse_projection(item_dict.pop('_projected'), fields)
+    # 解析JSON数据
+    elif isinstance(item_dict['data'], str) and not raw:
+        item_dict['data'] = json.loads(item_dict['data'])
+    return item_dict
+
+def _row_to_item(row, fields: Optional[List[str]] = None) -> Item:
+    return Item(**_row_to_dict(row, fields))
+
+def _convert_rows(rows, fields: Optional[List[str]] = None, raw: bool = False) -> list:
+    """raw=True 时返回 dict（data 为 JSON 文本），否则返回 Item"""
+    if raw:
+        return [_row_to_dict(row, fields, raw=True) for row in rows]
+    return [_row_to_item(row, fields) for row in rows]
+
+ITEM_COLUMNS = "id, data, created_at, updated_at, project_id, table_id"
+
+def _item_columns(sqlite: bool, raw: bool = False, prefix: str = "") -> str:
+    """
+    查询数据项的列；raw=True 时 PostgreSQL 把 data 转成 JSON 文本返回，避免 psycopg2 解析 JSONB
+    （SQLite 中 data 本来就是文本）
+    """
+    columns = []
+    for column in ITEM_COLUMNS.split(", "):
+        if column == "data" and raw and not sqlite:
+            columns.append(f"{prefix}data::text AS data")
+        else:
+            columns.append(prefix + column)
+    return ", ".join(columns)
+
+# 默认分页排序键：updated_at + id 保证顺序稳定（id 唯一，打破 updated_at 相同的情况）
+PAGE_ORDER_KEYS = [("updated_at", False), ("id", False)]
+
+def _order_keys(sort: Optional[List[Tuple[str, bool]]], field_types: Optional[Dict[str, str]], sqlite: bool) -> list:
+    if not sort:
+        return PAGE_ORDER_KEYS
+    keys = []
+    for key, descending in sort:
+        expr, params = sort_expression(key, field_types[key], sqlite)
+        keys.append((expr, descending, params))
+    # id 唯一，作为最后一个排序键保证顺序稳定
+    keys.append(("id", False))
+    return keys
+
+def _sort_signature(sort: Optional[List[Tuple[str, bool]]]) -> str:
+    return ",".join(("-" if descending else "") + key for key, descending in (sort or []))
+
+def _build_list_query(sqlite: bool, user_id: int, project_id: Optional[int], table_id: Optional[int],
+                      filters: Optional[List[ItemFilter]] = None, sort: Optional[List[Tuple[str, bool]]] = None,
+                      field_types: Optional[Dict[str, str]] = None, cursor: Optional[str] = None,
+                      limit: Optional[int] = None, paginate: bool = False,
+                      fields: Optional[List[str]] = None, raw: bool = False) -> Tuple[str, list, Optional[list]]:
+    """
+    生成列表查询 SQL
+    指定 fields 时不返回完整的 data，而是在 SQL 中只取这些字段（_projected 列）
+    raw=True 时 data 以 JSON 文本返回
+
+    Returns:
+        (SQL, 参数列表, 排序键)；分页时每个排序键的值以 _cursor_{i} 列返回
+    """
+    where, where_params = _scope_clause(user_id, project_id, table_id)
+    
+    if filters:
+        clause, clause_params = compile_filters(filters, field_types, sqlite)
+        where += f" AND {clause}"
+        where_params.extend(clause_params)
+    
+    if fields:
+        # 别名不使用 data，避免 SQLite 在 WHERE/ORDER BY 中把 data 解析成投影列
+        expr, select_params = projection_expression(fields, sqlite)
+        select = f"id, {expr} AS _projected, created_at, updated_at, project_id, table_id"
+    else:
+        select = _item_columns(sqlite, raw)
+        select_params = []
+    order_keys = _order_keys(sort, field_types, sqlite) if (paginate or sort) else None
+    
+    if paginate:
+        # 排序键的值一并查出，用于生成下一页游标
+        for i, key in enumerate(order_keys):
+            expr, _, expr_params = key if len(key) == 3 else (key[0], key[1], [])
+            select += f", {expr} AS _cursor_{i}"
+            select_params.extend(expr_params)
+        if cursor:
+            # 游标第一个元素是排序方式签名，防止换了排序方式后继续使用旧游标
+            values = decode_cursor(cursor, size=len(order_keys) + 1)
+            if values[0] != _sort_signature(sort):
+                raise InvalidCursorError("分页游标与当前排序方式不匹配")
+            condition, condition_params = keyset_condition(order_keys, values[1:])
+            where += f" AND {condition}"
+            where_params.extend(condition_params)
+    
+    query = f"SELECT {select} FROM items WHERE {where}"
+    params = select_params + where_params
+    
+    if order_keys:
+        order_sql, order_params = order_by_clause(order_keys)
+        query += f" ORDER BY {order_sql}"
+        params.extend(order_params)
+    
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    
+    if not sqlite:  # PostgreSQL
         query = query.replace("?", "%s")
+    return query, params, order_keys
+
+def get_all_items_from_db(user_id: int = 1, project_id: Optional[int] = None, table_id: Optional[int] = None,
+                          filters: Optional[List[ItemFilter]] = None, sort: Optional[List[Tuple[str, bool]]] = None,
+                          field_types: Optional[Dict[str, str]] = None, fields: Optional[List[str]] = None,
+                          raw: bool = False) -> List[Item]:
+    """
+    从数据库获取所有项目，按用户ID过滤，可选按项目ID或表格ID过滤
+    特殊处理：当 project_id=0（系统项目）时，不过滤 user_id，允许所有用户查看全局缓存
+    filters / sort / fields 见 app.crud.item_filters，field_types 为表格 schema 的字段类型
+    raw=True 时返回 dict 而不是 Item，data 为数据库中的 JSON 文本（不解析、不校验）
+    """
+    with get_connection() as conn:
+        query, params, _ = _build_list_query(
+            bool(conn.row_factory), user_id, project_id, table_id, filters, sort, field_types, fields=fields, raw=raw
+        )
+        cur = conn.cursor()
+        cur.execute(query, tuple(params))
+        rows = cur.fetchall()
+        cur.close()
     
-    cur.execute(query, tuple(params))
+    return _convert_rows(rows, fields, raw)
+
+def get_items_page_from_db(user_id: int = 1, project_id: Optional[int] = None, table_id: Optional[int] = None,
+                           limit: int = 50, cursor: Optional[str] = None,
+                           filters: Optional[List[ItemFilter]] = None, sort: Optional[List[Tuple[str, bool]]] = None,
+                           field_types: Optional[Dict[str, str]] = None,
+                           fields: Optional[List[str]] = None, raw: bool = False) -> Tuple[List[Item], Optional[str]]:
+    """
+    游标分页获取项目，默认按 (updated_at, id) 排序，指定 sort 时按 sort 字段 + id 排序
+
+    Args:
+        limit: 每页条数
+        cursor: 上一页返回的游标，为空表示第一页
+        raw: 同 get_all_items_from_db
+
+    Returns:
+        (当前页项目列表, 下一页游标；没有更多数据时为 None)
+
+    Raises:
+        InvalidCursorError: 游标无法解析或与当前排序方式不匹配
+    """
+    with get_connection() as conn:
+        # 多取一行用于判断是否还有下一页
+        query, params, order_keys = _build_list_query(
+            bool(conn.row_factory), user_id, project_id, table_id, filters, sort, field_types,
+            cursor=cursor, limit=limit + 1, paginate=True, fields=fields, raw=raw
+        )
+        cur = conn.cursor()
+        cur.execute(query, tuple(params))
+        rows = cur.fetchall()
+        cur.close()
     
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        # 游标保存数据库中的原始值，保证下一页比较时与列值完全一致
+        next_cursor = encode_cursor(
+            [_sort_signature(sort)] + [last[f"_cursor_{i}"] for i in range(len(order_keys))]
+        )
     
-    items = []
-    for row in rows:
-        item_dict = dict(row)
-        # 解析JSON数据
-        if isinstance(item_dict['data'], str):
-            item_dict['data'] = json.loads(item_dict['data'])
-        items.append(Item(**item_dict))
+    return _convert_rows(rows, fields, raw), next_cursor
+
+def search_items_from_db(query_text: str, user_id: int = 1, project_id: Optional[int] = None,
+                         table_id: Optional[int] = None, limit: int = 50,
+                         cursor: Optional[str] = None, raw: bool = False) -> Tuple[List[Item], Optional[str]]:
+    """
+    全文检索项目（见 app.crud.search），按相关度排序，相关度相同时按 id 排序
+    检索结果通常只看前几页，游标中保存的是偏移量（LIMIT/OFFSET 分页，不同于列表接口的键集游标）：
+    翻页越深查询越慢，翻页期间数据变化时可能重复或遗漏结果；raw 同 get_all_items_from_db
+
+    Returns:
+        (当前页项目列表, 下一页游标；没有更多数据时为 None)
+
+    Raises:
+        InvalidSearchError: 检索词为空
+        InvalidCursorError: 游标无法解析或与检索词不匹配
+    """
+    terms = search_terms(query_text)
+    offset = 0
+    if cursor:
+        signature, offset = decode_cursor(cursor, size=2)
+        if signature != " ".join(terms) or not isinstance(offset, int) or offset < 0:
+            raise InvalidCursorError("分页游标与当前检索词不匹配")
+    
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        from_clause, match_clause, match_params, rank, rank_params = search_clause(terms, sqlite)
+        where, where_params = _scope_clause(user_id, project_id, table_id)
+        columns = _item_columns(sqlite, raw, prefix="items.")
+        order_by = f"{rank}, items.id" if rank else "items.id"
+        # 多取一行用于判断是否还有下一页
+        query = (
+            f"SELECT {columns} FROM {from_clause} WHERE {match_clause} AND {where} "
+            f"ORDER BY {order_by} LIMIT ? OFFSET ?"
+        )
+        params = match_params + where_params + rank_params + [limit + 1, offset]
+        if not sqlite:  # PostgreSQL
+            query = query.replace("?", "%s")
+        cur = conn.cursor()
+        cur.execute(query, tuple(params))
+        rows = cur.fetchall()
+        cur.close()
     
-    return items
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([" ".join(terms), offset + limit])
+    return _convert_rows(rows, raw=raw), next_cursor
+
+def iter_items_from_db(user_id: int = 1, project_id: Optional[int] = None, table_id: Optional[int] = None,
+                       filters: Optional[List[ItemFilter]] = None, sort: Optional[List[Tuple[str, bool]]] = None,
+                       field_types: Optional[Dict[str, str]] = None, fields: Optional[List[str]] = None,
+                       batch_size: int = 1000) -> Iterator[dict]:
+    """
+    逐批读取项目（用于流式导出），内存占用只与 batch_size 有关
+    SQLite 使用 fetchmany；PostgreSQL 使用服务端命名游标，结果集不会一次性传到应用端
+    迭代期间一直占用一条连接，迭代结束或生成器被关闭时归还
+
+    Yields:
+        {id, data, created_at, updated_at, project_id, table_id}，data 已解析
+    """
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        query, params, _ = _build_list_query(
+            sqlite, user_id, project_id, table_id, filters, sort, field_types, fields=fields
+        )
+        if sqlite:
+            cur = conn.cursor()
+        else:  # PostgreSQL 命名游标（服务端游标）
+            cur = conn.cursor(name=f"items_export_{uuid.uuid4().hex}")
+            cur.itersize = batch_size
+        try:
+            cur.execute(query, tuple(params))
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield _row_to_dict(row, fields)
+        finally:
+            cur.close()
 
 def get_item_from_db(item_id: str, user_id: int = 1) -> Optional[Item]:
     """
     从数据库获取单个项目，按用户ID过滤
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 检查数据库类型
-    if conn.row_factory:  # SQLite
-        cur.execute("SELECT id, data, created_at, updated_at, project_id, table_id FROM items WHERE id = ? AND user_id = ?", (item_id, user_id))
-    else:  # PostgreSQL
-        cur.execute("SELECT id, data, created_at, updated_at, project_id, table_id FROM items WHERE id = %s AND user_id = %s", (item_id, user_id))
-    
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        
+        # 检查数据库类型
+        if conn.row_factory:  # SQLite
+            cur.execute("SELECT id, data, created_at, updated_at, project_id, table_id FROM items WHERE id = ? AND user_id = ?", (item_id, user_id))
+        else:  # PostgreSQL
+            cur.execute("SELECT id, data, created_at, updated_at, project_id, table_id FROM items WHERE id = %s AND user_id = %s", (item_id, user_id))
+        
+        row = cur.fetchone()
+        cur.close()
     
     if row:
-        item_dict = dict(row)
-        # 解析JSON数据
-        if isinstance(item_dict['data'], str):
-            item_dict['data'] = json.loads(item_dict['data'])
-        return Item(**item_dict)
+        return _row_to_item(row)
     
     return None
 
+def _bump_table_versions(cur, sqlite: bool, table_where: str, params: list):
+    """
+    递增表格版本号（条件 GET 的 ETag 基于该版本号），条件作用于 tables 表（占位符为 ?）
+    在调用方的事务中执行，与数据项的写入一起提交
+    """
+    now = "CURRENT_TIMESTAMP" if sqlite else "(NOW() AT TIME ZONE 'UTC')"
+    query = f"UPDATE tables SET version = version + 1, updated_at = {now} WHERE {table_where}"
+    if not sqlite:  # PostgreSQL
+        query = query.replace("?", "%s")
+    cur.execute(query, tuple(params))
+
+def _bump_versions_of_tables(cur, sqlite: bool, table_ids) -> None:
+    """按表格 id 递增版本号"""
+    table_ids = [table_id for table_id in dict.fromkeys(table_ids) if table_id is not None]
+    if table_ids:
+        _bump_table_versions(cur, sqlite, f"id IN ({', '.join('?' for _ in table_ids)})", table_ids)
+
 def update_item_in_db(item_id: str, data: dict, user_id: int = 1) -> bool:
     """
     更新数据库中的单个项目
     """
-    conn = get_db_connection()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        
+        try:
+            now = datetime.now().isoformat()
+            seq = next_seq(cur, bool(conn.row_factory))
+            
+            # 检查数据库类型
+            if conn.row_factory:  # SQLite
+                cur.execute("""
+                    UPDATE items 
+                    SET data = ?, updated_at = ?, seq = ?
+                    WHERE id = ? AND user_id = ?
+                """, (json.dumps(data), now, seq, item_id, user_id))
+            else:  # PostgreSQL
+                cur.execute("""
+                    UPDATE items 
+                    SET data = %s, updated_at = %s, seq = %s
+                    WHERE id = %s AND user_id = %s
+                """, (json.dumps(data), now, seq, item_id, user_id))
+            
+            success = cur.rowcount > 0
+            if success:
+                _bump_table_versions(
+                    cur, bool(conn.row_factory),
+                    "id = (SELECT table_id FROM items WHERE id = ? AND user_id = ?)", [item_id, user_id]
+                )
+            conn.commit()
+            return success
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+# IN (...) 查询每批的 id 数量，低于旧版 SQLite 999 个参数的限制
+ID_CHUNK_SIZE = 500
+
+def _existing_item_ids(cur, sqlite: bool, item_ids: List[str], user_id: int, lock: bool = False) -> Dict[str, Optional[int]]:
+    """
+    查询 item_ids 中存在且属于该用户的 id，返回 {id: table_id}
+    lock=True 时在 PostgreSQL 上对这些行加锁（FOR UPDATE），保证同一事务内后续写入时它们仍然存在
+    """
+    placeholder = "?" if sqlite else "%s"
+    unique_ids = list(dict.fromkeys(item_ids))
+    existing = {}
+    for start in range(0, len(unique_ids), ID_CHUNK_SIZE):
+        chunk = unique_ids[start:start + ID_CHUNK_SIZE]
+        marks = ", ".join([placeholder] * len(chunk))
+        cur.execute(
+            f"SELECT id, table_id FROM items WHERE user_id = {placeholder} AND id IN ({marks})"
+            + (" FOR UPDATE" if lock and not sqlite else ""),
+            (user_id, *chunk)
+        )
+        existing.update((row["id"], row["table_id"]) for row in cur.fetchall())
+    return existing
+
+def patch_items_in_db(patches: List[Tuple[str, dict]], user_id: int = 1) -> List[Tuple[str, str]]:
+    """
+    批量局部更新项目，data 按 JSON Merge Patch（RFC 7396）合并
+    SQLite 使用 json_patch()，PostgreSQL 使用迁移 4 创建的 jsonb_merge_patch()
+    所有更新在同一个事务中通过 executemany 执行，任意一条失败则全部回滚
+
+    Args:
+        patches: [(item_id, 局部 data), ...]，同一 id 出现多次时按顺序依次合并
+
+    Returns:
+        [(item_id, "updated" | "not_found"), ...]，与 patches 顺序一致
+    """
+    if not patches:
+        return []
+
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
+
+        try:
+            if sqlite:
+                # 先获取写锁，查询和更新之间不会有其他连接删除这些行
+                cur.execute("BEGIN IMMEDIATE")
+            existing = _existing_item_ids(cur, sqlite, [item_id for item_id, _ in patches], user_id, lock=True)
+            now = datetime.now().isoformat()
+            seq = next_seq(cur, sqlite)
+            values = [
+                (json.dumps(data), now, seq, item_id, user_id)
+                for item_id, data in patches if item_id in existing
+            ]
+
+            if values:
+                if sqlite:
+                    cur.executemany("""
+                        UPDATE items
+                        SET data = json_patch(data, ?), updated_at = ?, seq = ?
+                        WHERE id = ? AND user_id = ?
+                    """, values)
+                else:  # PostgreSQL
+                    cur.executemany("""
+                        UPDATE items
+                        SET data = jsonb_merge_patch(data, %s::jsonb), updated_at = %s, seq = %s
+                        WHERE id = %s AND user_id = %s
+                    """, values)
+                _bump_versions_of_tables(cur, sqlite, existing.values())
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    return [(item_id, "updated" if item_id in existing else "not_found") for item_id, _ in patches]
+
+def _delete_in_batches(conn, where: str, params: list, batch_size: int) -> int:
+    """在 conn 上分批执行删除，每批提交一次（条件占位符为 ?）"""
+    sqlite = bool(conn.row_factory)
+    query = DELETE_TOMBSTONED_SQL
+    tables_query = f"SELECT DISTINCT table_id FROM items WHERE {where}"
+    if not sqlite:  # PostgreSQL
+        query = query.replace("?", "%s")
+        tables_query = tables_query.replace("?", "%s")
+    deleted = 0
     cur = conn.cursor()
-    
     try:
-        now = datetime.now().isoformat()
-        
-        # 检查数据库类型
-        if conn.row_factory:  # SQLite
-            cur.execute("""
-                UPDATE items 
-                SET data = ?, updated_at = ?
-                WHERE id = ? AND user_id = ?
-            """, (json.dumps(data), now, item_id, user_id))
-        else:  # PostgreSQL
-            cur.execute("""
-                UPDATE items 
-                SET data = %s, updated_at = %s
-                WHERE id = %s AND user_id = %s
-            """, (json.dumps(data), now, item_id, user_id))
-        
-        conn.commit()
-        success = cur.rowcount > 0
-        cur.close()
-        conn.close()
-        return success
-    except Exception as e:
-        print(f"更新项目时发生错误: {e}")
+        # 受影响的表格在每一批的事务中递增版本号
+        cur.execute(tables_query, tuple(params))
+        table_ids = [row["table_id"] for row in cur.fetchall()]
+        while True:
+            _bump_versions_of_tables(cur, sqlite, table_ids)
+            # 先为这一批写入墓碑（增量同步用），再按墓碑删除
+            seq = next_seq(cur, sqlite)
+            record_tombstones(cur, sqlite, where, params, seq, limit=batch_size)
+            cur.execute(query, (seq,))
+            count = cur.rowcount
+            conn.commit()
+            deleted += count
+            if count < batch_size:
+                break
+    except Exception:
         conn.rollback()
-        cur.close()
-        conn.close()
         raise
+    finally:
+        cur.close()
+    return deleted
+
+def delete_items_where(where: str, params: list, batch_size: int = DELETE_BATCH_SIZE) -> int:
+    """
+    分批删除满足条件的项目（条件占位符为 ?），每批一个事务
+    大批量删除不会长时间持有写锁，其他请求可以在批次之间读写；
+    中途失败时已提交的批次不会回滚，重新执行即可继续删除
+
+    Returns:
+        删除的行数
+    """
+    with get_connection() as conn:
+        return _delete_in_batches(conn, where, params, batch_size)
+
+def delete_items_in_db(item_ids: List[str], user_id: int = 1) -> int:
+    """
+    按 id 列表删除项目，只删除属于该用户的项目，每 ID_CHUNK_SIZE 个 id 一个事务
+
+    Returns:
+        删除的行数（不存在或无权限的 id 不计入）
+    """
+    unique_ids = list(dict.fromkeys(item_ids))
+    deleted = 0
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        placeholder = "?" if sqlite else "%s"
+        cur = conn.cursor()
+        try:
+            for start in range(0, len(unique_ids), ID_CHUNK_SIZE):
+                chunk = unique_ids[start:start + ID_CHUNK_SIZE]
+                marks = ", ".join([placeholder] * len(chunk))
+                where = f"user_id = ? AND id IN ({', '.join('?' for _ in chunk)})"
+                _bump_table_versions(cur, sqlite, f"id IN (SELECT table_id FROM items WHERE {where})", [user_id, *chunk])
+                record_tombstones(cur, sqlite, where, [user_id, *chunk], next_seq(cur, sqlite))
+                cur.execute(
+                    f"DELETE FROM items WHERE user_id = {placeholder} AND id IN ({marks})",
+                    (user_id, *chunk)
+                )
+                deleted += cur.rowcount
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    return deleted
+
+def delete_items_by_filter_in_db(user_id: int, table_id: int, filters: Optional[List[ItemFilter]] = None,
+                                 field_types: Optional[Dict[str, str]] = None,
+                                 batch_size: int = DELETE_BATCH_SIZE) -> int:
+    """
+    删除表格中满足过滤条件的项目（没有过滤条件时删除该用户在表格中的全部项目）
+
+    Returns:
+        删除的行数
+    """
+    where = "user_id = ? AND table_id = ?"
+    params = [user_id, table_id]
+    with get_connection() as conn:
+        if filters:
+            clause, clause_params = compile_filters(filters, field_types, bool(conn.row_factory))
+            where += f" AND {clause}"
+            params.extend(clause_params)
+        return _delete_in_batches(conn, where, params, batch_size)
+
+# 不属于 data 的元数据字段
+ITEM_META_KEYS = ("id", "created_at", "updated_at")
+
+# SQLite 单条多行 INSERT 的行数（每行 6 个参数，保持在旧版本 SQLite 999 个参数的上限内）
+SQLITE_INSERT_ROWS = 150
+
+def item_row(item: dict) -> Tuple[str, str]:
+    """把上传的数据项转换为 (id, data JSON)，缺少 id 时生成一个（并写回 item）"""
+    if 'id' not in item:
+        item['id'] = str(uuid.uuid4())
+    data = {key: value for key, value in item.items() if key not in ITEM_META_KEYS}
+    return str(item['id']), json.dumps(data)
+
+def _copy_text(value: str) -> str:
+    """COPY 文本格式的字段转义"""
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+class ItemConflictError(ValueError):
+    """写入的数据项 id 已被其他用户的数据项使用"""
+    pass
+
+
+def _claim_item_ids(cur, sqlite: bool, item_ids: List[str], user_id: int,
+                    project_id: Optional[int], table_id: Optional[int]) -> Dict[str, Optional[int]]:
+    """
+    检查将被覆盖的同 id 数据项：属于其他用户时拒绝写入（ItemConflictError）；
+    返回位于其他表格或项目、将被移到本表格的数据项 {id: 原 table_id}
+    PostgreSQL 上对这些行加锁（FOR UPDATE），直到写入完成
+    """
+    placeholder = "?" if sqlite else "%s"
+    moved = {}
+    for start in range(0, len(item_ids), ID_CHUNK_SIZE):
+        chunk = item_ids[start:start + ID_CHUNK_SIZE]
+        cur.execute(
+            f"SELECT id, user_id, project_id, table_id FROM items WHERE id IN ({', '.join([placeholder] * len(chunk))})"
+            + ("" if sqlite else " FOR UPDATE"),
+            tuple(chunk)
+        )
+        for row in cur.fetchall():
+            if row["user_id"] != user_id:
+                raise ItemConflictError(f"数据项 id '{row['id']}' 已被其他用户使用")
+            if row["table_id"] != table_id or row["project_id"] != project_id:
+                moved[row["id"]] = row["table_id"]
+    return moved
+
+def insert_item_rows(cur, sqlite: bool, rows: List[Tuple[str, str]], user_id: int,
+                     project_id: Optional[int], table_id: Optional[int]) -> None:
+    """
+    在当前事务中写入一批 (id, data JSON)，分配变更序号并递增受影响表格的版本号
+    已存在的同 id 数据项被覆盖并移到本次写入的项目和表格（两种数据库行为一致），原表格的版本号同样递增，
+    并为原位置写入墓碑，原表格的增量同步会收到删除；同 id 数据项属于其他用户时抛出 ItemConflictError
+    SQLite 使用多行 INSERT；PostgreSQL 用 COPY 写入临时表，再用一条 INSERT ... ON CONFLICT 合并，
+    避免 executemany 逐行往返
+    rows 中的 id 不能重复（PostgreSQL 的 ON CONFLICT 不允许同一条语句修改同一行两次）
+    """
+    moved = _claim_item_ids(cur, sqlite, [item_id for item_id, _ in rows], user_id, project_id, table_id)
+    if not sqlite:
+        # PostgreSQL：先把数据 COPY 到临时表（JSON 在这里解析），临时表在连接内复用，事务结束时自动清空
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS items_staging (id TEXT, data JSONB) ON COMMIT DELETE ROWS")
+        buffer = io.StringIO()
+        for item_id, data_json in rows:
+            buffer.write(_copy_text(item_id) + "\t" + _copy_text(data_json) + "\n")
+        buffer.seek(0)
+        cur.copy_expert("COPY items_staging (id, data) FROM STDIN", buffer)
+    _bump_versions_of_tables(cur, sqlite, [table_id, *moved.values()])
+
+    # 变更序号在写入数据项之前的最后一步分配：PostgreSQL 上计数器的行锁持有到事务提交，
+    # 所有写事务只在这之后的合并和提交阶段串行（见 app.crud.changes）
+    seq = next_seq(cur, sqlite, 2 if moved else 1)
+    if moved:
+        # 墓碑的序号小于写入的序号，同时覆盖新旧位置的同步范围先收到删除、再收到新数据
+        moved_ids = list(moved)
+        for start in range(0, len(moved_ids), ID_CHUNK_SIZE):
+            chunk = moved_ids[start:start + ID_CHUNK_SIZE]
+            record_tombstones(cur, sqlite, f"id IN ({', '.join('?' for _ in chunk)})", chunk, seq - 1)
+
+    if sqlite:
+        for start in range(0, len(rows), SQLITE_INSERT_ROWS):
+            chunk = rows[start:start + SQLITE_INSERT_ROWS]
+            params = []
+            for item_id, data_json in chunk:
+                params.extend((item_id, data_json, user_id, project_id, table_id, seq))
+            cur.execute(
+                "INSERT OR REPLACE INTO items (id, data, user_id, project_id, table_id, seq) VALUES "
+                + ", ".join("(?, ?, ?, ?, ?, ?)" for _ in chunk),
+                params
+            )
+        return
+
+    cur.execute("""
+        INSERT INTO items (id, data, user_id, project_id, table_id, seq)
+        SELECT id, data, %s, %s, %s, %s FROM items_staging
+        ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, updated_at = CURRENT_TIMESTAMP, seq = EXCLUDED.seq,
+            project_id = EXCLUDED.project_id, table_id = EXCLUDED.table_id
+    """, (user_id, project_id, table_id, seq))
+    cur.execute("TRUNCATE items_staging")
 
 def save_items_to_db(items: List[dict], user_id: int = 1, project_id: Optional[int] = None, table_id: Optional[int] = None):
     """
-    保存多个项目到数据库
+    在一个事务中保存多个项目（适用于少量数据；大批量上传请使用 app.crud.ingest.ingest_items）
     """
     if not items:
         return
         
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
     
-    try:
-        # 准备数据
-        values = []
-        for item in items:
-            # 确保有ID
-            if 'id' not in item:
-                import uuid
-                item['id'] = str(uuid.uuid4())
-                
-            item_id = item['id']
-            # 提取data (除去id, created_at, updated_at等元数据)
-            data = item.copy()
-            if 'id' in data: del data['id']
-            if 'created_at' in data: del data['created_at']
-            if 'updated_at' in data: del data['updated_at']
-            
-            # 序列化JSON
-            data_json = json.dumps(data)
-            
-            values.append((item_id, data_json, user_id, project_id, table_id))
-        
-        # 批量插入
-        if conn.row_factory:  # SQLite
-            cur.executemany(
-                "INSERT OR REPLACE INTO items (id, data, user_id, project_id, table_id) VALUES (?, ?, ?, ?, ?)",
-                values
-            )
-        else:  # PostgreSQL
-            cur.executemany(
-                "INSERT INTO items (id, data, user_id, project_id, table_id) VALUES (%s, %s, %s, %s, %s) ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, updated_at = CURRENT_TIMESTAMP",
-                values
-            )
+        try:
+            if sqlite:
+                # 先获取写锁，检查已有 id 和写入之间不会有其他连接修改这些行
+                cur.execute("BEGIN IMMEDIATE")
+            # 同一 id 出现多次时以最后一次为准
+            rows = dict(item_row(item) for item in items)
+            insert_item_rows(cur, sqlite, list(rows.items()), user_id, project_id, table_id)
             
-        conn.commit()
-        print(f"成功保存 {len(items)} 个项目到数据库")
-        return [v[0] for v in values]
-    except Exception as e:
-        conn.rollback()
-        print(f"保存项目时发生错误: {e}")
-        raise
-    finally:
-        cur.close()
-        conn.close()
\ No newline at end of file
+            conn.commit()
+            logger.debug("成功保存 %s 个项目到数据库", len(items))
+            return [item['id'] for item in items]
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
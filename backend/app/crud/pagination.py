@@ -0,0 +1,74 @@
+"""
+游标（keyset）分页工具
+游标是对上一页最后一行排序键的不透明编码（base64url(JSON)），
+下一页通过 WHERE (k1, k2, ...) > (v1, v2, ...) 直接定位，不需要 OFFSET 扫描，
+因此任意一页的查询代价都只与页大小有关。
+"""
+
+import base64
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析"""
+    pass
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """把排序键的值编码成不透明游标"""
+    raw = json.dumps(list(values), default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: Optional[int] = None) -> List[Any]:
+    """解析游标，size 为期望的排序键个数"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise InvalidCursorError("无效的分页游标")
+    if not isinstance(values, list) or (size is not None and len(values) != size):
+        raise InvalidCursorError("无效的分页游标")
+    return values
+
+def _unpack(key) -> Tuple[str, bool, list]:
+    """排序键可以是 (表达式, 是否降序) 或 (表达式, 是否降序, 表达式参数)"""
+    if len(key) == 3:
+        return key[0], key[1], list(key[2])
+    return key[0], key[1], []
+
+def keyset_condition(keys: Sequence[tuple], values: Sequence[Any]) -> Tuple[str, list]:
+    """
+    生成“位于游标之后”的 WHERE 条件（占位符统一为 ?）
+
+    Args:
+        keys: 排序键列表 [(SQL 表达式, 是否降序[, 表达式参数]), ...]
+        values: 游标中对应的值
+
+    Returns:
+        (条件 SQL, 参数列表)
+        例如 keys=[(a, False), (b, False)] 生成 ((a > ?) OR (a = ? AND b > ?))
+    """
+    unpacked = [_unpack(key) for key in keys]
+    clauses = []
+    params = []
+    for i, (expr, descending, expr_params) in enumerate(unpacked):
+        parts = []
+        for j, (prev_expr, _, prev_params) in enumerate(unpacked[:i]):
+            parts.append(f"{prev_expr} = ?")
+            params.extend(prev_params)
+            params.append(values[j])
+        parts.append(f"{expr} {'<' if descending else '>'} ?")
+        params.extend(expr_params)
+        params.append(values[i])
+        clauses.append("(" + " AND ".join(parts) + ")")
+    return "(" + " OR ".join(clauses) + ")", params
+
+def order_by_clause(keys: Sequence[tuple]) -> Tuple[str, list]:
+    """生成 ORDER BY 子句内容，返回 (SQL, 参数列表)"""
+    parts = []
+    params = []
+    for expr, descending, expr_params in (_unpack(key) for key in keys):
+        parts.append(f"{expr} {'DESC' if descending else 'ASC'}")
+        params.extend(expr_params)
+    return ", ".join(parts), params
@@ -1,65 +1,54 @@
 import sqlite3
 import json
 from typing import List, Optional, Any
-from app.database.connection import get_db_connection
-from app.models.schemas import Project
+from app.config import DELETE_BATCH_SIZE
+from app.database.connection import get_connection
+from app.crud.cache import MetadataCache
+from app.crud.items import delete_items_where
+from app.crud.tables import select_tables_by_projects
+from app.models.schemas import Project, normalize_legacy_schema
+
+# projects.schema 是旧版本的字段（schema 已移到 tables），Project 模型不包含它，因此不查询也不解析
+PROJECT_COLUMNS = "id, name, description, source_type, source_metadata, created_at, last_modified, user_id, items_count"
+
+# (user_id, project_id) -> True：用户可以访问该项目。只缓存肯定的结果，新建的项目不会被缓存为无权访问；
+# 项目行本身不缓存，items_count 和 last_modified 随每次数据项写入变化
+ownership_cache = MetadataCache("project_ownership")
+
+def _row_to_project(row) -> Project:
+    project_dict = dict(row)
+    # 处理JSON字段
+    if isinstance(project_dict.get('source_metadata'), str):
+         try:
+            project_dict['source_metadata'] = json.loads(project_dict['source_metadata'])
+         except:
+            pass # Keep as string if not valid JSON
+    return Project(**project_dict)
+
+def _select_projects(cur, sqlite: bool, user_id: int) -> List[Project]:
+    # 使用 OR 同时获取用户项目和系统项目
+    query = f"SELECT {PROJECT_COLUMNS} FROM projects WHERE user_id = ? OR id = 0 ORDER BY id"
+    cur.execute(query if sqlite else query.replace("?", "%s"), (user_id,))
+    return [_row_to_project(row) for row in cur.fetchall()]
+
+def _select_project(cur, sqlite: bool, project_id: int, user_id: int) -> Optional[Project]:
+    # 如果是系统项目（project_id=0），不过滤 user_id
+    if project_id == 0:
+        query, params = f"SELECT {PROJECT_COLUMNS} FROM projects WHERE id = ?", (project_id,)
+    else:
+        query, params = f"SELECT {PROJECT_COLUMNS} FROM projects WHERE id = ? AND user_id = ?", (project_id, user_id)
+    cur.execute(query if sqlite else query.replace("?", "%s"), params)
+    row = cur.fetchone()
+    return _row_to_project(row) if row else None
 
 def get_projects_from_db(user_id: int) -> List[Project]:
     """
     从数据库获取用户的所有项目，包括系统项目（ID=0）
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 检查数据库类型
-    # 使用 UNION 同时获取用户项目和系统项目
-    if conn.row_factory:  # SQLite
-        cur.execute("""
-            SELECT id, name, description, source_type, source_metadata, schema, created_at, last_modified, user_id, items_count 
-            FROM projects 
-            WHERE user_id = ? OR id = 0
-            ORDER BY id
-        """, (user_id,))
-    else:  # PostgreSQL
-        cur.execute("""
-            SELECT id, name, description, source_type, source_metadata, schema, created_at, last_modified, user_id, items_count 
-            FROM projects 
-            WHERE user_id = %s OR id = 0
-            ORDER BY id
-        """, (user_id,))
-    
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    
-    projects = []
-    for row in rows:
-        project_dict = dict(row)
-        # 处理JSON字段
-        if isinstance(project_dict.get('source_metadata'), str):
-             try:
-                project_dict['source_metadata'] = json.loads(project_dict['source_metadata'])
-             except:
-                pass # Keep as string if not valid JSON
-        if isinstance(project_dict.get('schema'), str):
-             try:
-                schema_data = json.loads(project_dict['schema'])
-                # Adapter for legacy schema format (columns -> fields)
-                if isinstance(schema_data, dict) and 'columns' in schema_data and 'fields' not in schema_data:
-                    schema_data['fields'] = schema_data['columns']
-                    # Ensure field structure matches FieldDefinition
-                    for field in schema_data['fields']:
-                        if 'name' in field and 'key' not in field:
-                            field['key'] = field['name']
-                        # Add label field (required by FieldDefinition)
-                        if 'name' in field and 'label' not in field:
-                            field['label'] = field['name']
-                
-                project_dict['schema'] = schema_data
-             except:
-                pass
-        projects.append(Project(**project_dict))
-    
+    with get_connection() as conn:
+        cur = conn.cursor()
+        projects = _select_projects(cur, bool(conn.row_factory), user_id)
+        cur.close()
     return projects
 
 def get_project_from_db(project_id: int, user_id: int) -> Optional[Project]:
@@ -67,199 +56,179 @@ def get_project_from_db(project_id: int, user_id: int) -> Optional[Project]:
     从数据库获取单个项目
     特殊处理：当 project_id=0（系统项目）时，不过滤 user_id，允许所有用户查看
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 如果是系统项目（project_id=0），不过滤 user_id
-    if project_id == 0:
-        if conn.row_factory:  # SQLite
-            cur.execute("SELECT id, name, description, source_type, source_metadata, schema, created_at, last_modified, user_id, items_count FROM projects WHERE id = ?", (project_id,))
-        else:  # PostgreSQL
-            cur.execute("SELECT id, name, description, source_type, source_metadata, schema, created_at, last_modified, user_id, items_count FROM projects WHERE id = %s", (project_id,))
-    else:
-        # 检查数据库类型
-        if conn.row_factory:  # SQLite
-            cur.execute("SELECT id, name, description, source_type, source_metadata, schema, created_at, last_modified, user_id, items_count FROM projects WHERE id = ? AND user_id = ?", (project_id, user_id))
-        else:  # PostgreSQL
-            cur.execute("SELECT id, name, description, source_type, source_metadata, schema, created_at, last_modified, user_id, items_count FROM projects WHERE id = %s AND user_id = %s", (project_id, user_id))
-    
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-    
+    with get_connection() as conn:
+        cur = conn.cursor()
+        project = _select_project(cur, bool(conn.row_factory), project_id, user_id)
+        cur.close()
+    return project
+
+def user_owns_project(project_id: int, user_id: int) -> bool:
+    """
+    用户是否可以访问项目（自己的项目或系统项目），从数据库读取并刷新 ownership_cache
+    路由通过 app.api.dependencies.has_project_access 先查缓存
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        query = "SELECT 1 FROM projects WHERE id = ? AND (user_id = ? OR id = 0)"
+        cur.execute(query if conn.row_factory else query.replace("?", "%s"), (project_id, user_id))
+        row = cur.fetchone()
+        cur.close()
     if row:
-        project_dict = dict(row)
-        # 处理JSON字段
-        if isinstance(project_dict.get('source_metadata'), str):
-             try:
-                project_dict['source_metadata'] = json.loads(project_dict['source_metadata'])
-             except Exception as e:
-                print(f"Error parsing source_metadata: {e}")
-                pass
-        if isinstance(project_dict.get('schema'), str):
-             try:
-                schema_data = json.loads(project_dict['schema'])
-                # Adapter for legacy schema format (columns -> fields)
-                if isinstance(schema_data, dict) and 'columns' in schema_data and 'fields' not in schema_data:
-                    schema_data['fields'] = schema_data['columns']
-                    # Ensure field structure matches FieldDefinition
-                    for field in schema_data['fields']:
-                        if 'name' in field and 'key' not in field:
-                            field['key'] = field['name']
-                        # Add label field (required by FieldDefinition)
-                        if 'name' in field and 'label' not in field:
-                            field['label'] = field['name']
-                        if 'type' in field:
-                            # Map legacy types if needed
-                            pass
-                
-                project_dict['schema'] = schema_data
-             except Exception as e:
-                print(f"Error parsing schema: {e}")
-                pass
-        try:
-            return Project(**project_dict)
-        except Exception as e:
-            print(f"Error creating Project model: {e}")
-            print(f"Project dict: {project_dict}")
-            raise e
-    return None
+        ownership_cache.set((user_id, project_id), True)
+    return row is not None
+
+def _invalidate_ownership(project_id: int):
+    ownership_cache.invalidate_where(lambda key, value: key[1] == project_id)
+
+def get_projects_with_tables(user_id: int) -> List[Project]:
+    """
+    获取用户的所有项目及其表格：同一连接上一条项目查询 + 一条表格 IN 查询，
+    不再按项目逐个查询表格（项目和表格的数据项数由触发器维护，不需要 COUNT）
+    """
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
+        projects = _select_projects(cur, sqlite, user_id)
+        tables = select_tables_by_projects(cur, sqlite, [project.id for project in projects])
+        cur.close()
+    for project in projects:
+        project.tables = tables[project.id]
+    return projects
+
+def get_project_with_tables(project_id: int, user_id: int) -> Optional[Project]:
+    """获取单个项目及其表格（同一连接上的两条查询），项目不存在或无权限时返回 None"""
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
+        project = _select_project(cur, sqlite, project_id, user_id)
+        if project:
+            project.tables = select_tables_by_projects(cur, sqlite, [project.id])[project.id]
+        cur.close()
+    return project
 
 def create_project_in_db(name: str, user_id: int, description: Optional[str] = None, source_type: str = "manual", source_metadata: Optional[Any] = None, schema: Optional[dict] = None) -> Project:
     """
     创建新项目
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 准备 source_metadata 和 schema
-    source_metadata_json = None
-    if source_metadata:
-        source_metadata_json = json.dumps(source_metadata)
-    
-    schema_json = None
-    if schema:
-        schema_json = json.dumps(schema)
-    
-    # 检查数据库类型
-    if conn.row_factory:  # SQLite
-        cur.execute("""
-            INSERT INTO projects (name, description, source_type, source_metadata, schema, user_id)
-            VALUES (?, ?, ?, ?, ?, ?)
-            RETURNING id, name, description, source_type, source_metadata, schema, created_at, last_modified, user_id, items_count
-        """, (name, description, source_type, source_metadata_json, schema_json, user_id))
-    else:  # PostgreSQL
-        cur.execute("""
-            INSERT INTO projects (name, description, source_type, source_metadata, schema, user_id)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id, name, description, source_type, source_metadata, schema, created_at, last_modified, user_id, items_count
-        """, (name, description, source_type, source_metadata_json, schema_json, user_id))
-    
-    row = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        
+        # 准备 source_metadata 和 schema
+        source_metadata_json = None
+        if source_metadata:
+            source_metadata_json = json.dumps(source_metadata)
+        
+        schema_json = None
+        if schema:
+            schema_json = json.dumps(normalize_legacy_schema(schema))
+        
+        # 检查数据库类型
+        if conn.row_factory:  # SQLite
+            cur.execute(f"""
+                INSERT INTO projects (name, description, source_type, source_metadata, schema, user_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+                RETURNING {PROJECT_COLUMNS}
+            """, (name, description, source_type, source_metadata_json, schema_json, user_id))
+        else:  # PostgreSQL
+            cur.execute(f"""
+                INSERT INTO projects (name, description, source_type, source_metadata, schema, user_id)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING {PROJECT_COLUMNS}
+            """, (name, description, source_type, source_metadata_json, schema_json, user_id))
+        
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
     
     if row:
-        project_dict = dict(row)
-        # 处理JSON字段
-        if isinstance(project_dict.get('source_metadata'), str):
-             try:
-                project_dict['source_metadata'] = json.loads(project_dict['source_metadata'])
-             except:
-                pass
-        if isinstance(project_dict.get('schema'), str):
-             try:
-                schema_data = json.loads(project_dict['schema'])
-                # Adapter for legacy schema format (columns -> fields)
-                if isinstance(schema_data, dict) and 'columns' in schema_data and 'fields' not in schema_data:
-                    schema_data['fields'] = schema_data['columns']
-                    # Ensure field structure matches FieldDefinition
-                    for field in schema_data['fields']:
-                        if 'name' in field and 'key' not in field:
-                            field['key'] = field['name']
-                        # Add label field (required by FieldDefinition)
-                        if 'name' in field and 'label' not in field:
-                            field['label'] = field['name']
-                
-                project_dict['schema'] = schema_data
-             except:
-                pass
-        return Project(**project_dict)
+        project = _row_to_project(row)
+        ownership_cache.set((user_id, project.id), True)
+        return project
     raise Exception("创建项目失败")
 
 def update_project_last_modified(project_id: int, user_id: int):
     """
     更新项目的最后修改时间
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 检查数据库类型
-    if conn.row_factory:  # SQLite
-        cur.execute("UPDATE projects SET last_modified = datetime('now') WHERE id = ? AND user_id = ?", (project_id, user_id))
-    else:  # PostgreSQL
-        cur.execute("UPDATE projects SET last_modified = NOW() WHERE id = %s AND user_id = %s", (project_id, user_id))
-    
-    conn.commit()
-    cur.close()
-    conn.close()
-
-def update_project_items_count(project_id: int, user_id: int, count: int):
-    """
-    更新项目的项数
-    """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 检查数据库类型
-    if conn.row_factory:  # SQLite
-        cur.execute("UPDATE projects SET items_count = ? WHERE id = ? AND user_id = ?", (count, project_id, user_id))
-    else:  # PostgreSQL
-        cur.execute("UPDATE projects SET items_count = %s WHERE id = %s AND user_id = %s", (count, project_id, user_id))
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        
+        # 检查数据库类型
+        if conn.row_factory:  # SQLite
+            cur.execute("UPDATE projects SET last_modified = datetime('now') WHERE id = ? AND user_id = ?", (project_id, user_id))
+        else:  # PostgreSQL
+            cur.execute("UPDATE projects SET last_modified = NOW() WHERE id = %s AND user_id = %s", (project_id, user_id))
+        
+        conn.commit()
+        cur.close()
 
-def delete_project_from_db(project_id: int, user_id: int) -> bool:
+def delete_project_from_db(project_id: int, user_id: int, batch_size: int = DELETE_BATCH_SIZE) -> bool:
     """
-    删除项目
+    删除项目，并级联删除项目的表格和数据项
+    数据项分批删除（见 delete_items_where），表格和项目本身在最后一个事务中删除
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 检查数据库类型
-    if conn.row_factory:  # SQLite
-        cur.execute("DELETE FROM projects WHERE id = ? AND user_id = ?", (project_id, user_id))
-    else:  # PostgreSQL
-        cur.execute("DELETE FROM projects WHERE id = %s AND user_id = %s", (project_id, user_id))
-    
-    conn.commit()
-    rows_affected = cur.rowcount
-    cur.close()
-    conn.close()
-    
+    with get_connection() as conn:
+        cur = conn.cursor()
+        
+        # 检查数据库类型
+        if conn.row_factory:  # SQLite
+            cur.execute("SELECT id FROM projects WHERE id = ? AND user_id = ?", (project_id, user_id))
+        else:  # PostgreSQL
+            cur.execute("SELECT id FROM projects WHERE id = %s AND user_id = %s", (project_id, user_id))
+        
+        row = cur.fetchone()
+        cur.close()
+    
+    if not row:
+        return False
+    
+    # 删除开始前和项目行删除后各失效一次（删除数据项期间可能有请求重新缓存）
+    _invalidate_ownership(project_id)
+    delete_items_where("project_id = ?", [project_id], batch_size)
+    # 项目表格中 project_id 不一致的数据项（PostgreSQL 外键要求先删除这些数据项）
+    delete_items_where("table_id IN (SELECT id FROM tables WHERE project_id = ?)", [project_id], batch_size)
+    
+    with get_connection() as conn:
+        cur = conn.cursor()
+        
+        try:
+            if conn.row_factory:  # SQLite
+                cur.execute("DELETE FROM table_profiles WHERE table_id IN (SELECT id FROM tables WHERE project_id = ?)", (project_id,))
+                cur.execute("DELETE FROM tables WHERE project_id = ?", (project_id,))
+                cur.execute("DELETE FROM projects WHERE id = ? AND user_id = ?", (project_id, user_id))
+            else:  # PostgreSQL
+                cur.execute("DELETE FROM table_profiles WHERE table_id IN (SELECT id FROM tables WHERE project_id = %s)", (project_id,))
+                cur.execute("DELETE FROM tables WHERE project_id = %s", (project_id,))
+                cur.execute("DELETE FROM projects WHERE id = %s AND user_id = %s", (project_id, user_id))
+            
+            rows_affected = cur.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    
+    _invalidate_ownership(project_id)
     return rows_affected > 0
 
 def update_project_schema_in_db(project_id: int, user_id: int, schema: dict) -> bool:
     """
     更新项目的 schema
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    schema_json = json.dumps(schema)
-    
-    # 检查数据库类型
-    if conn.row_factory:  # SQLite
-        cur.execute("UPDATE projects SET schema = ? WHERE id = ? AND user_id = ?", (schema_json, project_id, user_id))
-    else:  # PostgreSQL
-        cur.execute("UPDATE projects SET schema = %s WHERE id = %s AND user_id = %s", (schema_json, project_id, user_id))
-    
-    conn.commit()
-    rows_affected = cur.rowcount
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        
+        schema_json = json.dumps(normalize_legacy_schema(schema))
+        
+        # 检查数据库类型
+        if conn.row_factory:  # SQLite
+            cur.execute("UPDATE projects SET schema = ? WHERE id = ? AND user_id = ?", (schema_json, project_id, user_id))
+        else:  # PostgreSQL
+            cur.execute("UPDATE projects SET schema = %s WHERE id = %s AND user_id = %s", (schema_json, project_id, user_id))
+        
+        conn.commit()
+        rows_affected = cur.rowcount
+        cur.close()
     
     return rows_affected > 0
\ No newline at end of file
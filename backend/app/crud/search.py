@@ -0,0 +1,91 @@
+"""
+数据项全文检索
+索引内容为 items.data 中所有字符串值（包括数组、嵌套对象中的字符串）：
+SQLite 使用 FTS5 虚拟表 items_fts（rowid 与 items.rowid 对应，由触发器随 items 的增删改同步），
+PostgreSQL 使用 jsonb_to_tsvector 表达式上的 GIN 索引。两者都使用不做词干处理的分词方式
+（unicode61 / simple），按空格和标点切分，适合英文、数字等有分隔符的词。
+
+这两种分词都不切分连续的中日韩文字（整段文字是一个词），在词索引中只能匹配整段的前缀。
+因此含中日韩文字的检索词改为子串匹配：SQLite 在 items_fts 保存的文本上执行 LIKE（不使用索引，
+逐行比较），PostgreSQL 在 PG_SEARCH_TEXT 上执行 ILIKE（迁移 12 在其上建立 pg_trgm 索引）。
+
+用户输入只提取其中的词（\\w+），其他词按前缀匹配，多个词之间为 AND，
+不会把 FTS 语法直接交给数据库解析。结果按词索引的相关度排序（只有子串检索词时按 id 排序）。
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+# 与迁移 7 创建的 GIN 索引表达式保持一致，否则查询无法使用索引
+PG_SEARCH_VECTOR = "jsonb_to_tsvector('simple', data, '[\"string\"]')"
+# data 中所有字符串值组成的 JSON 数组文本，与迁移 12 创建的 pg_trgm 索引表达式保持一致
+PG_SEARCH_TEXT = "(jsonb_path_query_array(data, 'strict $.** ? (@.type() == \"string\")')::text)"
+
+_TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+# 中日韩文字（平假名、片假名、CJK 统一表意文字及扩展 A、谚文、兼容表意文字）
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+# 最多使用的检索词个数
+MAX_SEARCH_TERMS = 16
+
+
+class InvalidSearchError(ValueError):
+    """检索词为空或不合法"""
+    pass
+
+
+def search_terms(query: str) -> List[str]:
+    """从用户输入中提取检索词（去重，保持顺序）"""
+    terms = list(dict.fromkeys(term.lower() for term in _TERM_PATTERN.findall(query or "")))
+    if not terms:
+        raise InvalidSearchError("检索词不能为空")
+    return terms[:MAX_SEARCH_TERMS]
+
+def is_substring_term(term: str) -> bool:
+    """含中日韩文字的检索词按子串匹配"""
+    return _CJK_PATTERN.search(term) is not None
+
+def fts_match_expression(terms: List[str], sqlite: bool) -> str:
+    """
+    生成全文检索表达式（作为参数传入，不拼接到 SQL 中）
+    SQLite FTS5: "foo"* "bar"*    PostgreSQL to_tsquery: foo:* & bar:*
+    """
+    if sqlite:
+        return " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+    return " & ".join(term + ":*" for term in terms)
+
+def _like_pattern(term: str) -> str:
+    """子串匹配的 LIKE 模式（转义 \\ % _，配合 ESCAPE '\\'）"""
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def search_clause(terms: List[str], sqlite: bool) -> Tuple[str, str, list, Optional[str], list]:
+    """
+    全文检索的 SQL 片段（占位符为 ?）
+
+    Returns:
+        (FROM 子句, 匹配条件, 条件参数, 相关度表达式, 相关度参数)
+        相关度按升序排列时越靠前越相关；没有词索引检索词时相关度表达式为 None
+    """
+    words = [term for term in terms if not is_substring_term(term)]
+    substrings = [term for term in terms if is_substring_term(term)]
+    conditions, params = [], []
+    if sqlite:
+        from_clause = "items_fts JOIN items ON items.rowid = items_fts.rowid"
+        if words:
+            conditions.append("items_fts MATCH ?")
+            params.append(fts_match_expression(words, sqlite))
+        for term in substrings:
+            conditions.append("items_fts.content LIKE ? ESCAPE '\\'")
+            params.append(_like_pattern(term))
+        return from_clause, " AND ".join(conditions), params, ("bm25(items_fts)" if words else None), []
+
+    rank, rank_params = None, []
+    if words:
+        match = fts_match_expression(words, sqlite)
+        conditions.append(f"{PG_SEARCH_VECTOR} @@ to_tsquery('simple', ?)")
+        params.append(match)
+        rank, rank_params = f"-ts_rank({PG_SEARCH_VECTOR}, to_tsquery('simple', ?))", [match]
+    for term in substrings:
+        conditions.append(f"{PG_SEARCH_TEXT} ILIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(term))
+    return "items", " AND ".join(conditions), params, rank, rank_params
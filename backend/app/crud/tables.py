@@ -1,120 +1,227 @@
 import json
-from typing import List, Optional, Any
-from app.database.connection import get_db_connection
-from app.models.schemas import Table, ProjectSchema
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+from pydantic import ValidationError
+from app.config import DELETE_BATCH_SIZE, SCHEMA_CACHE_SIZE
+from app.database.connection import get_connection
+from app.crud.items import delete_items_where
+from app.models.schemas import Table, ProjectSchema, normalize_legacy_schema
+
+# 查询表格的列；PostgreSQL 的 schema 以文本返回，作为 schema 缓存的版本标识（见 parse_table_schema）
+TABLE_COLUMNS = "id, project_id, name, description, schema, created_at, updated_at, version, items_count"
+
+def _table_columns(sqlite: bool) -> str:
+    return TABLE_COLUMNS if sqlite else TABLE_COLUMNS.replace("schema", "schema::text AS schema")
+
+# 已解析的表格 schema：表格 id -> (schema 原文, ProjectSchema)
+# 表格 id 不会复用，schema 原文不同即视为已修改，因此其他进程的写入也不会读到过期的 schema
+_schema_cache: "OrderedDict[int, Tuple[str, ProjectSchema]]" = OrderedDict()
+_schema_cache_lock = threading.Lock()
+
+
+def parse_table_schema(table_id: int, raw: Any) -> Any:
+    """
+    解析表格的 schema 列，按 (表格 id, schema 原文) 缓存解析和校验后的 ProjectSchema，
+    列表接口不再对每个表格重复 json.loads 和 Pydantic 校验
+    无法解析或校验失败的 schema 原样返回（不缓存），由 Table 模型校验时报错
+    """
+    if not isinstance(raw, str):
+        return raw
+    with _schema_cache_lock:
+        cached = _schema_cache.get(table_id)
+        if cached is not None and cached[0] == raw:
+            _schema_cache.move_to_end(table_id)
+            return cached[1]
+    try:
+        schema = ProjectSchema.parse_obj(json.loads(raw))
+    except (ValueError, ValidationError):
+        return raw
+    with _schema_cache_lock:
+        _schema_cache[table_id] = (raw, schema)
+        _schema_cache.move_to_end(table_id)
+        while len(_schema_cache) > SCHEMA_CACHE_SIZE:
+            _schema_cache.popitem(last=False)
+    return schema
+
+def evict_table_schema(table_id: int) -> None:
+    with _schema_cache_lock:
+        _schema_cache.pop(table_id, None)
 
 def create_table(project_id: int, name: str, schema: Optional[dict] = None, description: Optional[str] = None) -> Table:
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    schema_json = None
-    if schema:
-        from fastapi.encoders import jsonable_encoder
-        try:
-            schema_json = json.dumps(jsonable_encoder(schema))
-        except TypeError:
-            # Fallback for non-serializable objects
-            schema_json = json.dumps(jsonable_encoder(schema), default=str)
+    with get_connection() as conn:
+        cur = conn.cursor()
         
-    if conn.row_factory: # SQLite
-        cur.execute("""
+        schema_json = None
+        if schema:
+            from fastapi.encoders import jsonable_encoder
+            # 旧格式在写入时转换，读取时不再需要转换
+            schema = normalize_legacy_schema(jsonable_encoder(schema))
+            try:
+                schema_json = json.dumps(schema)
+            except TypeError:
+                # Fallback for non-serializable objects
+                schema_json = json.dumps(schema, default=str)
+            
+        sqlite = bool(conn.row_factory)
+        query = f"""
             INSERT INTO tables (project_id, name, description, schema)
             VALUES (?, ?, ?, ?)
-            RETURNING id, project_id, name, description, schema, created_at, updated_at
-        """, (project_id, name, description, schema_json))
-    else: # PostgreSQL
-        cur.execute("""
-            INSERT INTO tables (project_id, name, description, schema)
-            VALUES (%s, %s, %s, %s)
-            RETURNING id, project_id, name, description, schema, created_at, updated_at
-        """, (project_id, name, description, schema_json))
-        
-    row = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+            RETURNING {_table_columns(sqlite)}
+        """
+        cur.execute(query if sqlite else query.replace("?", "%s"), (project_id, name, description, schema_json))
+            
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
     
     if row:
-        table_dict = dict(row)
-        if isinstance(table_dict.get('schema'), str):
-            try:
-                table_dict['schema'] = json.loads(table_dict['schema'])
-            except:
-                pass
-        return Table(**table_dict)
+        return _row_to_table(row)
     raise Exception("创建表格失败")
 
-def get_tables_by_project(project_id: int) -> List[Table]:
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    if conn.row_factory:
-        cur.execute("SELECT * FROM tables WHERE project_id = ?", (project_id,))
-    else:
-        cur.execute("SELECT * FROM tables WHERE project_id = %s", (project_id,))
-        
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    
-    tables = []
-    for row in rows:
-        table_dict = dict(row)
-        if isinstance(table_dict.get('schema'), str):
-            try:
-                schema_data = json.loads(table_dict['schema'])
-                # Adapter for legacy schema format (columns -> fields)
-                if isinstance(schema_data, dict) and 'columns' in schema_data and 'fields' not in schema_data:
-                    schema_data['fields'] = schema_data['columns']
-                    # Ensure field structure matches FieldDefinition
-                    for field in schema_data['fields']:
-                        if 'name' in field and 'key' not in field:
-                            field['key'] = field['name']
-                        # Add label field (required by FieldDefinition)
-                        if 'name' in field and 'label' not in field:
-                            field['label'] = field['name']
-                
-                table_dict['schema'] = schema_data
-            except Exception as e:
-                pass
-        tables.append(Table(**table_dict))
+def _row_to_table(row) -> Table:
+    table_dict = dict(row)
+    table_dict['schema'] = parse_table_schema(table_dict['id'], table_dict.get('schema'))
+    return Table(**table_dict)
+
+# IN (...) 查询每批的项目 id 数量，低于旧版 SQLite 999 个参数的限制
+PROJECT_ID_CHUNK_SIZE = 500
+
+def select_tables_by_projects(cur, sqlite: bool, project_ids: List[int]) -> Dict[int, List[Table]]:
+    """
+    在调用方的连接上批量查询多个项目的表格（每 PROJECT_ID_CHUNK_SIZE 个项目一条 IN 查询）
+
+    Returns:
+        {项目 id: [表格, ...]}，没有表格的项目也有一个空列表
+    """
+    placeholder = "?" if sqlite else "%s"
+    unique_ids = list(dict.fromkeys(project_ids))
+    tables: Dict[int, List[Table]] = {project_id: [] for project_id in unique_ids}
+    for start in range(0, len(unique_ids), PROJECT_ID_CHUNK_SIZE):
+        chunk = unique_ids[start:start + PROJECT_ID_CHUNK_SIZE]
+        marks = ", ".join([placeholder] * len(chunk))
+        cur.execute(
+            f"SELECT {_table_columns(sqlite)} FROM tables WHERE project_id IN ({marks}) ORDER BY project_id, id",
+            tuple(chunk)
+        )
+        for row in cur.fetchall():
+            tables[row["project_id"]].append(_row_to_table(row))
+    return tables
+
+def get_tables_by_projects(project_ids: List[int]) -> Dict[int, List[Table]]:
+    """批量获取多个项目的表格，见 select_tables_by_projects"""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        tables = select_tables_by_projects(cur, bool(conn.row_factory), project_ids)
+        cur.close()
     return tables
 
+def get_tables_by_project(project_id: int) -> List[Table]:
+    return get_tables_by_projects([project_id])[project_id]
+
 def get_table(table_id: int) -> Optional[Table]:
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    if conn.row_factory:
-        cur.execute("SELECT * FROM tables WHERE id = ?", (table_id,))
-    else:
-        cur.execute("SELECT * FROM tables WHERE id = %s", (table_id,))
+    with get_connection() as conn:
+        cur = conn.cursor()
         
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+        if conn.row_factory:
+            cur.execute(f"SELECT {_table_columns(True)} FROM tables WHERE id = ?", (table_id,))
+        else:
+            cur.execute(f"SELECT {_table_columns(False)} FROM tables WHERE id = %s", (table_id,))
+            
+        row = cur.fetchone()
+        cur.close()
     
     if row:
-        table_dict = dict(row)
-        if isinstance(table_dict.get('schema'), str):
-            try:
-                schema_data = json.loads(table_dict['schema'])
-                # Adapter for legacy schema format (columns -> fields)
-                if isinstance(schema_data, dict) and 'columns' in schema_data and 'fields' not in schema_data:
-                    schema_data['fields'] = schema_data['columns']
-                    # Ensure field structure matches FieldDefinition
-                    for field in schema_data['fields']:
-                        if 'name' in field and 'key' not in field:
-                            field['key'] = field['name']
-                        # Add label field (required by FieldDefinition)
-                        if 'name' in field and 'label' not in field:
-                            field['label'] = field['name']
-                            
-                table_dict['schema'] = schema_data
-            except:
-                pass
-        return Table(**table_dict)
+        return _row_to_table(row)
     return None
 
+def get_table_versions(project_id: Optional[int] = None, table_id: Optional[int] = None) -> List[Tuple[int, int, Any]]:
+    """
+    获取表格的版本号，用于生成条件 GET 的 ETag
+
+    Returns:
+        [(表格 id, 版本号, updated_at), ...]，按 id 排序
+    """
+    where = []
+    params = []
+    if project_id is not None:
+        where.append("project_id = ?")
+        params.append(project_id)
+    if table_id is not None:
+        where.append("id = ?")
+        params.append(table_id)
+    query = "SELECT id, version, updated_at FROM tables"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY id"
+    
+    with get_connection() as conn:
+        if not conn.row_factory:  # PostgreSQL
+            query = query.replace("?", "%s")
+        cur = conn.cursor()
+        cur.execute(query, tuple(params))
+        rows = cur.fetchall()
+        cur.close()
+    
+    return [(row["id"], row["version"], row["updated_at"]) for row in rows]
+
+def get_table_profile(table_id: int, version: int) -> Optional[dict]:
+    """获取保存的列统计，版本号与表格当前版本号不一致时返回 None"""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        if conn.row_factory:
+            cur.execute("SELECT profile FROM table_profiles WHERE table_id = ? AND version = ?", (table_id, version))
+        else:
+            cur.execute("SELECT profile FROM table_profiles WHERE table_id = %s AND version = %s", (table_id, version))
+        row = cur.fetchone()
+        cur.close()
+    if not row:
+        return None
+    profile = row["profile"]
+    return json.loads(profile) if isinstance(profile, str) else profile
+
+def save_table_profile(table_id: int, version: int, profile: dict) -> None:
+    """保存列统计（每个表格只保留最新一份）"""
+    profile_json = json.dumps(profile, ensure_ascii=False, default=str)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        if conn.row_factory:
+            cur.execute(
+                "INSERT OR REPLACE INTO table_profiles (table_id, version, profile) VALUES (?, ?, ?)",
+                (table_id, version, profile_json)
+            )
+        else:
+            cur.execute("""
+                INSERT INTO table_profiles (table_id, version, profile) VALUES (%s, %s, %s)
+                ON CONFLICT (table_id) DO UPDATE SET version = EXCLUDED.version, profile = EXCLUDED.profile,
+                    created_at = CURRENT_TIMESTAMP
+            """, (table_id, version, profile_json))
+        conn.commit()
+        cur.close()
+
+def delete_table_from_db(table_id: int, batch_size: int = DELETE_BATCH_SIZE) -> bool:
+    """
+    删除表格及其所有数据项
+    数据项分批删除（见 delete_items_where），最后删除表格本身
+    """
+    delete_items_where("table_id = ?", [table_id], batch_size)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        
+        if conn.row_factory:
+            cur.execute("DELETE FROM table_profiles WHERE table_id = ?", (table_id,))
+            cur.execute("DELETE FROM tables WHERE id = ?", (table_id,))
+        else:
+            cur.execute("DELETE FROM table_profiles WHERE table_id = %s", (table_id,))
+            cur.execute("DELETE FROM tables WHERE id = %s", (table_id,))
+        
+        conn.commit()
+        rows_affected = cur.rowcount
+        cur.close()
+    
+    evict_table_schema(table_id)
+    return rows_affected > 0
+
 def ensure_project_geocode_table(project_id: int) -> int:
     """
     确保项目有本地地理数据表，如果不存在则创建
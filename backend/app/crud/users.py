@@ -4,35 +4,39 @@
 支持SQLite和PostgreSQL两种数据库。
 """
 
-from app.database.connection import get_db_connection
+from typing import Optional
+from app.database.connection import get_connection
 from app.models.schemas import UserCreate, User, UserPublic
 from app.auth.security import get_password_hash, verify_password
+from app.crud.cache import MetadataCache
+
+# 用户名 -> User，供 get_current_user 使用；每次从数据库读取用户时刷新
+user_cache = MetadataCache("users")
 
 def get_user_from_db(db, username: str):
     """
-    根据用户名从数据库获取用户信息
+    根据用户名从数据库获取用户信息，找到的用户同时写入 user_cache
     
     Args:
-        db: 数据库连接对象（注意：此参数在函数中未使用，实际使用的是get_db_connection获取的新连接）
+        db: 数据库连接对象（注意：此参数在函数中未使用，实际使用的是从连接池借出的连接）
         username (str): 用户名
         
     Returns:
         User对象或None（如果用户不存在）
     """
     # 获取数据库连接
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 检查数据库类型以使用相应的参数占位符
-    if conn.row_factory:  # SQLite
-        cur.execute("SELECT id, username, email, hashed_password, is_active, role_id FROM users WHERE username = ?", (username,))
-    else:  # PostgreSQL
-        cur.execute("SELECT id, username, email, hashed_password, is_active, role_id FROM users WHERE username = %s", (username,))
-    
-    # 获取查询结果
-    user_row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        
+        # 检查数据库类型以使用相应的参数占位符
+        if conn.row_factory:  # SQLite
+            cur.execute("SELECT id, username, email, hashed_password, is_active, role_id FROM users WHERE username = ?", (username,))
+        else:  # PostgreSQL
+            cur.execute("SELECT id, username, email, hashed_password, is_active, role_id FROM users WHERE username = %s", (username,))
+        
+        # 获取查询结果
+        user_row = cur.fetchone()
+        cur.close()
     
     # 如果找到用户，将数据库字段转换为模型字段并返回User对象
     if user_row:
@@ -40,7 +44,21 @@ def get_user_from_db(db, username: str):
         user_dict = dict(user_row)
         user_dict['isActive'] = user_dict.pop('is_active')
         user_dict['roleId'] = user_dict.pop('role_id')
-        return User(**user_dict)
+        user = User(**user_dict)
+        user_cache.set(username, user)
+        return user
+
+def user_exists_in_db(username: str) -> bool:
+    """
+    用户名是否已被注册（只查询，不计算密码哈希）
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        query = "SELECT 1 FROM users WHERE username = ?"
+        cur.execute(query if conn.row_factory else query.replace("?", "%s"), (username,))
+        row = cur.fetchone()
+        cur.close()
+    return row is not None
 
 def authenticate_user_from_db(username: str, password: str):
     """
@@ -53,10 +71,8 @@ def authenticate_user_from_db(username: str, password: str):
     Returns:
         User对象（验证成功）或False（验证失败）
     """
-    # 获取数据库连接并查询用户
-    conn = get_db_connection()
-    user = get_user_from_db(conn, username)
-    conn.close()
+    # 查询用户（get_user_from_db 自行从连接池借出连接）
+    user = get_user_from_db(None, username)
     
     # 如果用户不存在，验证失败
     if not user:
@@ -69,42 +85,43 @@ def authenticate_user_from_db(username: str, password: str):
     # 验证成功，返回用户对象
     return user
 
-def create_user_in_db(user: UserCreate):
+def create_user_in_db(user: UserCreate, hashed_password: Optional[str] = None):
     """
     在数据库中创建新用户
     
     Args:
         user (UserCreate): 包含用户信息的Pydantic模型
+        hashed_password (str): 已计算的密码哈希（注册接口在密码哈希线程池中计算），为 None 时在此计算
         
     Returns:
         创建的User对象或None（创建失败）
     """
-    # 获取数据库连接
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 对用户密码进行哈希处理
-    hashed_password = get_password_hash(user.password)
+    # 对用户密码进行哈希处理（在借出连接之前完成，避免哈希期间占用连接）
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     
-    # 根据数据库类型使用相应的SQL语句和参数占位符
-    if conn.row_factory:  # SQLite
-        cur.execute("""
-            INSERT INTO users (username, email, hashed_password, is_active, role_id)
-            VALUES (?, ?, ?, ?, ?)
-            RETURNING id, username, email, hashed_password, is_active, role_id
-        """, (user.username, user.email, hashed_password, user.isActive, user.roleId))
-    else:  # PostgreSQL
-        cur.execute("""
-            INSERT INTO users (username, email, hashed_password, is_active, role_id)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id, username, email, hashed_password, is_active, role_id
-        """, (user.username, user.email, hashed_password, user.isActive, user.roleId))
-    
-    # 获取插入的用户数据
-    user_row = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    # 获取数据库连接
+    with get_connection() as conn:
+        cur = conn.cursor()
+        
+        # 根据数据库类型使用相应的SQL语句和参数占位符
+        if conn.row_factory:  # SQLite
+            cur.execute("""
+                INSERT INTO users (username, email, hashed_password, is_active, role_id)
+                VALUES (?, ?, ?, ?, ?)
+                RETURNING id, username, email, hashed_password, is_active, role_id
+            """, (user.username, user.email, hashed_password, user.isActive, user.roleId))
+        else:  # PostgreSQL
+            cur.execute("""
+                INSERT INTO users (username, email, hashed_password, is_active, role_id)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING id, username, email, hashed_password, is_active, role_id
+            """, (user.username, user.email, hashed_password, user.isActive, user.roleId))
+        
+        # 获取插入的用户数据
+        user_row = cur.fetchone()
+        conn.commit()
+        cur.close()
     
     # 如果成功插入，将数据库字段转换为模型字段并返回User对象
     if user_row:
@@ -123,19 +140,18 @@ def get_all_users_from_db():
         User对象列表
     """
     # 获取数据库连接
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 根据数据库类型使用相应的SQL语句和参数占位符
-    if conn.row_factory:  # SQLite
-        cur.execute("SELECT id, username, email, is_active, role_id FROM users")
-    else:  # PostgreSQL
-        cur.execute("SELECT id, username, email, is_active, role_id FROM users")
-    
-    # 获取所有用户数据
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        
+        # 根据数据库类型使用相应的SQL语句和参数占位符
+        if conn.row_factory:  # SQLite
+            cur.execute("SELECT id, username, email, is_active, role_id FROM users")
+        else:  # PostgreSQL
+            cur.execute("SELECT id, username, email, is_active, role_id FROM users")
+        
+        # 获取所有用户数据
+        rows = cur.fetchall()
+        cur.close()
     
     # 将数据库字段转换为模型字段，并创建User对象列表
     users = []
@@ -161,20 +177,22 @@ def update_user_role_in_db(user_id: int, role_id: int):
         bool: 更新是否成功
     """
     # 获取数据库连接
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 根据数据库类型使用相应的SQL语句和参数占位符
-    if conn.row_factory:  # SQLite
-        cur.execute("UPDATE users SET role_id = ? WHERE id = ?", (role_id, user_id))
-    else:  # PostgreSQL
-        cur.execute("UPDATE users SET role_id = %s WHERE id = %s", (role_id, user_id))
+    with get_connection() as conn:
+        cur = conn.cursor()
+        
+        # 根据数据库类型使用相应的SQL语句和参数占位符
+        if conn.row_factory:  # SQLite
+            cur.execute("UPDATE users SET role_id = ? WHERE id = ?", (role_id, user_id))
+        else:  # PostgreSQL
+            cur.execute("UPDATE users SET role_id = %s WHERE id = %s", (role_id, user_id))
+        
+        # 提交更改并检查影响的行数
+        conn.commit()
+        rows_affected = cur.rowcount
+        cur.close()
     
-    # 提交更改并检查影响的行数
-    conn.commit()
-    rows_affected = cur.rowcount
-    cur.close()
-    conn.close()
+    # 缓存的用户对象中包含角色，修改后立即失效
+    user_cache.invalidate_where(lambda username, user: user.id == user_id)
     
     # 如果影响的行数大于0，说明更新成功
     return rows_affected > 0
\ No newline at end of file
@@ -1,13 +1,85 @@
 import sqlite3
+import threading
+from contextlib import contextmanager
 import psycopg2
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
-from app.config import DATABASE_URL
+from app.config import (
+    DATABASE_URL,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_HEALTH_CHECK_INTERVAL,
+)
+from app.database.pool import SQLiteConnectionPool, PostgresConnectionPool
+
+class PgConnection(psycopg2.extensions.connection):
+    # 与 sqlite3 连接保持一致：CRUD 层通过 conn.row_factory 判断数据库类型
+    row_factory = None
 
 def get_db_connection():
+    """
+    创建一条新的数据库连接（不经过连接池）
+    仅供连接池和初始化脚本使用，业务代码请使用 get_connection()
+    """
     if DATABASE_URL.startswith("sqlite"):
         conn = sqlite3.connect(DATABASE_URL.replace("sqlite:///", ""), check_same_thread=False)
         conn.row_factory = sqlite3.Row
         return conn
     else:
-        conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-        return conn
\ No newline at end of file
+        conn = psycopg2.connect(DATABASE_URL, connection_factory=PgConnection, cursor_factory=RealDictCursor)
+        return conn
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """获取全局连接池（首次调用时创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if DATABASE_URL.startswith("sqlite"):
+                    _pool = SQLiteConnectionPool(
+                        get_db_connection,
+                        max_lifetime=DB_POOL_MAX_LIFETIME,
+                        health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+                    )
+                else:
+                    _pool = PostgresConnectionPool(
+                        get_db_connection,
+                        min_size=DB_POOL_MIN_SIZE,
+                        max_size=DB_POOL_MAX_SIZE,
+                        timeout=DB_POOL_TIMEOUT,
+                        max_lifetime=DB_POOL_MAX_LIFETIME,
+                        health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+                    )
+                    _pool.fill()
+    return _pool
+
+@contextmanager
+def get_connection():
+    """
+    从连接池借出一条连接，退出 with 块时自动归还
+    发生异常时回滚；正常退出时未提交的事务同样会被回滚，写操作请显式 commit()
+
+    用法:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            ...
+    """
+    with get_pool().connection() as conn:
+        yield conn
+
+def get_pool_stats() -> dict:
+    """连接池统计信息"""
+    return get_pool().metrics.snapshot()
+
+def close_pool():
+    """关闭连接池中的所有连接（应用退出时调用）"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
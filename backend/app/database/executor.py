@@ -0,0 +1,101 @@
+"""
+数据库访问线程池
+路由都是 async def，直接调用同步的 CRUD 函数会阻塞 uvicorn 事件循环，
+一条慢查询就会让所有请求排队。run_db() 把单次 CRUD 调用放到专用的有界线程池执行，
+事件循环只负责等待结果，并发度由线程池大小（和连接池大小）决定。
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterable, List, TypeVar
+from app.config import DB_EXECUTOR_WORKERS, DB_STREAM_WORKERS
+
+T = TypeVar("T")
+
+_executor = None
+_executor_lock = threading.Lock()
+_stream_executors: List[ThreadPoolExecutor] = []
+_stream_active: List[int] = []  # 每个流式读取线程上正在执行的迭代器数
+_DONE = object()
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """获取数据库线程池（首次调用时创建）"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+    return _executor
+
+async def run_db(func, *args, **kwargs):
+    """
+    在数据库线程池中执行同步函数并等待结果
+
+    用法:
+        items = await run_db(get_all_items_from_db, user_id, project_id, table_id)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(func, *args, **kwargs))
+
+def _acquire_stream_executor() -> int:
+    """
+    分配一个流式读取用的单线程执行器，优先选择空闲的（线程长期存在，SQLite 的线程连接可以复用）
+    全部繁忙时选择迭代器最少的，与其共用线程；返回执行器下标，用完后调用 _release_stream_executor
+    """
+    with _executor_lock:
+        if not _stream_executors:
+            workers = max(1, DB_STREAM_WORKERS)
+            _stream_executors.extend(
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"db-stream-{i}") for i in range(workers)
+            )
+            _stream_active.extend([0] * workers)
+        index = min(range(len(_stream_active)), key=_stream_active.__getitem__)
+        _stream_active[index] += 1
+        return index
+
+def _release_stream_executor(index: int):
+    with _executor_lock:
+        if index < len(_stream_active):
+            _stream_active[index] -= 1
+
+async def iterate_in_db_thread(iterable: Iterable[T]) -> AsyncIterator[T]:
+    """
+    在同一个线程中逐步执行同步迭代器，结果异步产出（用于 StreamingResponse）
+
+    iter_items_from_db 这类生成器在整个迭代期间持有连接和游标，每一步都必须在同一线程执行
+    （SQLite 连接按线程分配）；starlette 的 iterate_in_threadpool 每一步可能落在不同线程。
+    迭代结束或客户端断开时，生成器也在该线程中关闭并归还连接。
+
+    用法:
+        return StreamingResponse(iterate_in_db_thread(chunks), media_type=...)
+    """
+    index = _acquire_stream_executor()
+    executor = _stream_executors[index]
+    loop = asyncio.get_running_loop()
+    iterator = iter(iterable)
+    try:
+        while True:
+            item = await loop.run_in_executor(executor, next, iterator, _DONE)
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            # 直接提交而不等待：请求被取消时也保证执行（排在未完成的一步之后）
+            executor.submit(close)
+        _release_stream_executor(index)
+
+def shutdown_db_executor():
+    """关闭线程池（应用退出时调用）"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+        for executor in _stream_executors:
+            executor.shutdown(wait=True)
+        _stream_executors.clear()
+        _stream_active.clear()
@@ -5,6 +5,7 @@ import sys
 import os
 from app.config import DATABASE_URL
 from app.auth.security import get_password_hash
+from app.database.migrations import run_migrations
 
 def init_db():
     if DATABASE_URL.startswith("sqlite"):
@@ -246,5 +247,8 @@ def init_db():
         
         print("PostgreSQL数据库初始化完成！")
 
+    # 执行版本化迁移：补齐缺失的列和索引，已有数据库同样适用
+    run_migrations()
+
 if __name__ == "__main__":
     init_db()
\ No newline at end of file
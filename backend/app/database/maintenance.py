@@ -0,0 +1,138 @@
+"""
+数据库维护
+旧版本删除项目时只删除 projects 中的一行，项目的表格和数据项被遗留在库中。
+reclaim_orphans() 分批清理这些孤立数据，purge_tombstones() 清理过期的删除记录（增量同步用），
+recount_items() 重新统计表格和项目的数据项数，vacuum() 回收删除后的磁盘空间：
+
+    python -m app.database.maintenance            # 清理孤立的表格和数据项、过期的删除记录
+    python -m app.database.maintenance --recount  # 同时修正表格和项目的数据项数
+    python -m app.database.maintenance --vacuum   # 清理后回收磁盘空间（SQLite 会锁库，请在低峰期执行）
+"""
+
+import sys
+from datetime import datetime, timedelta
+from typing import Dict
+from app.config import DATABASE_URL, DELETE_BATCH_SIZE, SYNC_TOMBSTONE_RETENTION_DAYS
+from app.database.connection import get_connection, get_db_connection
+from app.database.migrations import RECOUNT_PROJECTS_SQL, RECOUNT_TABLES_SQL
+from app.crud.items import delete_items_where
+
+# 所属项目或表格已不存在的数据项
+ORPHAN_ITEMS_WHERE = """(
+    (project_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM projects p WHERE p.id = items.project_id))
+    OR (table_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM tables t WHERE t.id = items.table_id))
+    OR table_id IN (SELECT t.id FROM tables t WHERE NOT EXISTS (SELECT 1 FROM projects p WHERE p.id = t.project_id))
+)"""
+
+# 所属项目已不存在的表格
+ORPHAN_TABLES_WHERE = "NOT EXISTS (SELECT 1 FROM projects p WHERE p.id = tables.project_id)"
+
+
+def reclaim_orphans(batch_size: int = DELETE_BATCH_SIZE) -> Dict[str, int]:
+    """
+    删除孤立的数据项和表格，可以在线执行
+    先分批删除数据项（PostgreSQL 外键要求），再删除表格
+
+    Returns:
+        {"items": 删除的数据项数, "tables": 删除的表格数}
+    """
+    items = delete_items_where(ORPHAN_ITEMS_WHERE, [], batch_size)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(f"DELETE FROM tables WHERE {ORPHAN_TABLES_WHERE}")
+            tables = cur.rowcount
+            cur.execute("DELETE FROM table_profiles WHERE NOT EXISTS (SELECT 1 FROM tables t WHERE t.id = table_profiles.table_id)")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    return {"items": items, "tables": tables}
+
+def purge_tombstones(retention_days: int = SYNC_TOMBSTONE_RETENTION_DAYS) -> int:
+    """
+    删除早于保留期的墓碑，并记录已清理到的序号
+    游标早于该序号的客户端无法再得到完整的删除记录，增量同步接口会要求其全量同步
+
+    Returns:
+        删除的墓碑数
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+    with get_connection() as conn:
+        placeholder = "?" if conn.row_factory else "%s"
+        cur = conn.cursor()
+        try:
+            cur.execute(f"SELECT MAX(seq) AS seq FROM item_tombstones WHERE deleted_at < {placeholder}", (cutoff,))
+            purged_through = cur.fetchone()["seq"]
+            if purged_through is None:
+                conn.rollback()
+                return 0
+            cur.execute(f"DELETE FROM item_tombstones WHERE seq <= {placeholder}", (purged_through,))
+            purged = cur.rowcount
+            cur.execute(
+                f"UPDATE change_sequence SET purged_through = {placeholder} WHERE id = 1 AND purged_through < {placeholder}",
+                (purged_through, purged_through)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    return purged
+
+def recount_items() -> Dict[str, int]:
+    """
+    按 items 重新统计表格和项目的 items_count
+    计数平时由触发器维护（迁移 10），只在直接修改过数据库等情况下需要修正；只更新不一致的行
+
+    Returns:
+        {"tables": 修正的表格数, "projects": 修正的项目数}
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(RECOUNT_TABLES_SQL)
+            tables = cur.rowcount
+            cur.execute(RECOUNT_PROJECTS_SQL)
+            projects = cur.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    return {"tables": tables, "projects": projects}
+
+def vacuum():
+    """
+    回收已删除行占用的空间
+    SQLite 的 VACUUM 会重建整个数据库文件并锁库；PostgreSQL 执行 VACUUM ANALYZE（不锁表）
+    """
+    conn = get_db_connection()
+    try:
+        if DATABASE_URL.startswith("sqlite"):
+            conn.execute("VACUUM")
+        else:
+            # VACUUM 不能在事务中执行
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute("VACUUM ANALYZE items")
+            cur.execute("VACUUM ANALYZE tables")
+            cur.close()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    result = reclaim_orphans()
+    print(f"[MAINTENANCE] 已删除孤立数据项 {result['items']} 个，孤立表格 {result['tables']} 个")
+    print(f"[MAINTENANCE] 已清理过期删除记录 {purge_tombstones()} 条")
+    if "--recount" in sys.argv:
+        result = recount_items()
+        print(f"[MAINTENANCE] 已修正表格数据项数 {result['tables']} 个，项目数据项数 {result['projects']} 个")
+    if "--vacuum" in sys.argv:
+        vacuum()
+        print("[MAINTENANCE] 磁盘空间回收完成")
@@ -0,0 +1,632 @@
+"""
+数据库迁移
+schema_version 表记录已执行的迁移版本，MIGRATIONS 按版本号顺序执行。
+每个迁移分别提供 SQLite 和 PostgreSQL 的实现，且都写成可重复执行的形式
+（IF NOT EXISTS / 先检查列是否存在），因此可以直接对已有数据库在线执行：
+
+    python -m app.database.migrations            # 执行所有未执行的迁移
+    python -m app.database.migrations --status   # 查看迁移状态
+"""
+
+import json
+import sys
+from typing import Callable, List, Optional
+from app.config import DATABASE_URL
+from app.database.connection import get_db_connection
+from app.models.schemas import normalize_legacy_schema
+
+
+class Migration:
+    """
+    单个迁移
+
+    Args:
+        version: 版本号（递增，不可复用）
+        name: 迁移名称
+        sqlite: SQLite 实现，参数为游标
+        postgres: PostgreSQL 实现，参数为游标
+        transactional: 是否在事务中执行。PostgreSQL 的 CREATE INDEX CONCURRENTLY
+            不能在事务中执行，这类迁移设为 False，以自动提交模式运行
+    """
+
+    def __init__(self, version: int, name: str, sqlite: Callable, postgres: Callable, transactional: bool = True):
+        self.version = version
+        self.name = name
+        self.sqlite = sqlite
+        self.postgres = postgres
+        self.transactional = transactional
+
+
+# ========== 工具函数 ==========
+
+def sqlite_columns(cur, table: str) -> List[str]:
+    """获取 SQLite 表的列名"""
+    cur.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cur.fetchall()]
+
+def pg_create_index_concurrently(cur, name: str, definition: str):
+    """
+    以 CONCURRENTLY 方式创建索引（需在自动提交模式下执行）
+    CONCURRENTLY 建索引失败或被中断时会留下 INVALID 状态的索引，IF NOT EXISTS 会跳过它，
+    因此先删除同名的无效索引再创建
+    """
+    cur.execute(
+        "SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(%s) AND NOT indisvalid",
+        (name,)
+    )
+    if cur.fetchone():
+        print(f"[MIGRATION] 删除无效索引 {name} 后重建")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+
+def sqlite_add_column(cur, table: str, column: str, ddl: str) -> bool:
+    """SQLite 不支持 ADD COLUMN IF NOT EXISTS，先检查列是否存在"""
+    if column in sqlite_columns(cur, table):
+        return False
+    cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    return True
+
+
+# ========== 迁移定义 ==========
+
+def _v1_sqlite(cur):
+    # items.table_id：CRUD 层早已按 table_id 读写，但建表语句中缺少该列
+    sqlite_add_column(cur, "items", "table_id", "INTEGER REFERENCES tables (id)")
+    # tables.updated_at：SQLite 的 ADD COLUMN 不允许非常量默认值，用 created_at 回填
+    if sqlite_add_column(cur, "tables", "updated_at", "TIMESTAMP"):
+        cur.execute("UPDATE tables SET updated_at = created_at")
+
+def _v1_postgres(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS tables (
+            id SERIAL PRIMARY KEY,
+            project_id INTEGER NOT NULL REFERENCES projects(id),
+            name TEXT NOT NULL,
+            schema JSONB,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("ALTER TABLE tables ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+    cur.execute("ALTER TABLE items ADD COLUMN IF NOT EXISTS table_id INTEGER REFERENCES tables(id)")
+
+def _v2_sqlite(cur):
+    # 列表查询：WHERE user_id = ? AND project_id = ? AND table_id = ?
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_items_user_project_table ON items (user_id, project_id, table_id)")
+    # 系统项目（project_id=0）查询不过滤 user_id
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_items_project_table ON items (project_id, table_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tables_project ON tables (project_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_projects_user ON projects (user_id)")
+
+def _v2_postgres(cur):
+    # CONCURRENTLY 建索引不阻塞写入，适合在线执行
+    pg_create_index_concurrently(cur, "idx_items_user_project_table", "items (user_id, project_id, table_id)")
+    pg_create_index_concurrently(cur, "idx_items_project_table", "items (project_id, table_id)")
+    pg_create_index_concurrently(cur, "idx_tables_project", "tables (project_id)")
+    pg_create_index_concurrently(cur, "idx_projects_user", "projects (user_id)")
+
+def _v3_sqlite(cur):
+    # 游标分页按 (updated_at, id) 排序，把排序键加入复合索引，替换 v2 的索引
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_items_scope_page ON items (user_id, project_id, table_id, updated_at, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_items_project_table_page ON items (project_id, table_id, updated_at, id)")
+    cur.execute("DROP INDEX IF EXISTS idx_items_user_project_table")
+    cur.execute("DROP INDEX IF EXISTS idx_items_project_table")
+
+def _v3_postgres(cur):
+    pg_create_index_concurrently(cur, "idx_items_scope_page", "items (user_id, project_id, table_id, updated_at, id)")
+    pg_create_index_concurrently(cur, "idx_items_project_table_page", "items (project_id, table_id, updated_at, id)")
+    cur.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_items_user_project_table")
+    cur.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_items_project_table")
+
+def _v4_sqlite(cur):
+    # SQLite 内置 json_patch()（RFC 7396），无需额外处理
+    pass
+
+def _v4_postgres(cur):
+    # jsonb || 只做顶层合并且不会删除 null 字段，这里实现与 SQLite json_patch() 一致的 RFC 7396 合并
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION jsonb_merge_patch(target JSONB, patch JSONB) RETURNS JSONB AS $$
+        DECLARE
+            result JSONB;
+            k TEXT;
+            v JSONB;
+        BEGIN
+            IF patch IS NULL OR jsonb_typeof(patch) <> 'object' THEN
+                RETURN patch;
+            END IF;
+            IF target IS NULL OR jsonb_typeof(target) <> 'object' THEN
+                result := '{}'::JSONB;
+            ELSE
+                result := target;
+            END IF;
+            FOR k, v IN SELECT * FROM jsonb_each(patch) LOOP
+                IF jsonb_typeof(v) = 'null' THEN
+                    result := result - k;
+                ELSE
+                    result := jsonb_set(result, ARRAY[k], jsonb_merge_patch(result -> k, v));
+                END IF;
+            END LOOP;
+            RETURN result;
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE
+    """)
+
+def _v5_sqlite(cur):
+    # 表格版本号：数据项每次写入时递增，用于条件 GET（ETag）
+    sqlite_add_column(cur, "tables", "version", "INTEGER NOT NULL DEFAULT 0")
+
+def _v5_postgres(cur):
+    cur.execute("ALTER TABLE tables ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0")
+
+def _v6_sqlite(cur):
+    # 增量同步：items.seq 为最后一次写入的变更序号，删除的数据项记录在 item_tombstones
+    sqlite_add_column(cur, "items", "seq", "INTEGER NOT NULL DEFAULT 0")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS item_tombstones (
+            item_id TEXT PRIMARY KEY,
+            project_id INTEGER,
+            table_id INTEGER,
+            user_id INTEGER,
+            seq INTEGER NOT NULL,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS change_sequence (
+            id INTEGER PRIMARY KEY,
+            value INTEGER NOT NULL,
+            purged_through INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("INSERT OR IGNORE INTO change_sequence (id, value) VALUES (1, 0)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_items_table_seq ON items (table_id, seq, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_items_project_seq ON items (project_id, seq, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_seq ON item_tombstones (seq)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_table_seq ON item_tombstones (table_id, seq, item_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_project_seq ON item_tombstones (project_id, seq, item_id)")
+
+def _v6_postgres(cur):
+    # PostgreSQL 11+ 添加带常量默认值的列不重写表
+    cur.execute("ALTER TABLE items ADD COLUMN IF NOT EXISTS seq BIGINT NOT NULL DEFAULT 0")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS item_tombstones (
+            item_id VARCHAR(255) PRIMARY KEY,
+            project_id INTEGER,
+            table_id INTEGER,
+            user_id INTEGER,
+            seq BIGINT NOT NULL,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS change_sequence (
+            id INTEGER PRIMARY KEY,
+            value BIGINT NOT NULL,
+            purged_through BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("INSERT INTO change_sequence (id, value) VALUES (1, 0) ON CONFLICT (id) DO NOTHING")
+    pg_create_index_concurrently(cur, "idx_items_table_seq", "items (table_id, seq, id)")
+    pg_create_index_concurrently(cur, "idx_items_project_seq", "items (project_id, seq, id)")
+    pg_create_index_concurrently(cur, "idx_tombstones_seq", "item_tombstones (seq)")
+    pg_create_index_concurrently(cur, "idx_tombstones_table_seq", "item_tombstones (table_id, seq, item_id)")
+    pg_create_index_concurrently(cur, "idx_tombstones_project_seq", "item_tombstones (project_id, seq, item_id)")
+
+# items.data 中所有字符串值，空格连接（SQLite 全文索引的内容）
+_SQLITE_ITEM_TEXT = "(SELECT group_concat(value, ' ') FROM json_tree({data}) WHERE type = 'text')"
+
+def _v7_sqlite(cur):
+    # 全文检索：FTS5 表的 rowid 对应 items.rowid，由触发器同步，所有写入路径都无需额外处理
+    cur.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+            content, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+    """)
+    # INSERT OR REPLACE 删除旧行时不会触发 DELETE 触发器，插入前先删除同 id 旧行的索引
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS items_fts_before_insert BEFORE INSERT ON items BEGIN
+            DELETE FROM items_fts WHERE rowid = (SELECT rowid FROM items WHERE id = NEW.id);
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS items_fts_after_insert AFTER INSERT ON items BEGIN
+            INSERT INTO items_fts (rowid, content) VALUES (NEW.rowid, {_SQLITE_ITEM_TEXT.format(data="NEW.data")});
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS items_fts_after_update AFTER UPDATE OF data ON items BEGIN
+            DELETE FROM items_fts WHERE rowid = OLD.rowid;
+            INSERT INTO items_fts (rowid, content) VALUES (NEW.rowid, {_SQLITE_ITEM_TEXT.format(data="NEW.data")});
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS items_fts_after_delete AFTER DELETE ON items BEGIN
+            DELETE FROM items_fts WHERE rowid = OLD.rowid;
+        END
+    """)
+    # 为已有数据建立索引
+    cur.execute("DELETE FROM items_fts")
+    cur.execute(f"INSERT INTO items_fts (rowid, content) SELECT rowid, {_SQLITE_ITEM_TEXT.format(data='data')} FROM items")
+
+def _v7_postgres(cur):
+    # 表达式索引，与 app.crud.search.PG_SEARCH_VECTOR 一致；写入时由 PostgreSQL 自动维护
+    pg_create_index_concurrently(
+        cur, "idx_items_fts", """items USING GIN (jsonb_to_tsvector('simple', data, '["string"]'))"""
+    )
+
+
+def _v8_sqlite(cur):
+    # 后台导入任务：rows_done 与数据块在同一事务中更新，中断的任务从最后提交的块之后继续
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            project_id INTEGER,
+            table_id INTEGER,
+            file_path TEXT NOT NULL,
+            file_name TEXT,
+            file_format TEXT NOT NULL,
+            total_bytes INTEGER,
+            status TEXT NOT NULL DEFAULT 'pending',
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            bytes_done INTEGER NOT NULL DEFAULT 0,
+            rows_per_second REAL,
+            eta_seconds REAL,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            heartbeat_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_user ON ingest_jobs (user_id, created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status)")
+
+def _v8_postgres(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            id VARCHAR(64) PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            project_id INTEGER,
+            table_id INTEGER,
+            file_path TEXT NOT NULL,
+            file_name TEXT,
+            file_format VARCHAR(16) NOT NULL,
+            total_bytes BIGINT,
+            status VARCHAR(16) NOT NULL DEFAULT 'pending',
+            rows_done BIGINT NOT NULL DEFAULT 0,
+            bytes_done BIGINT NOT NULL DEFAULT 0,
+            rows_per_second DOUBLE PRECISION,
+            eta_seconds DOUBLE PRECISION,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            heartbeat_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_user ON ingest_jobs (user_id, created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status)")
+
+def _v9_sqlite(cur):
+    # 表格的列统计，按表格版本号缓存（单独建表，避免 SELECT * FROM tables 读出大字段）
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS table_profiles (
+            table_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL,
+            profile TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def _v9_postgres(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS table_profiles (
+            table_id INTEGER PRIMARY KEY REFERENCES tables(id) ON DELETE CASCADE,
+            version INTEGER NOT NULL,
+            profile JSONB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+# 按表格、项目重新统计数据项数（迁移 10 的初始化，以及 app.database.maintenance.recount_items）
+RECOUNT_TABLES_SQL = """
+    UPDATE tables SET items_count = (SELECT COUNT(*) FROM items WHERE items.table_id = tables.id)
+    WHERE items_count <> (SELECT COUNT(*) FROM items WHERE items.table_id = tables.id)
+"""
+RECOUNT_PROJECTS_SQL = """
+    UPDATE projects SET items_count = (SELECT COUNT(*) FROM items WHERE items.project_id = projects.id)
+    WHERE items_count IS NULL OR items_count <> (SELECT COUNT(*) FROM items WHERE items.project_id = projects.id)
+"""
+
+def _v10_sqlite(cur):
+    # 表格和项目的数据项数由触发器在写入数据项的同一事务中维护，列表页不需要 COUNT(*)
+    sqlite_add_column(cur, "tables", "items_count", "INTEGER NOT NULL DEFAULT 0")
+    # INSERT OR REPLACE 删除旧行时不会触发 DELETE 触发器，插入前先减去同 id 旧行的计数
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS items_count_before_insert BEFORE INSERT ON items BEGIN
+            UPDATE tables SET items_count = items_count - 1
+            WHERE id = (SELECT table_id FROM items WHERE id = NEW.id);
+            UPDATE projects SET items_count = items_count - 1
+            WHERE id = (SELECT project_id FROM items WHERE id = NEW.id);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS items_count_after_insert AFTER INSERT ON items BEGIN
+            UPDATE tables SET items_count = items_count + 1 WHERE id = NEW.table_id;
+            UPDATE projects SET items_count = items_count + 1 WHERE id = NEW.project_id;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS items_count_after_update AFTER UPDATE OF table_id, project_id ON items
+        WHEN OLD.table_id IS NOT NEW.table_id OR OLD.project_id IS NOT NEW.project_id BEGIN
+            UPDATE tables SET items_count = items_count - 1 WHERE id = OLD.table_id;
+            UPDATE tables SET items_count = items_count + 1 WHERE id = NEW.table_id;
+            UPDATE projects SET items_count = items_count - 1 WHERE id = OLD.project_id;
+            UPDATE projects SET items_count = items_count + 1 WHERE id = NEW.project_id;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS items_count_after_delete AFTER DELETE ON items BEGIN
+            UPDATE tables SET items_count = items_count - 1 WHERE id = OLD.table_id;
+            UPDATE projects SET items_count = items_count - 1 WHERE id = OLD.project_id;
+        END
+    """)
+    cur.execute(RECOUNT_TABLES_SQL)
+    cur.execute(RECOUNT_PROJECTS_SQL)
+
+# PostgreSQL：按 (计数表, items 中的外键列) 更新计数，delta 为子查询，返回 (id, n)
+_PG_COUNTERS = (("tables", "table_id"), ("projects", "project_id"))
+
+def _pg_apply_counts(delta: str) -> str:
+    statements = []
+    for table, column in _PG_COUNTERS:
+        statements.append(f"""
+            UPDATE {table} c SET items_count = COALESCE(c.items_count, 0) + d.n
+            FROM ({delta.format(column=column)}) d
+            WHERE c.id = d.id AND d.n <> 0;""")
+    return "".join(statements)
+
+def _v10_postgres(cur):
+    cur.execute("ALTER TABLE tables ADD COLUMN IF NOT EXISTS items_count INTEGER NOT NULL DEFAULT 0")
+    # 语句级触发器 + 转换表：COPY 合并等批量写入每条语句只按表格/项目分组更新一次计数。
+    # INSERT ... ON CONFLICT DO UPDATE 中被更新的已有行只出现在 UPDATE 触发器的转换表中，不会重复计数
+    moved = "FROM old_items o JOIN new_items nw ON nw.id = o.id WHERE o.{column} IS DISTINCT FROM nw.{column}"
+    bodies = {
+        "insert": _pg_apply_counts("SELECT {column} AS id, COUNT(*) AS n FROM new_items GROUP BY {column}"),
+        "delete": _pg_apply_counts("SELECT {column} AS id, -COUNT(*) AS n FROM old_items GROUP BY {column}"),
+        # 绝大多数更新不改变所属表格和项目，子查询为空，不更新任何计数
+        "update": _pg_apply_counts(
+            "SELECT id, SUM(n) AS n FROM ("
+            f"SELECT o.{{column}} AS id, -1 AS n {moved} "
+            f"UNION ALL SELECT nw.{{column}}, 1 {moved}"
+            ") m GROUP BY id"
+        ),
+    }
+    transition_tables = {
+        "insert": "NEW TABLE AS new_items",
+        "delete": "OLD TABLE AS old_items",
+        "update": "OLD TABLE AS old_items NEW TABLE AS new_items",
+    }
+    for event, body in bodies.items():
+        cur.execute(f"""
+            CREATE OR REPLACE FUNCTION items_count_after_{event}() RETURNS TRIGGER AS $$
+            BEGIN{body}
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        cur.execute(f"DROP TRIGGER IF EXISTS items_count_{event} ON items")
+        cur.execute(f"""
+            CREATE TRIGGER items_count_{event} AFTER {event.upper()} ON items
+            REFERENCING {transition_tables[event]}
+            FOR EACH STATEMENT EXECUTE FUNCTION items_count_after_{event}()
+        """)
+    cur.execute(RECOUNT_TABLES_SQL)
+    cur.execute(RECOUNT_PROJECTS_SQL)
+
+def _normalize_schemas(cur, sqlite: bool):
+    # 旧版 schema（columns）一次性改写为当前格式（fields），读取表格时不再逐行转换
+    for table in ("tables", "projects"):
+        if sqlite:
+            cur.execute(f"SELECT id, schema FROM {table} WHERE schema LIKE '%\"columns\"%'")
+        else:
+            cur.execute(f"SELECT id, schema FROM {table} WHERE schema::text LIKE '%%\"columns\"%%'", ())
+        for row in cur.fetchall():
+            schema = row["schema"]
+            if isinstance(schema, str):
+                try:
+                    schema = json.loads(schema)
+                except ValueError:
+                    continue
+            normalized = normalize_legacy_schema(schema)
+            if normalized is schema:
+                continue
+            if sqlite:
+                cur.execute(f"UPDATE {table} SET schema = ? WHERE id = ?", (json.dumps(normalized), row["id"]))
+            else:
+                cur.execute(f"UPDATE {table} SET schema = %s::jsonb WHERE id = %s", (json.dumps(normalized), row["id"]))
+
+def _v11_sqlite(cur):
+    _normalize_schemas(cur, True)
+
+def _v11_postgres(cur):
+    _normalize_schemas(cur, False)
+
+def _v12_sqlite(cur):
+    # 含中日韩文字的检索词在 items_fts 保存的文本上做子串匹配（见 app.crud.search），无需额外处理
+    pass
+
+def _v12_postgres(cur):
+    # 含中日韩文字的检索词用 ILIKE 做子串匹配，pg_trgm 索引让它不必逐行比较；
+    # 没有创建扩展的权限时跳过索引，检索仍然可用
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except Exception as e:
+        print(f"[MIGRATION] 无法启用 pg_trgm（{e}），跳过中日韩文字检索的索引")
+        return
+    # 表达式与 app.crud.search.PG_SEARCH_TEXT 一致
+    pg_create_index_concurrently(
+        cur, "idx_items_search_trgm",
+        """items USING GIN ((jsonb_path_query_array(data, 'strict $.** ? (@.type() == "string")')::text) gin_trgm_ops)"""
+    )
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "add_items_table_id_and_tables_updated_at", _v1_sqlite, _v1_postgres),
+    Migration(2, "add_items_and_tables_indexes", _v2_sqlite, _v2_postgres, transactional=False),
+    Migration(3, "add_items_keyset_pagination_indexes", _v3_sqlite, _v3_postgres, transactional=False),
+    Migration(4, "add_jsonb_merge_patch_function", _v4_sqlite, _v4_postgres),
+    Migration(5, "add_tables_version", _v5_sqlite, _v5_postgres),
+    Migration(6, "add_items_change_feed", _v6_sqlite, _v6_postgres, transactional=False),
+    Migration(7, "add_items_full_text_search", _v7_sqlite, _v7_postgres, transactional=False),
+    Migration(8, "add_ingest_jobs", _v8_sqlite, _v8_postgres),
+    Migration(9, "add_table_profiles", _v9_sqlite, _v9_postgres),
+    Migration(10, "add_item_counters", _v10_sqlite, _v10_postgres),
+    Migration(11, "normalize_legacy_schemas", _v11_sqlite, _v11_postgres),
+    Migration(12, "add_items_substring_search_index", _v12_sqlite, _v12_postgres, transactional=False),
+]
+
+
+# ========== 执行引擎 ==========
+
+# 串行执行迁移的 PostgreSQL 会话级 advisory lock 的键（任意固定值）
+_PG_MIGRATION_LOCK_KEY = 4_871_203_556
+
+def _is_sqlite() -> bool:
+    return DATABASE_URL.startswith("sqlite")
+
+def _lock_migrations(conn):
+    """
+    PostgreSQL：获取迁移锁，多个进程同时启动时串行执行迁移，锁在连接关闭时释放
+    （SQLite 由 _apply 中的 BEGIN IMMEDIATE 串行化）。
+    自动提交模式下执行的迁移不在事务中，只靠 _apply 中的版本检查无法避免重复执行和
+    schema_version 插入冲突
+    """
+    if _is_sqlite():
+        return
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_lock(%s)", (_PG_MIGRATION_LOCK_KEY,))
+    cur.close()
+    conn.commit()
+
+def _ensure_version_table(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+    cur.close()
+
+def get_applied_versions(conn) -> List[int]:
+    """已执行的迁移版本号"""
+    cur = conn.cursor()
+    cur.execute("SELECT version FROM schema_version ORDER BY version")
+    versions = [row["version"] if isinstance(row, dict) else row[0] for row in cur.fetchall()]
+    cur.close()
+    # 结束只读查询开启的事务（PostgreSQL 切换自动提交模式前必须处于空闲状态）
+    conn.rollback()
+    return versions
+
+def get_current_version(conn) -> int:
+    versions = get_applied_versions(conn)
+    return versions[-1] if versions else 0
+
+def _apply(conn, migration: Migration) -> bool:
+    """执行单个迁移，返回是否实际执行（并发启动时其他进程可能已经执行过）"""
+    sqlite = _is_sqlite()
+    placeholder = "?" if sqlite else "%s"
+    cur = conn.cursor()
+
+    if sqlite:
+        # BEGIN IMMEDIATE 获取写锁，多个进程同时启动时串行执行迁移
+        cur.execute("BEGIN IMMEDIATE")
+    elif not migration.transactional:
+        conn.autocommit = True
+
+    try:
+        cur.execute(f"SELECT 1 FROM schema_version WHERE version = {placeholder}", (migration.version,))
+        if cur.fetchone():
+            if sqlite or migration.transactional:
+                conn.rollback()
+            return False
+
+        if sqlite:
+            migration.sqlite(cur)
+        else:
+            migration.postgres(cur)
+
+        cur.execute(
+            f"INSERT INTO schema_version (version, name) VALUES ({placeholder}, {placeholder})",
+            (migration.version, migration.name)
+        )
+        if sqlite or migration.transactional:
+            conn.commit()
+        return True
+    except Exception:
+        if sqlite or migration.transactional:
+            conn.rollback()
+        raise
+    finally:
+        if not sqlite and not migration.transactional:
+            conn.autocommit = False
+        cur.close()
+
+def run_migrations(target: Optional[int] = None) -> List[int]:
+    """
+    按顺序执行所有未执行的迁移
+
+    Args:
+        target: 只迁移到该版本（默认最新）
+
+    Returns:
+        本次执行的迁移版本号列表
+    """
+    conn = get_db_connection()
+    applied_now = []
+    try:
+        _lock_migrations(conn)
+        _ensure_version_table(conn)
+        # 获取锁之后再读取已执行的版本，等待期间其他进程执行的迁移会被跳过
+        applied = set(get_applied_versions(conn))
+        for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+            if target is not None and migration.version > target:
+                break
+            if migration.version in applied:
+                continue
+            print(f"[MIGRATION] 执行迁移 {migration.version}: {migration.name}")
+            if _apply(conn, migration):
+                applied_now.append(migration.version)
+        if applied_now:
+            print(f"[MIGRATION] 数据库已迁移到版本 {get_current_version(conn)}")
+    finally:
+        conn.close()
+    return applied_now
+
+def migration_status() -> List[dict]:
+    """所有迁移及其执行状态"""
+    conn = get_db_connection()
+    try:
+        _ensure_version_table(conn)
+        applied = set(get_applied_versions(conn))
+    finally:
+        conn.close()
+    return [
+        {"version": m.version, "name": m.name, "applied": m.version in applied}
+        for m in sorted(MIGRATIONS, key=lambda m: m.version)
+    ]
+
+
+if __name__ == "__main__":
+    if "--status" in sys.argv:
+        for status in migration_status():
+            mark = "x" if status["applied"] else " "
+            print(f"[{mark}] {status['version']:>4}  {status['name']}")
+    else:
+        applied = run_migrations()
+        if not applied:
+            print("[MIGRATION] 数据库已是最新版本")
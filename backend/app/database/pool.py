@@ -0,0 +1,354 @@
+"""
+数据库连接池
+SQLite：每个线程复用一条长连接（线程本地存储），同一线程内嵌套借出时临时创建溢出连接
+PostgreSQL：有界连接池，连接耗尽时等待归还，超时抛出 PoolTimeoutError
+两种连接池都支持借出前健康检查、最大存活时间回收以及使用情况统计
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+
+class PoolTimeoutError(Exception):
+    """等待可用连接超时（连接池已饱和）"""
+    pass
+
+
+class PoolMetrics:
+    """
+    连接池统计信息，用于观察连接池饱和程度
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        self._lock = threading.Lock()
+        self.max_size = max_size
+        self.created = 0          # 新建连接数
+        self.closed = 0           # 关闭连接数（回收、健康检查失败、溢出连接）
+        self.recycled = 0         # 因超过最大存活时间被回收的连接数
+        self.unhealthy = 0        # 健康检查失败的连接数
+        self.checkouts = 0        # 借出次数
+        self.overflow = 0         # 临时溢出连接次数（仅 SQLite）
+        self.waits = 0            # 需要等待空闲连接的借出次数
+        self.timeouts = 0         # 等待超时次数
+        self.wait_time = 0.0      # 累计等待时间（秒）
+        self.in_use = 0           # 当前借出的连接数
+        self.peak_in_use = 0      # 借出连接数峰值
+
+    def incr(self, name: str, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def checked_out(self):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            if self.in_use > self.peak_in_use:
+                self.peak_in_use = self.in_use
+
+    def checked_in(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            data = {
+                "max_size": self.max_size,
+                "created": self.created,
+                "closed": self.closed,
+                "recycled": self.recycled,
+                "unhealthy": self.unhealthy,
+                "checkouts": self.checkouts,
+                "overflow": self.overflow,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.wait_time * 1000 / self.waits, 3) if self.waits else 0.0,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+            }
+        if self.max_size:
+            data["saturation"] = round(data["in_use"] / self.max_size, 3)
+        return data
+
+
+class _PoolEntry:
+    """连接及其元数据"""
+
+    __slots__ = ("conn", "created_at", "last_used", "in_use")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+        self.in_use = False
+
+    def expired(self, max_lifetime: float) -> bool:
+        return max_lifetime > 0 and time.monotonic() - self.created_at > max_lifetime
+
+    def needs_check(self, interval: float) -> bool:
+        return time.monotonic() - self.last_used > interval
+
+
+def _ping(conn) -> bool:
+    """执行一次最轻量的查询，判断连接是否可用"""
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        cur.close()
+        return True
+    except Exception:
+        return False
+
+
+def _safe_close(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+class SQLiteConnectionPool:
+    """
+    SQLite 连接池：每个线程一条可复用的连接
+    SQLite 是嵌入式数据库，没有连接数上限的问题，主要节省的是反复打开文件、
+    解析 schema 的开销。同一线程嵌套借出时（例如在一个连接未归还时调用另一个 CRUD 函数）
+    会临时创建溢出连接，归还时直接关闭。
+    """
+
+    def __init__(self, connect: Callable, max_lifetime: float = 0, health_check_interval: float = 30):
+        self._connect = connect
+        self._max_lifetime = max_lifetime
+        self._health_check_interval = health_check_interval
+        self._local = threading.local()
+        self._entries: List[_PoolEntry] = []
+        self._entries_lock = threading.Lock()
+        self.metrics = PoolMetrics()
+
+    def _new_entry(self) -> _PoolEntry:
+        entry = _PoolEntry(self._connect())
+        self.metrics.incr("created")
+        with self._entries_lock:
+            self._entries.append(entry)
+        return entry
+
+    def _discard(self, entry: _PoolEntry):
+        _safe_close(entry.conn)
+        self.metrics.incr("closed")
+        with self._entries_lock:
+            if entry in self._entries:
+                self._entries.remove(entry)
+
+    def _thread_entry(self) -> _PoolEntry:
+        entry = getattr(self._local, "entry", None)
+        if entry is not None:
+            if entry.expired(self._max_lifetime):
+                self.metrics.incr("recycled")
+                self._discard(entry)
+                entry = None
+            elif entry.needs_check(self._health_check_interval) and not _ping(entry.conn):
+                self.metrics.incr("unhealthy")
+                self._discard(entry)
+                entry = None
+        if entry is None:
+            entry = self._new_entry()
+            self._local.entry = entry
+        return entry
+
+    @contextmanager
+    def connection(self):
+        entry = getattr(self._local, "entry", None)
+        if entry is not None and entry.in_use:
+            # 同一线程内嵌套借出：使用临时连接，避免两个调用方共享同一个事务
+            self.metrics.incr("overflow")
+            conn = self._connect()
+            self.metrics.incr("created")
+            self.metrics.checked_out()
+            try:
+                yield conn
+            finally:
+                self.metrics.checked_in()
+                _safe_close(conn)
+                self.metrics.incr("closed")
+            return
+
+        entry = self._thread_entry()
+        entry.in_use = True
+        self.metrics.checked_out()
+        broken = False
+        try:
+            yield entry.conn
+        except Exception:
+            try:
+                entry.conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            if not broken:
+                try:
+                    # 调用方未提交的事务不能带给下一个借用者
+                    if entry.conn.in_transaction:
+                        entry.conn.rollback()
+                except Exception:
+                    broken = True
+            entry.in_use = False
+            entry.last_used = time.monotonic()
+            self.metrics.checked_in()
+            if broken:
+                self._discard(entry)
+                self._local.entry = None
+
+    def close_all(self):
+        with self._entries_lock:
+            entries, self._entries = self._entries, []
+        for entry in entries:
+            _safe_close(entry.conn)
+            self.metrics.incr("closed")
+
+
+class PostgresConnectionPool:
+    """
+    PostgreSQL 有界连接池
+    空闲连接按后进先出复用（保持热连接），总连接数不超过 max_size，
+    连接耗尽时借出方最多等待 timeout 秒。
+    """
+
+    def __init__(self, connect: Callable, min_size: int = 1, max_size: int = 10, timeout: float = 30,
+                 max_lifetime: float = 1800, health_check_interval: float = 30):
+        self._connect = connect
+        self._min_size = min(min_size, max_size)
+        self._max_size = max_size
+        self._timeout = timeout
+        self._max_lifetime = max_lifetime
+        self._health_check_interval = health_check_interval
+        self._idle: List[_PoolEntry] = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.metrics = PoolMetrics(max_size)
+
+    def _create_entry(self) -> _PoolEntry:
+        entry = _PoolEntry(self._connect())
+        self.metrics.incr("created")
+        return entry
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _discard(self, entry: _PoolEntry):
+        _safe_close(entry.conn)
+        self.metrics.incr("closed")
+        self._release_slot()
+
+    def fill(self):
+        """预先建立 min_size 条连接"""
+        while True:
+            with self._cond:
+                if self._size >= self._min_size:
+                    return
+                self._size += 1
+            try:
+                entry = self._create_entry()
+            except Exception:
+                self._release_slot()
+                raise
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def _acquire(self) -> _PoolEntry:
+        deadline = time.monotonic() + self._timeout
+        waited = False
+        start = time.monotonic()
+        while True:
+            entry = None
+            create = False
+            with self._cond:
+                while not self._idle and self._size >= self._max_size:
+                    if self._closed:
+                        raise PoolTimeoutError("连接池已关闭")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.metrics.incr("timeouts")
+                        raise PoolTimeoutError(f"等待数据库连接超时（{self._timeout}s），连接池已满（{self._max_size}）")
+                    waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+
+            if waited:
+                self.metrics.incr("waits")
+                self.metrics.incr("wait_time", time.monotonic() - start)
+                waited = False
+
+            if create:
+                try:
+                    return self._create_entry()
+                except Exception:
+                    self._release_slot()
+                    raise
+
+            # 复用空闲连接前检查：已关闭、超过最大存活时间、长时间空闲后健康检查失败
+            if entry.conn.closed:
+                self.metrics.incr("unhealthy")
+                self._discard(entry)
+            elif entry.expired(self._max_lifetime):
+                self.metrics.incr("recycled")
+                self._discard(entry)
+            elif entry.needs_check(self._health_check_interval) and not _ping(entry.conn):
+                self.metrics.incr("unhealthy")
+                self._discard(entry)
+            else:
+                if entry.needs_check(self._health_check_interval):
+                    # 健康检查的 SELECT 会开启事务，归还前结束它
+                    entry.conn.rollback()
+                return entry
+
+    def _release(self, entry: _PoolEntry, broken: bool = False):
+        if not broken and not entry.conn.closed:
+            try:
+                # 结束未提交的事务（包括只读查询隐式开启的事务）
+                if entry.conn.get_transaction_status() != 0:  # TRANSACTION_STATUS_IDLE
+                    entry.conn.rollback()
+            except Exception:
+                broken = True
+        if broken or entry.conn.closed or self._closed:
+            self._discard(entry)
+            return
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        entry = self._acquire()
+        self.metrics.checked_out()
+        broken = False
+        try:
+            yield entry.conn
+        except Exception:
+            try:
+                entry.conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.metrics.checked_in()
+            self._release(entry, broken)
+
+    def close_all(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for entry in idle:
+            self._discard(entry)
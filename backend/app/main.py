@@ -2,13 +2,23 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from app.database.init_db import init_db
-from app.api.routes import auth, items, projects
+from app.database.connection import close_pool
+from app.database.executor import shutdown_db_executor
+from app.auth.security import shutdown_hash_executor
+from app.config import RATE_LIMIT_ENABLED
+from app.api.rate_limit import RateLimitMiddleware
+from app.api.routes import auth, items, projects, system, ingest_jobs
+from app.services.ingest_worker import start_ingest_worker, stop_ingest_worker
 
 # 初始化数据库
 init_db()
 
 app = FastAPI(title="Eagle Ontology API", version="1.0.0")
 
+# 上传、地理编码、导出的限流（先添加的中间件在内层，429 响应同样带有 CORS 头部）
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
 # 添加CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -17,7 +27,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
     allow_origin_regex="https?://.*",
-    expose_headers=["Access-Control-Allow-Origin"]
+    expose_headers=["Access-Control-Allow-Origin", "X-Next-Cursor", "ETag", "Retry-After"]
 )
 
 # 添加一个专门的CORS处理中间件，确保所有响应都包含正确的头部
@@ -34,6 +44,21 @@ async def add_cors_headers(request, call_next):
 app.include_router(auth.router)
 app.include_router(items.router)
 app.include_router(projects.router)
+app.include_router(system.router)
+app.include_router(ingest_jobs.router)
+
+@app.on_event("startup")
+def start_background_workers():
+    # 继续上次退出时未完成的导入任务
+    start_ingest_worker()
+
+@app.on_event("shutdown")
+def shutdown_db_pool():
+    # 导入任务在当前数据块提交后停止；再等待线程池中正在执行的数据库调用完成，最后关闭连接池中的连接
+    stop_ingest_worker()
+    shutdown_db_executor()
+    shutdown_hash_executor()
+    close_pool()
 
 # 其他路由
 @app.get("/")
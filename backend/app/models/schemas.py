@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Any
+from typing import Dict, List, Optional, Any
 from datetime import datetime
 
 
@@ -59,6 +59,25 @@ class ProjectSchema(BaseModel):
     fields: List[FieldDefinition]
     view_settings: Optional[dict] = None
 
+def normalize_legacy_schema(schema: Any) -> Any:
+    """
+    旧版 schema（columns，字段只有 name）转换为当前格式（fields，字段有 key 和 label），其他值原样返回
+    写入时调用；已有数据由迁移 11 一次性改写，读取时不再需要转换
+    """
+    if not isinstance(schema, dict) or 'columns' not in schema or 'fields' in schema:
+        return schema
+    schema = dict(schema)
+    fields = []
+    for field in schema.pop('columns') or []:
+        if isinstance(field, dict):
+            field = dict(field)
+            if 'name' in field:
+                field.setdefault('key', field['name'])
+                field.setdefault('label', field['name'])
+        fields.append(field)
+    schema['fields'] = fields
+    return schema
+
 # 2. 表格模型（必须在 Project 之前定义）
 class TableBase(BaseModel):
     name: str
@@ -72,10 +91,46 @@ class Table(TableBase):
     id: int
     project_id: int
     created_at: datetime
+    updated_at: Optional[datetime] = None
+    version: int = 0  # 数据项每次写入时递增
+    items_count: int = 0  # 数据项数，写入时由数据库触发器维护
     
     class Config:
         orm_mode = True
 
+# 列统计（GET /api/projects/{project_id}/tables/{table_id}/profile）
+class ColumnProfile(BaseModel):
+    key: str
+    type: FieldType  # 推断的字段类型
+    role: Optional[str] = None  # 语义角色：latitude/longitude/geo_point/timestamp/image_url/relation/primary_label/...
+    null_ratio: float
+    distinct: int  # 不同值个数；distinct_exact 为 False 时为下限
+    distinct_exact: bool = True
+    min: Optional[Any] = None  # 数值或日期列的最小值
+    max: Optional[Any] = None
+    options: Optional[List[str]] = None  # select/multi_select 的选项
+    value_types: Dict[str, int] = {}  # 非空值的类型分布
+
+    class Config:
+        use_enum_values = True
+
+class TableProfile(BaseModel):
+    rows: int  # 数据项总数
+    sampled: int  # 参与统计的行数（蓄水池抽样）
+    version: Optional[int] = None  # 统计时的表格版本号
+    columns: List[ColumnProfile]
+
+# 聚合统计（GET /api/projects/{project_id}/tables/{table_id}/aggregate）
+class AggregateGroup(BaseModel):
+    key: Dict[str, Any]  # 分组 -> 分组值（直方图为桶的下界，缺失值为 null）
+    count: int
+    metrics: Dict[str, Any] = {}  # "avg:year" -> 值
+
+class AggregateResult(BaseModel):
+    groups: List[AggregateGroup]
+    truncated: bool = False  # 分组数超过 limit，只返回了前 limit 个
+    version: Optional[int] = None  # 统计时的表格版本号
+
 # 1. 项目相关模型
 class ProjectBase(BaseModel):
     model_config = {"populate_by_name": True}
@@ -95,7 +150,7 @@ class Project(ProjectBase):
     created_at: datetime
     last_modified: datetime
     user_id: int
-    items_count: int
+    items_count: int = 0  # 所有表格的数据项数，写入时由数据库触发器维护
     tables: Optional[List[Table]] = []
     
     class Config:
@@ -103,6 +158,23 @@ class Project(ProjectBase):
 
 
 
+# 数据项过滤条件（GET /api/items?filter=...）
+class FilterOperator(str, Enum):
+    EQ = "eq"
+    NE = "ne"
+    GT = "gt"
+    GTE = "gte"
+    LT = "lt"
+    LTE = "lte"
+    BETWEEN = "between"  # value 为 [最小值, 最大值]
+    IN = "in"  # value 为列表
+    CONTAINS = "contains"  # 文本包含（不区分大小写）；multi_select 为包含某个选项
+
+class ItemFilter(BaseModel):
+    field: str  # 字段 key，必须在表格 schema 中声明
+    op: FilterOperator = FilterOperator.EQ
+    value: Any = None
+
 # 3. 数据模型定义 - 动态 schema
 class Item(BaseModel):
     id: str
@@ -111,11 +183,56 @@ class Item(BaseModel):
     updated_at: Optional[datetime] = None
     table_id: Optional[int] = None # 新增 table_id
 
+# 增量同步（GET /api/items/changes）
+class ItemChangeOp(str, Enum):
+    UPSERT = "upsert"  # 新增或修改，item 为最新数据
+    DELETE = "delete"
+
+class ItemChange(BaseModel):
+    op: ItemChangeOp
+    id: str
+    item: Optional[Item] = None
+
+class ItemChangesResponse(BaseModel):
+    changes: List[ItemChange]
+    cursor: str  # 下次同步时传入
+    hasMore: bool  # 为 true 时立即用新游标继续拉取
+
 class ItemCreate(BaseModel):
     projectId: int
     tableId: int
     data: dict
 
+# 批量局部更新（PATCH /api/items），data 按 JSON Merge Patch（RFC 7396）合并：
+# 值为 null 的字段被删除，对象递归合并，其他值直接覆盖
+class ItemPatch(BaseModel):
+    id: str
+    data: dict
+
+class ItemBulkPatch(BaseModel):
+    items: List[ItemPatch]
+
+class ItemPatchStatus(str, Enum):
+    UPDATED = "updated"
+    NOT_FOUND = "not_found"  # 不存在或不属于当前用户
+
+class ItemPatchResult(BaseModel):
+    id: str
+    status: ItemPatchStatus
+
+class ItemBulkPatchResponse(BaseModel):
+    updated: int
+    results: List[ItemPatchResult]
+
+# 批量删除（POST /api/items/delete）：按 id 列表删除，或删除某个表格中满足过滤条件的项目
+class ItemBulkDelete(BaseModel):
+    ids: Optional[List[str]] = None
+    tableId: Optional[int] = None
+    filter: Optional[List[ItemFilter]] = None  # 需要指定 tableId；为空时删除表格中的全部项目
+
+class ItemBulkDeleteResponse(BaseModel):
+    deleted: int
+
 class SyncData(BaseModel):
     items: Optional[List[str]] = None
 
@@ -132,6 +249,7 @@ class ProjectUpload(BaseModel):
     table_schema: Optional[dict] = Field(None, alias="schema")  # 列定义，使用 alias
     projectId: Optional[int] = None
     tableId: Optional[int] = None # 新增 tableId
+    background: bool = False  # 为 True 时创建后台导入任务，立即返回任务 id
     
     @classmethod
     def model_validate(cls, obj):
@@ -145,6 +263,33 @@ class ProjectUpload(BaseModel):
             raise
 
 
+# 后台导入任务
+class IngestJobStatus(str, Enum):
+    PENDING = "pending"      # 等待执行（包括中断后等待继续）
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class IngestJob(BaseModel):
+    id: str
+    status: IngestJobStatus
+    project_id: Optional[int] = None
+    table_id: Optional[int] = None
+    file_name: Optional[str] = None
+    file_format: str
+    total_bytes: Optional[int] = None
+    rows_done: int = 0  # 已提交的行数
+    bytes_done: int = 0  # 已读取的字节数（XLSX 为 0）
+    progress: Optional[float] = None  # 0~1，按字节计算，XLSX 为 None
+    rows_per_second: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        use_enum_values = True
 
 # 认证相关模型
 class Token(BaseModel):
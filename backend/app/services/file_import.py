@@ -0,0 +1,228 @@
+"""
+上传文件的流式解析（CSV / NDJSON / XLSX）
+逐行读取文件并产生数据项字典，与 app.crud.ingest.ingest_items 配合使用时，
+内存中最多只有一个写入块（INGEST_CHUNK_SIZE 行）的数据，与文件大小无关。
+
+CSV 的值按前端 parseCSV 的规则转换：true/false 转为布尔值，数字转为数值，含分号的值拆分为数组。
+"""
+
+import codecs
+import csv
+import itertools
+import json
+import math
+import os
+import re
+import tempfile
+from datetime import date, datetime, time
+from typing import Any, BinaryIO, Dict, Iterator, Optional
+
+SUPPORTED_FORMATS = ("csv", "ndjson", "xlsx")
+
+_EXTENSIONS = {
+    ".csv": "csv",
+    ".tsv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".xlsx": "xlsx",
+}
+
+# 判断 CSV 编码时读取的字节数
+_SNIFF_BYTES = 64 * 1024
+
+_LINE_BREAK = re.compile(rb"\r\n|\r|\n")
+
+
+class FileImportError(ValueError):
+    """文件格式不支持或内容无法解析"""
+    pass
+
+
+def detect_format(filename: Optional[str], file_format: Optional[str] = None) -> str:
+    """根据显式指定的格式或文件扩展名确定文件格式"""
+    if file_format:
+        file_format = file_format.lower()
+        if file_format not in SUPPORTED_FORMATS:
+            raise FileImportError(f"不支持的文件格式: {file_format}")
+        return file_format
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in _EXTENSIONS:
+        raise FileImportError("无法识别文件格式，仅支持 CSV、NDJSON 和 XLSX 文件")
+    return _EXTENSIONS[extension]
+
+def convert_text_value(value: str) -> Any:
+    """与前端 parseCSV 相同的类型转换"""
+    value = value.strip()
+    if value in ("true", "false"):
+        return value == "true"
+    if value and "_" not in value:
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        try:
+            number = float(value)
+        except ValueError:
+            number = None
+        if number is not None and math.isfinite(number):
+            return number
+    if ";" in value:
+        return [part.strip() for part in value.split(";")]
+    return value
+
+def _with_id(item: Dict[str, Any]) -> Dict[str, Any]:
+    """数据项 id 统一为字符串；没有 id 的由写入时生成"""
+    if item.get("id") in (None, ""):
+        item.pop("id", None)
+    else:
+        item["id"] = str(item["id"])
+    return item
+
+def _sniff_encoding(file: BinaryIO) -> str:
+    """UTF-8（可带 BOM）无法解码时按 GB18030 读取（Excel 中文版导出的 CSV）"""
+    head = file.read(_SNIFF_BYTES)
+    file.seek(0)
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "gb18030"
+
+def _byte_lines(file: BinaryIO, chunk_size: int = _SNIFF_BYTES) -> Iterator[bytes]:
+    """
+    按块读取文件，逐行产出字节（保留换行符，\r\n、\r、\n 都作为换行）
+    只调用 file.read()，不用 io.TextIOWrapper 包装：Python 3.9 的 SpooledTemporaryFile（UploadFile.file）
+    没有 readable()，无法被包装。UTF-8 和 GB18030 的多字节字符不含 \r、\n 字节，按字节分行是安全的
+    """
+    pending = b""
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            if pending:
+                yield pending
+            return
+        data = pending + chunk
+        start = 0
+        for match in _LINE_BREAK.finditer(data):
+            if match.end() == len(data) and data.endswith(b"\r"):
+                break  # \r\n 可能被分在两块中，留到下一块再判断
+            yield data[start:match.end()]
+            start = match.end()
+        pending = data[start:]
+
+def _text_lines(file: BinaryIO, encoding: str) -> Iterator[str]:
+    """逐行解码，无法解码的行（编码只按文件开头判断）转为带行号的 FileImportError"""
+    for line_number, raw in enumerate(_byte_lines(file), start=1):
+        try:
+            yield raw.decode(encoding)
+        except UnicodeDecodeError as e:
+            raise FileImportError(f"第 {line_number} 行的内容无法解码（{encoding}）: {e.reason}")
+
+def _csv_records(reader) -> Iterator[list]:
+    """逐条读取 CSV 记录，CSV 格式错误转为带行号的 FileImportError"""
+    while True:
+        try:
+            values = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            raise FileImportError(f"第 {reader.line_num} 行不是合法的 CSV: {e}")
+        yield values
+
+def iter_csv(file: BinaryIO, delimiter: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """逐行解析 CSV，第一行为表头；未指定分隔符时从文件开头推断（逗号、制表符、分号）"""
+    lines = _text_lines(file, _sniff_encoding(file))
+    if delimiter is None:
+        head = []
+        size = 0
+        for line in lines:
+            head.append(line)
+            size += len(line)
+            if size >= _SNIFF_BYTES:
+                break
+        try:
+            delimiter = csv.Sniffer().sniff("".join(head), delimiters=",\t;").delimiter
+        except csv.Error:
+            delimiter = ","
+        lines = itertools.chain(head, lines)
+    records = _csv_records(csv.reader(lines, delimiter=delimiter))
+    header = next(records, None)
+    if header is None:
+        return
+    keys = [key.strip() for key in header]
+    for values in records:
+        if not any(value.strip() for value in values):
+            continue
+        item = {
+            key: value.strip() if key == "id" else convert_text_value(value)
+            for key, value in zip(keys, values)
+            if key
+        }
+        yield _with_id(item)
+
+def iter_ndjson(file: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """逐行解析 NDJSON（UTF-8，可带 BOM），每行一个 JSON 对象，空行忽略"""
+    for line_number, line in enumerate(_text_lines(file, "utf-8-sig"), start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise FileImportError(f"第 {line_number} 行不是合法的 JSON: {e.msg}")
+        if not isinstance(item, dict):
+            raise FileImportError(f"第 {line_number} 行不是 JSON 对象")
+        yield _with_id(item)
+
+def _cell_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+def iter_xlsx(file: BinaryIO, sheet: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    以只读模式逐行解析 XLSX（openpyxl read_only，不会把整个工作簿载入内存）
+    默认读取第一个工作表，第一行为表头；公式单元格取缓存的计算结果
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise FileImportError("服务端未安装 openpyxl，无法解析 XLSX 文件")
+    # Python 3.9 的 SpooledTemporaryFile 没有 zipfile 需要的 seekable()，使用它内部的文件对象
+    # （BytesIO 或磁盘临时文件；只读取，不会触发 rollover）。file 本身要保持引用，否则被回收时会关闭内部文件
+    source = file._file if isinstance(file, tempfile.SpooledTemporaryFile) else file
+    try:
+        workbook = load_workbook(source, read_only=True, data_only=True)
+    except Exception as e:
+        raise FileImportError(f"无法读取 XLSX 文件: {e}")
+    try:
+        if sheet is not None and sheet not in workbook.sheetnames:
+            raise FileImportError(f"工作表不存在: {sheet}")
+        worksheet = workbook[sheet] if sheet is not None else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        keys = ["" if key is None else str(key).strip() for key in header]
+        for values in rows:
+            if all(value is None for value in values):
+                continue
+            item = {
+                key: _cell_value(value)
+                for key, value in zip(keys, values)
+                if key
+            }
+            yield _with_id(item)
+    finally:
+        workbook.close()
+
+def iter_file_rows(file: BinaryIO, file_format: str) -> Iterator[Dict[str, Any]]:
+    """按格式逐行解析上传的文件（file 为可 seek 的二进制文件对象）"""
+    if file_format == "csv":
+        return iter_csv(file)
+    if file_format == "ndjson":
+        return iter_ndjson(file)
+    if file_format == "xlsx":
+        return iter_xlsx(file)
+    raise FileImportError(f"不支持的文件格式: {file_format}")
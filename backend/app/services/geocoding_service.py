@@ -5,6 +5,7 @@ import json
 from typing import Optional, Dict, List
 from sqlalchemy.orm import Session
 from app.crud.items import get_item_from_db, update_item_in_db
+from app.database.executor import run_db
 
 # 系统项目 ID（用于全局地理编码缓存）
 SYSTEM_GEOCODE_PROJECT_ID = 0
@@ -36,8 +37,8 @@ class GeocodingService:
         对单个地址进行地理编码
         """
         print(f"[GeocodingService] Processing address: '{address}' (cache_project={self.cache_project_id})")
-        # 1. 先查询缓存
-        cached = self.get_cached_coordinates(address)
+        # 1. 先查询缓存（数据库查询放到线程池，避免阻塞事件循环）
+        cached = await run_db(self.get_cached_coordinates, address)
         if cached:
             print(f"[GeocodingService] Cache HIT for '{address}'")
             return cached
@@ -73,7 +74,8 @@ class GeocodingService:
                         }
                         
                         # 3. 缓存结果
-                        self.cache_coordinates(
+                        await run_db(
+                            self.cache_coordinates,
                             address,
                             coords["lat"],
                             coords["lng"],
@@ -137,27 +139,26 @@ class GeocodingService:
             item_id = self._generate_cache_id(address)
             
             # 直接查询数据库，不依赖 user_id 过滤
-            from app.database.connection import get_db_connection
+            from app.database.connection import get_connection
             import json
             
-            conn = get_db_connection()
-            cur = conn.cursor()
-            
-            # 查询缓存项（只按 id 和 project_id 过滤，不过滤 user_id）
-            if conn.row_factory:  # SQLite
-                cur.execute(
-                    "SELECT data FROM items WHERE id = ? AND project_id = ?",
-                    (item_id, self.cache_project_id)
-                )
-            else:  # PostgreSQL
-                cur.execute(
-                    "SELECT data FROM items WHERE id = %s AND project_id = %s",
-                    (item_id, self.cache_project_id)
-                )
-            
-            row = cur.fetchone()
-            cur.close()
-            conn.close()
+            with get_connection() as conn:
+                cur = conn.cursor()
+                
+                # 查询缓存项（只按 id 和 project_id 过滤，不过滤 user_id）
+                if conn.row_factory:  # SQLite
+                    cur.execute(
+                        "SELECT data FROM items WHERE id = ? AND project_id = ?",
+                        (item_id, self.cache_project_id)
+                    )
+                else:  # PostgreSQL
+                    cur.execute(
+                        "SELECT data FROM items WHERE id = %s AND project_id = %s",
+                        (item_id, self.cache_project_id)
+                    )
+                
+                row = cur.fetchone()
+                cur.close()
             
             if row:
                 # 解析数据
@@ -353,10 +354,11 @@ class GeocodingService:
         
         # 2. 确保项目有本地地理数据表
         from app.crud.tables import ensure_project_geocode_table
-        local_table_id = ensure_project_geocode_table(target_project_id)
+        local_table_id = await run_db(ensure_project_geocode_table, target_project_id)
         
         # 3. 复制到项目本地表
-        copied_count = self.copy_to_project_table(
+        copied_count = await run_db(
+            self.copy_to_project_table,
             geocode_results,
             target_project_id,
             local_table_id
@@ -0,0 +1,204 @@
+"""
+后台导入任务的执行
+上传接口把文件保存到 INGEST_JOBS_DIR 并创建任务后立即返回，任务在本进程的导入线程池中执行
+（与处理请求的数据库线程池分开，长时间导入不会占满 run_db 的线程）。
+
+每写入一块数据（INGEST_CHUNK_SIZE 行），进度（rows_done、读取的字节数、速率、预计剩余时间）
+在同一个事务中写入 ingest_jobs，因此进度与已提交的数据总是一致的。任务中断（进程退出、崩溃）后
+重新执行时跳过前 rows_done 行，从最后提交的块之后继续，不会重复写入没有 id 而自动生成 id 的数据项。
+
+进程启动时以及之后每隔 INGEST_JOB_STALE_SECONDS，会认领等待中的任务和心跳超时的任务
+（执行它的进程已退出），多进程部署时同一任务只会被一个进程认领。
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, Optional
+from app.config import INGEST_JOBS_DIR, INGEST_WORKERS, INGEST_JOB_STALE_SECONDS
+from app.crud.ingest import IngestError, ingest_items
+from app.crud.ingest_jobs import (
+    claim_ingest_job, create_ingest_job, finish_ingest_job, get_resumable_job_ids, record_ingest_progress
+)
+from app.services.file_import import FileImportError, iter_file_rows
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_recovery_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+_stopping = threading.Event()
+# 本进程已提交到线程池、尚未结束的任务
+_active = set()
+
+
+class _Interrupted(Exception):
+    """进程退出，任务在两个数据块之间停止"""
+    pass
+
+
+def _job_path(file_format: str) -> str:
+    return os.path.join(INGEST_JOBS_DIR, f"{os.urandom(8).hex()}.{file_format}")
+
+def save_job_file(file: BinaryIO, file_format: str) -> tuple:
+    """
+    把上传的文件复制到任务目录
+
+    Returns:
+        (文件路径, 字节数)
+    """
+    os.makedirs(INGEST_JOBS_DIR, exist_ok=True)
+    path = _job_path(file_format)
+    with open(path, "wb") as target:
+        shutil.copyfileobj(file, target, length=1024 * 1024)
+    return path, os.path.getsize(path)
+
+def save_job_items(items: Iterable[dict]) -> tuple:
+    """把 JSON 上传的数据项写成 NDJSON 文件，返回 (文件路径, 字节数)"""
+    os.makedirs(INGEST_JOBS_DIR, exist_ok=True)
+    path = _job_path("ndjson")
+    with open(path, "w", encoding="utf-8") as target:
+        for item in items:
+            target.write(json.dumps(item, ensure_ascii=False) + "\n")
+    return path, os.path.getsize(path)
+
+def create_job(user_id: int, project_id: int, table_id: int, file_path: str, file_name: Optional[str],
+               file_format: str, total_bytes: Optional[int]) -> dict:
+    """创建任务并提交到本进程的导入线程池"""
+    job = create_ingest_job(user_id, project_id, table_id, file_path, file_name, file_format, total_bytes)
+    submit(job["id"])
+    return job
+
+
+class _Progress:
+    """在每块的事务中记录进度、计算速率和预计剩余时间"""
+
+    def __init__(self, job: dict, file: BinaryIO):
+        self.job_id = job["id"]
+        self.file = file
+        self.skip = job["rows_done"]
+        self.start_bytes = job["bytes_done"]
+        # XLSX 按 zip 结构随机读取，文件位置不代表进度
+        self.total_bytes = job["total_bytes"] if job["file_format"] != "xlsx" else None
+        self.started = time.perf_counter()
+
+    def __call__(self, cur, sqlite: bool, rows: int):
+        elapsed = time.perf_counter() - self.started
+        rate = rows / elapsed if elapsed > 0 else None
+        bytes_done = self.file.tell() if self.total_bytes else 0
+        eta = None
+        if self.total_bytes and bytes_done > self.start_bytes:
+            eta = elapsed * (self.total_bytes - bytes_done) / (bytes_done - self.start_bytes)
+        record_ingest_progress(
+            cur, sqlite, self.job_id, self.skip + rows, bytes_done,
+            round(rate, 1) if rate else None, round(eta, 1) if eta is not None else None
+        )
+
+def _rows(file: BinaryIO, file_format: str, skip: int) -> Iterator[dict]:
+    """跳过已提交的行；进程退出时在块之间停止"""
+    for row in islice(iter_file_rows(file, file_format), skip, None):
+        if _stopping.is_set():
+            raise _Interrupted()
+        yield row
+
+def run_job(job_id: str) -> Optional[str]:
+    """
+    认领并执行任务（在导入线程中调用）
+
+    Returns:
+        任务结束时的状态；任务已被其他进程认领或已结束时返回 None
+    """
+    job = claim_ingest_job(job_id, INGEST_JOB_STALE_SECONDS)
+    if not job:
+        return None
+    logger.debug("[INGEST JOB] 开始任务 %s（%s），从第 %d 行继续", job_id, job["file_name"], job["rows_done"])
+    rows_done = job["rows_done"]
+    try:
+        with open(job["file_path"], "rb") as file:
+            progress = _Progress(job, file)
+            stats = ingest_items(
+                _rows(file, job["file_format"], job["rows_done"]),
+                job["user_id"], job["project_id"], job["table_id"], checkpoint=progress
+            )
+        rows_done += stats["rows"]
+        status, error = "completed", None
+    except IngestError as e:
+        rows_done += e.rows
+        if isinstance(e.__cause__, _Interrupted):
+            # 进程退出：放回 pending，下次启动时继续
+            finish_ingest_job(job_id, "pending")
+            logger.info("[INGEST JOB] 任务 %s 已中断，已提交 %d 行", job_id, rows_done)
+            return "pending"
+        status, error = "failed", str(e.__cause__ or e)
+    except (OSError, FileImportError) as e:
+        status, error = "failed", str(e)
+
+    finish_ingest_job(job_id, status, error)
+    if status == "completed":
+        try:
+            os.remove(job["file_path"])
+        except OSError:
+            pass
+    if error:
+        logger.warning("[INGEST JOB] 任务 %s %s，共 %d 行：%s", job_id, status, rows_done, error)
+    else:
+        logger.debug("[INGEST JOB] 任务 %s %s，共 %d 行", job_id, status, rows_done)
+    return status
+
+def _run(job_id: str):
+    try:
+        run_job(job_id)
+    except Exception:
+        logger.exception("[INGEST JOB] 任务 %s 执行出错", job_id)
+    finally:
+        with _lock:
+            _active.discard(job_id)
+
+def submit(job_id: str) -> bool:
+    """把任务提交到导入线程池；已在本进程中排队或执行的任务不会重复提交"""
+    global _executor
+    with _lock:
+        if _stopping.is_set() or job_id in _active:
+            return False
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+        _active.add(job_id)
+    _executor.submit(_run, job_id)
+    return True
+
+def recover_jobs() -> int:
+    """提交等待中和心跳超时的任务，返回提交的任务数"""
+    return sum(submit(job_id) for job_id in get_resumable_job_ids(INGEST_JOB_STALE_SECONDS))
+
+def _recovery_loop():
+    while not _stopping.wait(INGEST_JOB_STALE_SECONDS):
+        try:
+            recover_jobs()
+        except Exception:
+            logger.exception("[INGEST JOB] 恢复任务失败")
+
+def start_ingest_worker():
+    """应用启动时调用：继续未完成的任务，并定期接手其他进程中断的任务"""
+    global _recovery_thread
+    _stopping.clear()
+    recovered = recover_jobs()
+    if recovered:
+        logger.info("[INGEST JOB] 继续执行 %d 个未完成的导入任务", recovered)
+    if _recovery_thread is None:
+        _recovery_thread = threading.Thread(target=_recovery_loop, name="ingest-recovery", daemon=True)
+        _recovery_thread.start()
+
+def stop_ingest_worker():
+    """应用退出时调用：执行中的任务在当前数据块提交后停止，之后由下次启动继续"""
+    global _executor, _recovery_thread
+    _stopping.set()
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+    _recovery_thread = None
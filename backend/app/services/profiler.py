@@ -0,0 +1,298 @@
+"""
+数据列统计与 schema 推断
+对上传的数据或表格中的数据项（超过 PROFILE_SAMPLE_SIZE 行时取蓄水池抽样）逐列统计：
+值类型分布、空值比例、不同值个数（超过 DISTINCT_LIMIT 时只给出下限）、数值/日期的最小最大值，
+并推断字段类型（FieldType）和语义角色（经纬度、时间、图片、关联等）。
+
+与只看第一行的推断相比，稀疏列（第一行为空）和混合列（大部分是数字、少数是文本）都能得到正确类型；
+前端 useFieldSemanticDetection 按字段名猜测的语义角色在这里同时参考字段的值。
+
+注意：POST /api/upload/file 边解析边写入，推断 schema 时只统计文件的前 PROFILE_SAMPLE_SIZE 行
+（islice，不是全文件抽样）。只在之后的行中出现的列、前面的行全部为空的列不在推断的 schema 中或类型不准确；
+接口在响应中返回 profiledRows / profileTruncated。写入完成后 GET .../profile 会对整个表格重新抽样统计。
+"""
+
+import math
+import random
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+from app.config import PROFILE_SAMPLE_SIZE
+from app.crud.items import iter_items_from_db
+from app.crud.tables import get_table_profile, get_table_versions, save_table_profile
+
+# 精确统计不同值个数的上限
+DISTINCT_LIMIT = 1000
+# 推断为 select 时的最大选项数
+SELECT_MAX_OPTIONS = 50
+# 非空值中某一类型占比达到该值时采用该类型
+TYPE_THRESHOLD = 0.9
+
+# 不属于 data 的元数据字段
+META_KEYS = ("id", "created_at", "updated_at")
+
+_DATE_PATTERN = re.compile(
+    r"^\d{4}[-/]\d{1,2}[-/]\d{1,2}([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?)?$"
+)
+_URL_PATTERN = re.compile(r"^https?://\S+$", re.IGNORECASE)
+_IMAGE_PATTERN = re.compile(r"\.(jpe?g|png|gif|webp|bmp|svg|tiff?|avif|heic)(\?.*)?$", re.IGNORECASE)
+_RELATION_KEY_PATTERN = re.compile(r"(_ids?|Ids?)$")
+
+# 与前端 useMapProjectData 的经纬度字段名一致
+_LAT_KEYS = ("lat", "latitude", "wd", "纬度")
+_LNG_KEYS = ("lng", "lon", "long", "longitude", "jd", "经度")
+
+# 与前端 useFieldSemanticDetection 一致的按名称识别规则（按顺序匹配）
+_NAME_ROLES = [
+    ("primary_label", ("name", "label", "title", "名称", "标题"), True),
+    ("address", ("address", "location", "place", "city", "birthplace", "地址", "位置", "地点", "出生地"), False),
+    ("timestamp", ("date", "time", "timestamp", "日期", "时间"), False),
+    ("description", ("description", "desc", "note", "comment", "描述", "备注", "说明"), False),
+    ("image_url", ("image", "img", "photo", "picture", "avatar", "图片", "照片", "头像"), False),
+    ("category", ("category", "type", "kind", "class", "分类", "类型", "类别"), False),
+]
+
+
+def _is_number_text(value: str) -> Optional[float]:
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+def classify(value: Any) -> str:
+    """
+    值的类型：null / boolean / number / date / image_url / url / text / list / geo_point / object
+    数字文本按 number 计，与 CSV 解析和列表过滤（数值比较）的处理一致
+    """
+    if value is None or value == "":
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number" if math.isfinite(value) else "text"
+    if isinstance(value, str):
+        text = value.strip()
+        if _is_number_text(text) is not None:
+            return "number"
+        if _DATE_PATTERN.match(text):
+            return "date"
+        if _URL_PATTERN.match(text):
+            return "image_url" if _IMAGE_PATTERN.search(text.split("#")[0]) else "url"
+        return "text"
+    if isinstance(value, list):
+        return "list"
+    if isinstance(value, dict):
+        if value.get("type") == "Point" and isinstance(value.get("coordinates"), list):
+            return "geo_point"
+        if "lat" in value and ("lng" in value or "lon" in value):
+            return "geo_point"
+        return "object"
+    return "text"
+
+
+class _ColumnStats:
+    """单列的统计量"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.types = Counter()
+        self.distinct = set()
+        self.distinct_overflow = False
+        self.min_number = self.max_number = None
+        self.min_date = self.max_date = None
+
+    def _add_distinct(self, value):
+        if self.distinct_overflow:
+            return
+        self.distinct.add(value)
+        if len(self.distinct) > DISTINCT_LIMIT:
+            self.distinct_overflow = True
+            self.distinct = set()
+
+    def add(self, value: Any):
+        kind = classify(value)
+        self.types[kind] += 1
+        if kind == "null":
+            return
+        if kind == "number":
+            number = float(value) if not isinstance(value, str) else _is_number_text(value.strip())
+            if self.min_number is None or number < self.min_number:
+                self.min_number = number
+            if self.max_number is None or number > self.max_number:
+                self.max_number = number
+            self._add_distinct(number)
+        elif kind == "date":
+            text = value.strip()
+            if self.min_date is None or text < self.min_date:
+                self.min_date = text
+            if self.max_date is None or text > self.max_date:
+                self.max_date = text
+            self._add_distinct(text)
+        elif kind == "list":
+            # 多选：统计元素的不同值（即选项）
+            for element in value:
+                if isinstance(element, (str, int, float, bool)):
+                    self._add_distinct(str(element))
+        elif kind in ("geo_point", "object"):
+            pass
+        else:
+            self._add_distinct(value.strip() if isinstance(value, str) else value)
+
+    def _dominant(self, non_null: int) -> Optional[str]:
+        """非空值中占比达到 TYPE_THRESHOLD 的类型（url 与 image_url 合并计算）"""
+        if not non_null:
+            return None
+        counts = Counter({kind: count for kind, count in self.types.items() if kind != "null"})
+        if counts["url"] + counts["image_url"] >= TYPE_THRESHOLD * non_null:
+            return "image_url" if counts["image_url"] >= TYPE_THRESHOLD * non_null else "url"
+        kind, count = counts.most_common(1)[0]
+        return kind if count >= TYPE_THRESHOLD * non_null else None
+
+    def profile(self, rows: int) -> dict:
+        nulls = self.types["null"] + (rows - sum(self.types.values()))  # 缺少该字段的行也算空值
+        non_null = rows - nulls
+        dominant = self._dominant(non_null)
+        options = None
+        if dominant == "number":
+            field_type = "number"
+        elif dominant == "date":
+            field_type = "date"
+        elif dominant == "geo_point":
+            field_type = "geo_point"
+        elif dominant == "list":
+            field_type = "multi_select"
+            if not self.distinct_overflow and len(self.distinct) <= SELECT_MAX_OPTIONS:
+                options = sorted(str(value) for value in self.distinct)
+        elif dominant == "image_url":
+            field_type = "image"
+        elif dominant == "url":
+            field_type = "url"
+        elif (dominant == "text" and not self.distinct_overflow
+              and 1 < len(self.distinct) <= SELECT_MAX_OPTIONS and len(self.distinct) <= non_null * 0.5):
+            # 取值集中的文本列推断为单选
+            field_type = "select"
+            options = sorted(str(value) for value in self.distinct)
+        else:
+            field_type = "text"
+
+        column = {
+            "key": self.key,
+            "type": field_type,
+            "role": self._role(field_type),
+            "null_ratio": round(nulls / rows, 4) if rows else 0.0,
+            "distinct": DISTINCT_LIMIT if self.distinct_overflow else len(self.distinct),
+            "distinct_exact": not self.distinct_overflow,
+            "min": None,
+            "max": None,
+            "value_types": {kind: count for kind, count in self.types.items() if kind != "null"},
+        }
+        if field_type == "number":
+            column["min"], column["max"] = self.min_number, self.max_number
+        elif field_type == "date":
+            column["min"], column["max"] = self.min_date, self.max_date
+        if options is not None:
+            column["options"] = options
+        return column
+
+    def _role(self, field_type: str) -> Optional[str]:
+        name = self.key.lower()
+        if field_type == "number":
+            in_lat_range = self.min_number is not None and -90 <= self.min_number and self.max_number <= 90
+            in_lng_range = self.min_number is not None and -180 <= self.min_number and self.max_number <= 180
+            if name in _LAT_KEYS and in_lat_range:
+                return "latitude"
+            if name in _LNG_KEYS and in_lng_range:
+                return "longitude"
+        if field_type == "geo_point":
+            return "geo_point"
+        if field_type == "date":
+            return "timestamp"
+        if field_type == "image":
+            return "image_url"
+        if _RELATION_KEY_PATTERN.search(self.key) and field_type in ("text", "select", "multi_select", "number"):
+            return "relation"
+        for role, names, exact in _NAME_ROLES:
+            if any(name == candidate if exact else candidate in name for candidate in names):
+                # 名称像图片但值不是图片地址时不标为图片
+                if role == "image_url" and field_type not in ("url", "image"):
+                    continue
+                return role
+        return None
+
+
+def sample_rows(rows: Iterable[dict], sample_size: int = PROFILE_SAMPLE_SIZE, seed: int = 0) -> tuple:
+    """
+    蓄水池抽样（Algorithm R），只遍历一次，内存占用与 sample_size 有关
+
+    Returns:
+        (总行数, 抽样得到的行)
+    """
+    rng = random.Random(seed)
+    sample: List[dict] = []
+    total = 0
+    for row in rows:
+        total += 1
+        if len(sample) < sample_size:
+            sample.append(row)
+        else:
+            index = rng.randrange(total)
+            if index < sample_size:
+                sample[index] = row
+    return total, sample
+
+def profile_rows(rows: Iterable[dict], sample_size: int = PROFILE_SAMPLE_SIZE) -> dict:
+    """
+    统计数据行（数据项的 data 字典，元数据字段 id/created_at/updated_at 会被忽略）
+
+    Returns:
+        {"rows": 总行数, "sampled": 参与统计的行数, "columns": [列统计, ...]}，列按首次出现的顺序排列
+    """
+    total, sample = sample_rows(rows, sample_size)
+    columns: Dict[str, _ColumnStats] = {}
+    for row in sample:
+        for key, value in row.items():
+            if key in META_KEYS:
+                continue
+            stats = columns.get(key)
+            if stats is None:
+                stats = columns[key] = _ColumnStats(key)
+            stats.add(value)
+    return {
+        "rows": total,
+        "sampled": len(sample),
+        "columns": [stats.profile(len(sample)) for stats in columns.values()],
+    }
+
+def schema_from_profile(profile: dict) -> dict:
+    """由列统计生成表格 schema（ProjectSchema 的结构）"""
+    fields = []
+    for column in profile["columns"]:
+        field = {"key": column["key"], "label": column["key"], "type": column["type"]}
+        if column.get("options") is not None:
+            field["options"] = column["options"]
+        if column["role"] == "primary_label" and not any(f.get("is_primary") for f in fields):
+            field["is_primary"] = True
+        fields.append(field)
+    return {"fields": fields}
+
+def get_or_build_table_profile(table_id: int, project_id: int, version: int, user_id: int) -> dict:
+    """
+    表格的列统计：表格版本号未变化时直接返回保存的结果，否则重新统计并保存
+    version 为统计开始前读取的版本号，统计期间有写入时下次请求会重新统计
+    """
+    profile = get_table_profile(table_id, version)
+    if profile is not None:
+        return profile
+    rows = (item["data"] for item in iter_items_from_db(user_id, project_id, table_id))
+    profile = profile_rows(rows)
+    profile["version"] = version
+    save_table_profile(table_id, version, profile)
+    return profile
+
+def store_table_profile(table_id: int, profile: dict) -> None:
+    """缓存刚写入的表格的列统计（按表格当前版本号）"""
+    versions = get_table_versions(table_id=table_id)
+    if versions:
+        profile = dict(profile, version=versions[0][1])
+        save_table_profile(table_id, profile["version"], profile)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+批量写入基准
+在临时数据库中对比上传 N 个数据项的耗时：
+    旧路径：一个事务，executemany 逐行 INSERT ... ON CONFLICT / INSERT OR REPLACE
+    新路径：ingest_items()，分块事务，SQLite 多行 INSERT / PostgreSQL COPY + 合并
+
+    python benchmarks/bulk_ingest.py                   # 默认 200000 个数据项，临时 SQLite 数据库
+    DATABASE_URL=postgresql://... python benchmarks/bulk_ingest.py 200000
+使用 PostgreSQL 时会在该库中写入并删除一个临时项目的数据，请勿指向生产库。
+"""
+
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database.init_db import init_db
+from app.database.connection import get_connection
+from app.crud.changes import next_seq
+from app.crud.items import item_row
+from app.crud.ingest import ingest_items
+from app.crud.projects import create_project_in_db, delete_project_from_db
+
+
+def make_items(count: int, prefix: str) -> List[dict]:
+    return [
+        {
+            "id": f"{prefix}-{i}",
+            "name": f"图片 {i}",
+            "tags": ["风景", "travel", f"tag{i % 50}"],
+            "annotation": "sample annotation text " * 3,
+            "url": f"https://example.com/{i}",
+            "lat": 30.0 + i / 1e6,
+            "lng": 120.0 - i / 1e6,
+        }
+        for i in range(count)
+    ]
+
+def old_path(items: List[dict], user_id: int, project_id: int):
+    """原 save_items_to_db 的写入方式"""
+    with get_connection() as conn:
+        sqlite = bool(conn.row_factory)
+        cur = conn.cursor()
+        seq = next_seq(cur, sqlite)
+        values = [(*item_row(item), user_id, project_id, None, seq) for item in items]
+        if sqlite:
+            cur.executemany(
+                "INSERT OR REPLACE INTO items (id, data, user_id, project_id, table_id, seq) VALUES (?, ?, ?, ?, ?, ?)",
+                values
+            )
+        else:
+            cur.executemany(
+                "INSERT INTO items (id, data, user_id, project_id, table_id, seq) VALUES (%s, %s, %s, %s, %s, %s) "
+                "ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, updated_at = CURRENT_TIMESTAMP, seq = EXCLUDED.seq",
+                values
+            )
+        conn.commit()
+        cur.close()
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    init_db()
+    project = create_project_in_db(name="bulk ingest benchmark", user_id=1)
+
+    try:
+        old = timed(old_path, make_items(count, "old"), 1, project.id)
+        new = timed(ingest_items, make_items(count, "new"), 1, project.id)
+    finally:
+        delete_project_from_db(project.id, 1)
+
+    print(f"数据项数: {count}")
+    print(f"旧路径: {old:.2f} s（{count / old:.0f} 行/秒）")
+    print(f"新路径: {new:.2f} s（{count / new:.0f} 行/秒）")
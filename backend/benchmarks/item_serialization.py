@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+数据项列表序列化基准
+对比 GET /api/items 的两种响应路径编码 N 个数据项的耗时（不含数据库查询）：
+    旧路径：json.loads(data) -> Item(**row) -> response_model 校验 -> jsonable_encoder -> json.dumps
+    新路径：encode_item_rows()，data 的 JSON 文本直接拼接
+
+    python benchmarks/item_serialization.py            # 默认 100000 个数据项
+    python benchmarks/item_serialization.py 500000
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from app.models.schemas import Item
+from app.api.responses import encode_item_rows
+
+
+def make_rows(count: int) -> List[dict]:
+    """模拟 SQLite 查询结果：data 为 JSON 文本，时间为字符串"""
+    rows = []
+    for i in range(count):
+        data = {
+            "name": f"图片 {i}",
+            "tags": ["风景", "travel", f"tag{i % 50}"],
+            "folders": [f"folder-{i % 20}"],
+            "annotation": "sample annotation text " * 3,
+            "url": f"https://example.com/{i}",
+            "width": 1920,
+            "height": 1080,
+            "lat": 30.0 + i / 1e6,
+            "lng": 120.0 - i / 1e6,
+        }
+        rows.append({
+            "id": f"item-{i}",
+            "data": json.dumps(data),
+            "created_at": "2024-01-01 00:00:00",
+            "updated_at": "2024-01-02T03:04:05.123456",
+            "project_id": 1,
+            "table_id": 1,
+        })
+    return rows
+
+def old_path(rows: List[dict]) -> bytes:
+    field = create_response_field(name="Response_get_items", type_=List[Item])
+    items = [Item(**{**row, "data": json.loads(row["data"])}) for row in rows]
+    content = asyncio.run(serialize_response(field=field, response_content=items))
+    return JSONResponse(content).body
+
+def new_path(rows: List[dict]) -> bytes:
+    return encode_item_rows(rows)
+
+def bench(func, rows, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(rows)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = make_rows(count)
+
+    # 两种路径的输出必须一致
+    assert json.loads(old_path(rows[:1000])) == json.loads(new_path(rows[:1000]))
+
+    old = bench(old_path, rows)
+    new = bench(new_path, rows)
+    print(f"数据项数: {count}")
+    print(f"旧路径: {old * 1000:.0f} ms")
+    print(f"新路径: {new * 1000:.0f} ms")
+    print(f"加速: {old / new:.1f}x")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+项目列表基准（GET /api/projects/）
+在临时数据库中为一个用户创建 N 个项目（每个项目 3 个表格），对比加载项目及其表格的耗时：
+    旧路径：一条项目查询，再按项目逐个 get_tables_by_project（N + 1 次查询，每次借出一条连接）
+    新路径：get_projects_with_tables()，同一连接上一条项目查询 + 一条表格 IN 查询
+分别测量直接调用 CRUD 函数，以及像路由中那样每次调用都经过 run_db（数据库线程池）的耗时。
+SQLite 本地查询和线程池往返都很便宜（表格 schema 的解析结果有进程内缓存，见 parse_table_schema）；
+查询次数的差别在 PostgreSQL 上更明显（每次查询一次网络往返）。
+
+    python benchmarks/project_list.py          # 默认 500 个项目，临时 SQLite 数据库
+    DATABASE_URL=postgresql://... python benchmarks/project_list.py 500
+使用 PostgreSQL 时会在该库中创建并删除一个临时用户的项目，请勿指向生产库。
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database.init_db import init_db
+from app.crud.projects import create_project_in_db, delete_project_from_db, get_projects_from_db, get_projects_with_tables
+from app.crud.tables import create_table, get_tables_by_project
+from app.database.executor import run_db
+
+ROUNDS = 20
+SCHEMA = {
+    "fields": [{"key": f"field{i}", "label": f"字段 {i}", "type": "text"} for i in range(12)]
+}
+
+
+def old_path(user_id: int):
+    """原 get_projects 路由的加载方式"""
+    projects = get_projects_from_db(user_id)
+    for project in projects:
+        project.tables = get_tables_by_project(project.id)
+    return projects
+
+async def old_route(user_id: int):
+    projects = await run_db(get_projects_from_db, user_id)
+    for project in projects:
+        project.tables = await run_db(get_tables_by_project, project.id)
+    return projects
+
+async def new_route(user_id: int):
+    return await run_db(get_projects_with_tables, user_id)
+
+def timed(func, *args) -> float:
+    """多次执行取中位数（秒）"""
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    init_db()
+    user_id = 1
+    project_ids = []
+    try:
+        for i in range(count):
+            project = create_project_in_db(name=f"project list benchmark {i}", user_id=user_id)
+            project_ids.append(project.id)
+            for j in range(3):
+                create_table(project.id, f"表格 {j}", SCHEMA)
+
+        assert [len(p.tables) for p in old_path(user_id)] == [len(p.tables) for p in get_projects_with_tables(user_id)]
+        old = timed(old_path, user_id)
+        new = timed(get_projects_with_tables, user_id)
+        old_run_db = timed(lambda: asyncio.run(old_route(user_id)))
+        new_run_db = timed(lambda: asyncio.run(new_route(user_id)))
+    finally:
+        for project_id in project_ids:
+            delete_project_from_db(project_id, user_id)
+
+    print(f"项目数: {count}（每个项目 3 个表格，取 {ROUNDS} 次的中位数）")
+    print(f"查询次数: 旧路径 {count + 1} 次，新路径 {2 + (count - 1) // 500} 次")
+    print(f"直接调用: 旧路径 {old * 1000:.1f} ms，新路径 {new * 1000:.1f} ms（{old / new:.1f} 倍）")
+    print(f"经过 run_db: 旧路径 {old_run_db * 1000:.1f} ms，新路径 {new_run_db * 1000:.1f} ms（{old_run_db / new_run_db:.1f} 倍）")
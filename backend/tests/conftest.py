@@ -0,0 +1,67 @@
+"""
+测试环境：app.config 在导入时读取环境变量，因此在导入 app 之前设置
+默认使用临时目录中的 SQLite 数据库；设置 TEST_DATABASE_URL（例如 postgresql://...）时对该数据库运行，
+用于在 PostgreSQL 上验证触发器等与数据库相关的行为（测试会在其中创建用户和项目）。
+"""
+
+import os
+import tempfile
+import uuid
+
+_TMP_DIR = tempfile.mkdtemp(prefix="eagle-tests-")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL") or f"sqlite:///{_TMP_DIR}/test.db"
+os.environ["INGEST_JOBS_DIR"] = os.path.join(_TMP_DIR, "jobs")
+# 小块写入，少量数据也会经过多块写入和块间的进度记录
+os.environ["INGEST_CHUNK_SIZE"] = "100"
+# 测试中上传次数较多，关闭上传的令牌桶限流（限流本身见 test_rate_limit.py）
+os.environ["UPLOAD_RATE_PER_MINUTE"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _login(client, username: str, password: str) -> dict:
+    response = client.post("/api/auth/token", data={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": "Bearer " + response.json()["access_token"]}
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    return _login(client, "admin", "admin")
+
+
+@pytest.fixture
+def other_user_headers(client):
+    """另一个普通用户（每个测试新注册一个）"""
+    username = "user_" + uuid.uuid4().hex[:8]
+    response = client.post("/api/auth/register", json={"username": username, "email": f"{username}@example.com", "password": "secret"})
+    assert response.status_code == 200, response.text
+    return _login(client, username, "secret")
+
+
+@pytest.fixture
+def upload(client, auth_headers):
+    """通过 POST /api/upload 写入数据项，返回响应内容"""
+    def _upload(items, headers=None, **fields):
+        body = {"projectName": "测试项目", "items": items, **fields}
+        response = client.post("/api/upload", headers=headers or auth_headers, json=body)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return _upload
+
+
+@pytest.fixture
+def unique_ids():
+    """生成全局唯一的数据项 id（同一数据库中多个测试互不影响）"""
+    def _unique_ids(count: int) -> list:
+        tag = uuid.uuid4().hex[:8]
+        return [f"{tag}-{i}" for i in range(count)]
+    return _unique_ids
@@ -0,0 +1,73 @@
+"""条件 GET：If-None-Match 命中时返回 304，任何写入之后 ETag 改变"""
+
+import pytest
+
+
+def _get(client, headers, path, params=None, etag=None):
+    if etag:
+        headers = dict(headers, **{"If-None-Match": etag})
+    return client.get(path, headers=headers, params=params)
+
+
+def _assert_unchanged(client, headers, path, params, etag):
+    response = _get(client, headers, path, params, etag)
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def _assert_changed(client, headers, path, params, etag) -> str:
+    response = _get(client, headers, path, params, etag)
+    assert response.status_code == 200, response.text
+    assert response.headers["etag"] != etag
+    return response.headers["etag"]
+
+
+@pytest.mark.parametrize("scope", ["tableId", "projectId"])
+def test_items_etag_changes_after_each_write(client, auth_headers, upload, unique_ids, scope):
+    ids = unique_ids(3)
+    result = upload([{"id": item_id, "v": i} for i, item_id in enumerate(ids)])
+    params = {scope: result[scope]}
+
+    response = _get(client, auth_headers, "/api/items", params)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    _assert_unchanged(client, auth_headers, "/api/items", params, etag)
+
+    writes = [
+        lambda: client.put(f"/api/item/{ids[0]}", headers=auth_headers, json={"v": 100}),
+        lambda: client.patch("/api/items", headers=auth_headers, json={"items": [{"id": ids[1], "data": {"w": 1}}]}),
+        lambda: client.post("/api/items/delete", headers=auth_headers, json={"ids": [ids[2]]}),
+        lambda: client.post("/api/upload", headers=auth_headers, json={
+            "projectName": "追加", "projectId": result["projectId"], "tableId": result["tableId"],
+            "items": [{"id": unique_ids(1)[0]}],
+        }),
+    ]
+    for write in writes:
+        response = write()
+        assert response.status_code == 200, response.text
+        etag = _assert_changed(client, auth_headers, "/api/items", params, etag)
+        _assert_unchanged(client, auth_headers, "/api/items", params, etag)
+
+
+def test_etag_depends_on_query_and_user(client, auth_headers, other_user_headers, upload, unique_ids):
+    result = upload([{"id": item_id} for item_id in unique_ids(2)])
+    params = {"tableId": result["tableId"]}
+    etag = _get(client, auth_headers, "/api/items", params).headers["etag"]
+
+    # 不同的查询参数不会命中
+    assert _get(client, auth_headers, "/api/items", dict(params, limit=1), etag).status_code == 200
+    # 其他用户看不到这些数据项，不能复用 ETag
+    response = _get(client, other_user_headers, "/api/items", params, etag)
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_project_etag_changes_after_upload(client, auth_headers, upload, unique_ids):
+    result = upload([{"id": item_id} for item_id in unique_ids(2)])
+    path = f"/api/projects/{result['projectId']}"
+    etag = _get(client, auth_headers, path).headers["etag"]
+    _assert_unchanged(client, auth_headers, path, None, etag)
+
+    upload([{"id": item_id} for item_id in unique_ids(2)], projectId=result["projectId"], tableId=result["tableId"])
+    _assert_changed(client, auth_headers, path, None, etag)
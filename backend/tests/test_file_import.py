@@ -0,0 +1,79 @@
+"""上传文件解析：通过 UploadFile（SpooledTemporaryFile）读取 CSV / NDJSON / XLSX"""
+
+import io
+import tempfile
+from datetime import datetime
+
+import pytest
+from starlette.datastructures import UploadFile
+
+from app.services.file_import import FileImportError, iter_file_rows
+
+
+def _upload(content: bytes, filename: str) -> UploadFile:
+    # 与 starlette 解析 multipart 时相同：内容写入 SpooledTemporaryFile 后从头读取
+    file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    file.write(content)
+    file.seek(0)
+    return UploadFile(file=file, filename=filename)
+
+
+def test_csv_through_upload_file():
+    content = "id,名称,年份,tags,flag\n1,图片 1,1901,a;b,true\r\n2,图片 2,1902,,false\n".encode("utf-8")
+    rows = list(iter_file_rows(_upload(content, "data.csv").file, "csv"))
+    assert rows == [
+        {"id": "1", "名称": "图片 1", "年份": 1901, "tags": ["a", "b"], "flag": True},
+        {"id": "2", "名称": "图片 2", "年份": 1902, "tags": "", "flag": False},
+    ]
+
+
+def test_csv_gb18030_and_cr_line_endings():
+    content = "名称;年份\r图片;1901\r".encode("gb18030")
+    rows = list(iter_file_rows(_upload(content, "data.csv").file, "csv"))
+    assert rows == [{"名称": "图片", "年份": 1901}]
+
+
+def test_csv_quoted_newline_and_large_file():
+    lines = ['a,b\n', '"x\ny",1\n'] + [f"v{i},{i}\n" for i in range(20000)]
+    rows = list(iter_file_rows(_upload("".join(lines).encode(), "data.csv").file, "csv"))
+    assert rows[0] == {"a": "x\ny", "b": 1}
+    assert len(rows) == 20001
+
+
+def test_csv_undecodable_line_reports_line_number():
+    content = ("a,b\n" + "x,1\n" * 30000).encode() + b"\xff\xfe,2\n"
+    with pytest.raises(FileImportError, match="第 30002 行"):
+        list(iter_file_rows(_upload(content, "data.csv").file, "csv"))
+
+
+def test_ndjson_through_upload_file():
+    content = b'\xef\xbb\xbf{"id": 1, "x": "a"}\r\n\n{"x": 2}\n'
+    rows = list(iter_file_rows(_upload(content, "data.ndjson").file, "ndjson"))
+    assert rows == [{"id": "1", "x": "a"}, {"x": 2}]
+
+
+@pytest.mark.parametrize("content, message", [
+    (b'{"a": 1}\n[1]\n', "第 2 行不是 JSON 对象"),
+    (b'{"a": 1}\n{"a": \n', "第 2 行不是合法的 JSON"),
+    (b'{"a": 1}\n{"a": "\xff"}\n', "第 2 行的内容无法解码"),
+])
+def test_ndjson_errors(content, message):
+    with pytest.raises(FileImportError, match=message):
+        list(iter_file_rows(_upload(content, "data.ndjson").file, "ndjson"))
+
+
+def test_xlsx_through_upload_file():
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["id", "name", "when", "v"])
+    sheet.append([1, " a ", datetime(2020, 1, 2), 1.5])
+    sheet.append([None, None, None, None])
+    sheet.append([2, "b", None, 3])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    rows = list(iter_file_rows(_upload(buffer.getvalue(), "data.xlsx").file, "xlsx"))
+    assert rows == [
+        {"id": "1", "name": "a", "when": "2020-01-02T00:00:00", "v": 1.5},
+        {"id": "2", "name": "b", "when": None, "v": 3},
+    ]
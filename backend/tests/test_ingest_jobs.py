@@ -0,0 +1,53 @@
+"""后台导入任务：中断后从已提交的行之后继续，不重复写入"""
+
+from app.config import INGEST_CHUNK_SIZE
+from app.crud.ingest_jobs import create_ingest_job, get_ingest_job
+from app.services import ingest_worker
+
+
+def _table_items(client, headers, table_id):
+    response = client.get("/api/items", headers=headers, params={"tableId": table_id})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_interrupted_job_resumes_after_rows_done(client, auth_headers, upload, unique_ids, tmp_path, monkeypatch):
+    user_id = client.get("/api/auth/users/me", headers=auth_headers).json()["id"]
+    target = upload([{"id": unique_ids(1)[0], "名称": "已有"}])
+    project_id, table_id = target["projectId"], target["tableId"]
+
+    # 没有 id 列：每行写入时生成新 id，重复写入会多出数据项
+    total = INGEST_CHUNK_SIZE * 5 + 30
+    path = tmp_path / "rows.csv"
+    path.write_text("名称,年份\n" + "".join(f"图片 {i},{1900 + i}\n" for i in range(total)), encoding="utf-8")
+    job = create_ingest_job(user_id, project_id, table_id, str(path), "rows.csv", "csv", path.stat().st_size)
+
+    # 提交第二块之后模拟进程退出
+    record = ingest_worker.record_ingest_progress
+    def record_then_stop(cur, sqlite, job_id, rows_done, *args):
+        record(cur, sqlite, job_id, rows_done, *args)
+        if rows_done >= INGEST_CHUNK_SIZE * 2:
+            ingest_worker._stopping.set()
+    monkeypatch.setattr(ingest_worker, "record_ingest_progress", record_then_stop)
+    try:
+        assert ingest_worker.run_job(job["id"]) == "pending"
+    finally:
+        ingest_worker._stopping.clear()
+    interrupted = get_ingest_job(job["id"], user_id)
+    assert interrupted.status == "pending"
+    assert interrupted.rows_done == INGEST_CHUNK_SIZE * 2
+    assert len(_table_items(client, auth_headers, table_id)) == 1 + INGEST_CHUNK_SIZE * 2
+
+    monkeypatch.setattr(ingest_worker, "record_ingest_progress", record)
+    assert ingest_worker.run_job(job["id"]) == "completed"
+    finished = get_ingest_job(job["id"], user_id)
+    assert finished.rows_done == total
+    assert finished.progress == 1.0
+
+    items = _table_items(client, auth_headers, table_id)
+    assert len(items) == 1 + total
+    years = sorted(item["data"]["年份"] for item in items if "年份" in item["data"])
+    assert years == [1900 + i for i in range(total)]
+
+    # 已结束的任务不会再次执行
+    assert ingest_worker.run_job(job["id"]) is None
@@ -0,0 +1,76 @@
+"""
+表格和项目的 items_count（由数据库触发器维护，迁移 10）
+覆盖会替换已有行的写入（SQLite INSERT OR REPLACE / PostgreSQL ON CONFLICT）、数据项在表格间移动和删除；
+设置 TEST_DATABASE_URL 时在对应的数据库上运行
+"""
+
+import json
+
+from app.database.maintenance import recount_items
+
+
+def _counts(client, headers, project_id):
+    response = client.get(f"/api/projects/{project_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    project = response.json()
+    return project["items_count"], {table["id"]: table["items_count"] for table in project["tables"]}
+
+
+def _assert_counts_consistent():
+    # 触发器维护的计数与按 items 重新统计的结果一致时不需要修正任何行
+    assert recount_items() == {"tables": 0, "projects": 0}
+
+
+def test_counts_follow_replace_move_and_delete(client, auth_headers, upload, unique_ids):
+    ids = unique_ids(260)
+    first = upload([{"id": item_id, "v": i} for i, item_id in enumerate(ids[:250])])
+    project_id, table1 = first["projectId"], first["tableId"]
+    assert _counts(client, auth_headers, project_id) == (250, {table1: 250})
+
+    # 覆盖已有的 10 个 id 并新增 10 个：替换不重复计数
+    upload([{"id": item_id, "v": -1} for item_id in ids[240:260]], projectId=project_id, tableId=table1)
+    assert _counts(client, auth_headers, project_id) == (260, {table1: 260})
+    _assert_counts_consistent()
+
+    # 已有的 id 写入另一个表格：从原表格移出
+    second = upload([{"id": item_id, "moved": True} for item_id in ids[:30]], projectId=project_id)
+    table2 = second["tableId"]
+    assert _counts(client, auth_headers, project_id) == (260, {table1: 230, table2: 30})
+    _assert_counts_consistent()
+
+    # 按 id 删除（包括不存在的 id）
+    response = client.post("/api/items/delete", headers=auth_headers, json={"ids": [ids[0], ids[100], "missing"]})
+    assert response.status_code == 200, response.text
+    assert _counts(client, auth_headers, project_id) == (258, {table1: 229, table2: 29})
+
+    # 按表格删除
+    response = client.post("/api/items/delete", headers=auth_headers, json={"tableId": table2})
+    assert response.status_code == 200, response.text
+    assert _counts(client, auth_headers, project_id) == (229, {table1: 229, table2: 0})
+    _assert_counts_consistent()
+
+
+def test_counts_after_file_upload_and_single_item_writes(client, auth_headers, unique_ids):
+    ids = unique_ids(3)
+    content = "".join(json.dumps({"id": item_id, "x": i}) + "\n" for i, item_id in enumerate(ids))
+    response = client.post(
+        "/api/upload/file", headers=auth_headers,
+        files={"file": ("data.ndjson", content.encode(), "application/x-ndjson")}
+    )
+    assert response.status_code == 200, response.text
+    project_id, table_id = response.json()["projectId"], response.json()["tableId"]
+    assert _counts(client, auth_headers, project_id) == (3, {table_id: 3})
+
+    response = client.put(f"/api/item/{ids[0]}", headers=auth_headers, json={"x": 100})
+    assert response.status_code == 200, response.text
+    assert _counts(client, auth_headers, project_id) == (3, {table_id: 3})
+    _assert_counts_consistent()
+
+
+def test_moving_another_users_item_is_rejected(client, auth_headers, other_user_headers, upload, unique_ids):
+    ids = unique_ids(2)
+    mine = upload([{"id": item_id} for item_id in ids])
+
+    response = client.post("/api/upload", headers=other_user_headers, json={"projectName": "他人", "items": [{"id": ids[0]}]})
+    assert response.status_code == 409
+    assert _counts(client, auth_headers, mine["projectId"]) == (2, {mine["tableId"]: 2})
@@ -0,0 +1,74 @@
+"""过滤条件编译：操作符与字段类型不匹配、过滤值不合法时报错"""
+
+import pytest
+
+from app.crud.item_filters import InvalidQueryError, compile_filters, parse_filters, parse_item_query
+from app.models.schemas import ItemFilter
+
+FIELD_TYPES = {"year": "number", "name": "text", "tags": "multi_select"}
+
+
+def _compile(field, op, value, sqlite=True):
+    return compile_filters([ItemFilter(field=field, op=op, value=value)], FIELD_TYPES, sqlite)
+
+
+@pytest.mark.parametrize("sqlite", [True, False])
+def test_compile_valid_filters(sqlite):
+    filters = [
+        ItemFilter(field="year", op="gte", value="1900"),
+        ItemFilter(field="name", op="contains", value="50%_off"),
+        ItemFilter(field="tags", op="contains", value="a"),
+    ]
+    clause, params = compile_filters(filters, FIELD_TYPES, sqlite)
+    assert clause.count(" AND ") >= 2
+    assert 1900.0 in params
+    assert "%50\\%\\_off%" in params
+    assert clause.count("?") == len(params)
+
+
+@pytest.mark.parametrize("field, op, value, message", [
+    ("year", "eq", "abc", "需要数值"),
+    ("year", "contains", "1", "不支持 contains"),
+    ("year", "between", [1900], "between"),
+    ("year", "in", [], "非空列表"),
+    ("year", "eq", None, "不能为空"),
+    ("name", "eq", {"a": 1}, "必须是标量"),
+    ("name", "in", "abc", "非空列表"),
+    ("tags", "eq", "a", "只支持 contains"),
+])
+@pytest.mark.parametrize("sqlite", [True, False])
+def test_compile_invalid_filters(field, op, value, message, sqlite):
+    with pytest.raises(InvalidQueryError, match=message):
+        _compile(field, op, value, sqlite)
+
+
+def test_parse_filters_errors():
+    with pytest.raises(InvalidQueryError, match="JSON 数组"):
+        parse_filters('[{"field": "year"', FIELD_TYPES)
+    with pytest.raises(InvalidQueryError, match="格式错误"):
+        parse_filters('[{"field": "year", "op": "like", "value": 1}]', FIELD_TYPES)
+    with pytest.raises(InvalidQueryError, match="未在表格 schema 中声明"):
+        parse_filters('[{"field": "missing", "op": "eq", "value": 1}]', FIELD_TYPES)
+
+
+def test_parse_sort_errors():
+    with pytest.raises(InvalidQueryError, match="未在表格 schema 中声明"):
+        parse_item_query(FIELD_TYPES, sort="-missing")
+    with pytest.raises(InvalidQueryError, match="不支持排序"):
+        parse_item_query(FIELD_TYPES, sort="tags")
+
+
+def test_invalid_filter_returns_400(client, auth_headers, upload, unique_ids):
+    result = upload(
+        [{"id": item_id, "year": 1900 + i} for i, item_id in enumerate(unique_ids(3))],
+        schema={"fields": [{"key": "year", "label": "year", "type": "number"}]},
+    )
+    params = {"tableId": result["tableId"], "filter": '[{"field": "year", "op": "gt", "value": 1900}]'}
+    response = client.get("/api/items", headers=auth_headers, params=params)
+    assert response.status_code == 200
+    assert sorted(item["data"]["year"] for item in response.json()) == [1901, 1902]
+
+    params["filter"] = '[{"field": "year", "op": "gt", "value": "later"}]'
+    response = client.get("/api/items", headers=auth_headers, params=params)
+    assert response.status_code == 400
+    assert "需要数值" in response.json()["detail"]
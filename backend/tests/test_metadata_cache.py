@@ -0,0 +1,65 @@
+"""进程内元数据缓存：TTL、LRU 淘汰，以及修改后对应条目立即失效"""
+
+import time
+
+from app.crud.cache import MetadataCache
+
+
+def test_ttl_and_lru_eviction():
+    cache = MetadataCache("test-lru", max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1      # a 变为最近使用
+    cache.set("c", 3)               # 淘汰最久未使用的 b
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+    cache.set("short", 4, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    stats = cache.stats()
+    assert stats["evictions"] >= 1
+    assert stats["expired"] == 1
+
+
+def test_disabled_and_none_values_are_not_cached():
+    disabled = MetadataCache("test-disabled", max_size=10, ttl=0)
+    disabled.set("a", 1)
+    assert disabled.get("a") is None
+
+    cache = MetadataCache("test-none", max_size=10, ttl=60)
+    cache.set("a", None)
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_where():
+    cache = MetadataCache("test-invalidate", max_size=10, ttl=60)
+    for user_id in (1, 2):
+        for project_id in (10, 20):
+            cache.set((user_id, project_id), True)
+    cache.invalidate_where(lambda key, value: key[1] == 10)
+    assert cache.get((1, 10)) is None and cache.get((2, 10)) is None
+    assert cache.get((1, 20)) and cache.get((2, 20))
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_role_change_takes_effect_immediately(client, auth_headers, other_user_headers):
+    me = client.get("/api/auth/users/me", headers=other_user_headers).json()
+    assert client.get("/api/auth/users", headers=other_user_headers).status_code == 403
+
+    response = client.put(f"/api/auth/users/{me['id']}/role", headers=auth_headers, params={"role_id": 1})
+    assert response.status_code == 200, response.text
+    # 缓存的用户对象包含角色，修改后不需要等 TTL 过期
+    assert client.get("/api/auth/users", headers=other_user_headers).status_code == 200
+
+
+def test_deleted_project_is_no_longer_accessible(client, auth_headers, upload, unique_ids):
+    result = upload([{"id": item_id} for item_id in unique_ids(2)])
+    project_id = result["projectId"]
+    # 访问一次，使归属检查进入缓存
+    response = client.get(f"/api/projects/{project_id}/tables/{result['tableId']}/profile", headers=auth_headers)
+    assert response.status_code == 200, response.text
+
+    assert client.delete(f"/api/projects/{project_id}", headers=auth_headers).status_code == 200
+    response = client.get(f"/api/projects/{project_id}/tables/{result['tableId']}/profile", headers=auth_headers)
+    assert response.status_code == 404
@@ -0,0 +1,69 @@
+"""游标分页：游标编码、解析，以及排序方式变化后拒绝旧游标"""
+
+import pytest
+
+from app.crud.pagination import InvalidCursorError, decode_cursor, encode_cursor, keyset_condition
+
+
+def test_cursor_round_trip():
+    values = ["-v", 3.5, "名称", None, "id-1"]
+    cursor = encode_cursor(values)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == values
+    assert decode_cursor(cursor, size=5) == values
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor([1, 2])[:-2] + "~~", "e30"])  # e30 = {}
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
+
+
+def test_cursor_size_mismatch():
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(encode_cursor(["", "2024-01-01", "a"]), size=2)
+
+
+def test_keyset_condition_mixed_directions():
+    condition, params = keyset_condition([("a", True), ("id", False)], [5, "x"])
+    assert condition == "((a < ?) OR (a = ? AND id > ?))"
+    assert params == [5, 5, "x"]
+
+
+def _page(client, headers, table_id, **params):
+    response = client.get("/api/items", headers=headers, params={"tableId": table_id, **params})
+    return response
+
+
+def test_pages_follow_sort_and_reject_other_sort(client, auth_headers, upload, unique_ids):
+    ids = unique_ids(25)
+    result = upload(
+        [{"id": item_id, "v": i % 7} for i, item_id in enumerate(ids)],
+        schema={"fields": [{"key": "v", "label": "v", "type": "number"}]},
+    )
+    table_id = result["tableId"]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 10, "sort": "-v"}
+        if cursor:
+            params["cursor"] = cursor
+        response = _page(client, auth_headers, table_id, **params)
+        assert response.status_code == 200, response.text
+        seen.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        last_cursor = cursor
+
+    assert sorted(item["id"] for item in seen) == sorted(ids)
+    values = [item["data"]["v"] for item in seen]
+    assert values == sorted(values, reverse=True)
+
+    # 同样个数的排序键、不同的排序方式：游标签名不匹配
+    response = _page(client, auth_headers, table_id, limit=10, sort="v", cursor=last_cursor)
+    assert response.status_code == 400
+    assert "排序方式不匹配" in response.json()["detail"]
+
+    response = _page(client, auth_headers, table_id, limit=10, cursor="garbage")
+    assert response.status_code == 400
@@ -0,0 +1,65 @@
+"""项目列表：项目和表格批量加载，每个项目只带自己的表格和数据项数"""
+
+from contextlib import contextmanager
+
+from app.crud import projects as project_crud
+
+
+def test_projects_list_groups_tables_by_project(client, auth_headers, other_user_headers, upload, unique_ids):
+    created = {}
+    for n in (1, 2, 3):
+        first = upload([{"id": item_id} for item_id in unique_ids(n)])
+        second = upload([{"id": item_id} for item_id in unique_ids(1)], projectId=first["projectId"])
+        created[first["projectId"]] = {first["tableId"]: n, second["tableId"]: 1}
+    others = upload([{"id": item_id} for item_id in unique_ids(1)], headers=other_user_headers)
+
+    response = client.get("/api/projects/", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    listed = {project["id"]: project for project in response.json()}
+    assert others["projectId"] not in listed
+    for project_id, tables in created.items():
+        project = listed[project_id]
+        assert {table["id"]: table["items_count"] for table in project["tables"]} == tables
+        assert all(table["project_id"] == project_id for table in project["tables"])
+        assert project["items_count"] == sum(tables.values())
+
+
+def test_projects_list_uses_constant_number_of_queries(client, auth_headers, upload, unique_ids, monkeypatch):
+    for _ in range(3):
+        upload([{"id": item_id} for item_id in unique_ids(1)])
+    user_id = client.get("/api/auth/users/me", headers=auth_headers).json()["id"]
+
+    executed = []
+    get_connection = project_crud.get_connection
+
+    class _CountingCursor:
+        def __init__(self, cursor):
+            self._cursor = cursor
+
+        def execute(self, *args):
+            executed.append(args[0])
+            return self._cursor.execute(*args)
+
+        def __getattr__(self, name):
+            return getattr(self._cursor, name)
+
+    class _CountingConnection:
+        def __init__(self, conn):
+            self._conn = conn
+
+        def cursor(self, *args, **kwargs):
+            return _CountingCursor(self._conn.cursor(*args, **kwargs))
+
+        def __getattr__(self, name):
+            return getattr(self._conn, name)
+
+    @contextmanager
+    def _counting_connection():
+        with get_connection() as conn:
+            yield _CountingConnection(conn)
+
+    monkeypatch.setattr(project_crud, "get_connection", _counting_connection)
+    projects = project_crud.get_projects_with_tables(user_id)
+    assert len(projects) >= 3
+    # 项目一条查询、表格一条查询，与项目数无关
+    assert len(executed) == 2
@@ -0,0 +1,115 @@
+"""重接口限流：超出令牌桶或并发上限时返回 429 和 Retry-After，不进入路由"""
+
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.rate_limit import RateLimitMiddleware, RouteLimit, default_limits
+
+
+def _app(limit: RouteLimit):
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/api/upload")
+    async def upload():
+        app.state.calls += 1
+        return {"ok": True}
+
+    @app.get("/api/items")
+    async def items():
+        return []
+
+    app.add_middleware(RateLimitMiddleware, limits=[limit])
+    return app
+
+
+def test_rate_limit_returns_429_with_retry_after():
+    limit = RouteLimit("upload", "POST", r"/api/upload(/file)?", rate_per_minute=3)
+    app = _app(limit)
+    client = TestClient(app)
+    # 没有有效令牌的请求按客户端 IP 计数
+    codes = [client.post("/api/upload").status_code for _ in range(4)]
+    assert codes == [200, 200, 200, 429]
+    response = client.post("/api/upload")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert "每分钟最多 3 次" in response.json()["detail"]
+    # 被拒绝的请求没有进入路由
+    assert app.state.calls == 3
+
+    # 不匹配的接口不受限制
+    assert client.get("/api/items").status_code == 200
+    assert limit.stats()["rejected"] == {"rate": 2}
+    assert limit.active == 0
+
+
+def test_buckets_are_per_client():
+    limit = RouteLimit("upload", "POST", r"/api/upload", rate_per_minute=1)
+    assert limit.acquire("user:a") is None
+    limit.release("user:a")
+    detail, retry_after = limit.acquire("user:a")
+    assert retry_after == 60
+    assert limit.acquire("user:b") is None
+
+
+def test_concurrency_limits_do_not_consume_tokens():
+    limit = RouteLimit("export", "GET", r"/export", rate_per_minute=2, max_concurrent_per_user=1, max_concurrent=2)
+    assert limit.acquire("a") is None
+    assert limit.acquire("a") == ("同时进行的请求过多（最多 1 个），请等待之前的请求完成", 1)
+    assert limit.acquire("b") is None
+    assert limit.acquire("c")[0] == "服务器繁忙，请稍后重试"
+    limit.release("a")
+    limit.release("b")
+    # 被并发限制拒绝的请求没有消耗令牌
+    assert limit.acquire("a") is None
+    assert limit.stats()["rejected"] == {"user_concurrency": 1, "concurrency": 1}
+
+
+def test_concurrent_slot_released_after_streamed_response():
+    limit = RouteLimit("upload", "POST", r"/api/upload", max_concurrent_per_user=1)
+    started = []
+
+    async def app(scope, receive, send):
+        started.append(scope["path"])
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await release.wait()
+        await send({"type": "http.response.body", "body": b"done"})
+
+    middleware = RateLimitMiddleware(app, limits=[limit])
+    release = None
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        scope = {"type": "http", "method": "POST", "path": "/api/upload", "headers": [], "client": ("1.2.3.4", 1)}
+        first = asyncio.ensure_future(middleware(scope, receive, send))
+        await asyncio.sleep(0)
+        # 第一个请求的响应还没发送完，同一客户端的第二个请求被拒绝
+        await middleware(scope, receive, send)
+        assert sent[-2]["status"] == 429
+        assert (b"retry-after", b"1") in sent[-2]["headers"]
+        release.set()
+        await first
+        assert limit.active == 0
+
+    asyncio.run(scenario())
+    assert started == ["/api/upload"]
+
+
+def test_default_limits_match_heavy_routes():
+    limits = {limit.name: limit for limit in default_limits()}
+    assert limits["upload"].matches("POST", "/api/upload")
+    assert limits["upload"].matches("POST", "/api/upload/file")
+    assert not limits["upload"].matches("GET", "/api/upload")
+    assert limits["geocode"].matches("POST", "/api/projects/3/geocode")
+    assert limits["export"].matches("GET", "/api/projects/3/tables/4/export")
+    assert not limits["export"].matches("GET", "/api/projects/3/tables/4/profile")